@@ -17,6 +17,68 @@ Revisions: 20190311, CJuice, Revised root url for data.maryland.gov to opendata.
     a string was not returned as expected. A dictionary was returned. Added a second call to "url" to get url string.
 20190509, CJuice, Refactoring and cleanup to improve readability and quality of code. Remove use of named tuples.
     Switch to config file from json file use for credentials.
+20261017, agent, Dataset inspection moved into inspect_dataset() and dispatched to a thread pool sized by
+    NUMBER_OF_INSPECTION_WORKERS. Counters and outputs are still handled in the main thread.
+20261017, agent, Optional server side null counting using SoQL count() aggregates, falling back to the row scan.
+20261017, agent, Upserts are batched into chunks by UpsertBatcher. Failed chunks go to the problem datasets csv.
+20261017, agent, Pages of records are prefetched in the background by generate_record_pages().
+20261017, agent, Keyset pagination on the :id system field replaces $offset paging.
+20261017, agent, All reads go through one PooledReadSession with keep-alive, gzip, and the app token.
+20261017, agent, Optional incremental inspection reusing results for datasets unchanged since the last run.
+20261017, agent, Completed datasets are journaled so an interrupted run can resume on the same date.
+20261017, agent, Fixed 0.2 second sleep replaced by a shared AdaptiveRateLimiter with backoff on throttling.
+20261017, agent, Optional DOMAIN and URI_SCHEME config values point the script at another server, such as the
+    local stand-in used by OpenDataInspector_Benchmark.py.
+20261017, agent, Per dataset timings of HTTP, json decode, null counting, upserts, and csv writes are written to a
+    dated dataset performance csv. Latency percentiles and the slowest datasets are added to the performance summary.
+20261017, agent, Nulls are counted a page at a time by count_null_values_in_page() rather than record by record.
+20261017, agent, Records are decoded one at a time by scan_record_keys(), keeping only the count of each field rather
+    than every decoded value of the page.
+20261017, agent, Pages are streamed and decoded record by record by StreamingRecordReader as the body arrives.
+20261017, agent, Field names suppressed from X-SODA2-Fields come from the views metadata through ColumnMetadataCache,
+    kept on disk for COLUMN_METADATA_CACHE_HOURS. Replaces the mega column json files of two known datasets.
+20261017, agent, Pages of datasets with more than COLUMN_SHARD_FIELD_THRESHOLD fields are fetched in groups of
+    COLUMNS_PER_SHARD fields, in parallel, and the null counts of the groups merged.
+20261017, agent, After a full first page the records of a dataset are counted with count(*) and the remaining pages
+    are fetched by offset, PAGE_FETCH_WORKERS at a time, and counted in the order they arrive. An empty page after
+    full pages no longer marks a dataset whose record count is a multiple of the page size as problematic.
+20261017, agent, DatasetScheduler dispatches the datasets expected to take longest first, estimated from the last
+    run's timings or a count of records and fields, and reports predicted against actual finish times. Optional
+    INSPECTION_BUDGET_MINUTES defers the least overdue datasets that would not finish in time to the next run.
+20261017, agent, Optional sampling mode. Datasets with more than SAMPLING_RECORD_THRESHOLD records are inspected from
+    a stratified random sample of SAMPLED_PAGES pages, unless a full scan is due every FULL_SCAN_EVERY_DAYS. Null
+    counts and percents are estimated with confidence intervals. Field and overview outputs gain IS ESTIMATE and
+    PERCENT NULL LOWER and UPPER values.
+20261017, agent, Optional sharded runs. With NUMBER_OF_SHARDS above 1, "OpenDataInspector.py --shard N" inspects the
+    Nth of NUMBER_OF_SHARDS partitions of the inventory, by a hash of the dataset api id, and journals its results and
+    timings to a dated shard file instead of writing outputs. Shards can run on separate hosts, each keeping its own
+    state files. "OpenDataInspector.py --merge" then writes the csv files, the dataset performance csv, and one
+    performance summary from all of today's shard files, and does the upserts once.
+20261017, agent, The date of a run is fixed when the process starts, or given with --run-date, and names its journal,
+    shard files, and outputs. A merge run on another day than its shards is given their date. The merge stops with
+    an error, before writing anything, when a shard file of the run date is missing or unfinished.
+20261017, agent, Optional process pool of CPU_WORKER_PROCESSES. The fetching threads hand the raw bytes of each page
+    to the pool, where count_missing_fields_in_page_bytes() decodes the records and counts the missing fields, so
+    decoding and counting are not held to one core by the GIL. Counts come back as one array per page.
+20261017, agent, AdaptiveRateLimiter, PooledReadSession, StreamingRecordReader, and the helpers they use moved to
+    OpenDataInspector_Common.py, shared with OpenDataInspector_Cleanup.py, which must sit alongside this script.
+20261017, agent, With TURN_ON_SHARED_RATE_LIMIT the rate limiter keeps its schedule in OUTPUT_CSVs, shared with the
+    cleanup and with other shards, so scripts running at once keep to one REQUESTS_PER_SECOND between them.
+20261017, agent, Resuming from the journal is off unless asked for with --resume, so a deliberate rerun on the same
+    date inspects everything again. A resumed run skips rows already in today's csv files and reports the process
+    time of the whole run, from the start time journaled by the run it resumes.
+20261017, agent, PAGE_FETCH_WORKERS defaults to 1. Above 1, the count and the last :id of a dataset are checked again
+    after its pages are requested by offset, and a dataset that changed meanwhile is paged again by keyset.
+20261017, agent, The preflight cost estimate counts only records, by count(*), and takes fields per record from the
+    schedule history, so it no longer requests views metadata or fills the column metadata cache. Cached field
+    names are only used ahead of the first page for datasets wide enough to shard.
+20261017, agent, The IS ESTIMATE, PERCENT NULL LOWER, and PERCENT NULL UPPER columns are only added to the outputs with
+    TURN_ON_SAMPLING, so the Socrata schemas are unchanged without it. The first page of a sampled dataset is only
+    part of the estimate when the random pick for the first stratum lands on it.
+20261017, agent, Record key scanning takes more CPU than decoding a page whole. Only datasets whose records average
+    RECORD_KEY_SCANNING_RECORD_BYTES or more, as wide and long text records do, are scanned past the first page.
+20261017, agent, Datasets are only ordered longest first with more than one NUMBER_OF_INSPECTION_WORKERS. A serial run
+    keeps the inventory order and, without INSPECTION_BUDGET_MINUTES, sends no preflight count(*) requests.
 """
 
 # TODO: evaluate use of requests params keyword and pass limit and offset in a dictionary
@@ -24,17 +86,54 @@ Revisions: 20190311, CJuice, Revised root url for data.maryland.gov to opendata.
 # TODO: switch to config parser
 
 
+def count_missing_fields_in_page_bytes(page_bytes: bytes, field_names: list) -> tuple:
+    """
+    Decode a page of Socrata records and count the records missing each field, in a worker process
+
+    NOTE: Defined at module level, unlike the rest of the script, so that the process pool can pickle it by name.
+        The records never leave the worker process; only the counts are sent back.
+
+    :param page_bytes: Body of the response, a json array of records
+    :param field_names: List of field names of the dataset, or of a field group
+    :return: tuple of the number of records, the :id of the last record, and a list of the count of records missing
+        each field, in the order of field_names
+    """
+    import collections
+    import itertools
+    import json
+    records = json.loads(page_bytes)
+    field_name_set = frozenset(field_names)
+    present_field_counts = collections.Counter(itertools.chain.from_iterable(
+        field_name_set.intersection(record) for record in records))
+    last_row_id = records[-1].get(":id") if records else None
+    return (len(records), last_row_id,
+            [len(records) - present_field_counts.get(field_name, 0) for field_name in field_names])
+
+
 def main():
 
     # IMPORTS
+    from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
     from datetime import date
+    from OpenDataInspector_Common import AdaptiveRateLimiter, PooledReadSession, StreamingRecordReader
+    from OpenDataInspector_Common import calculate_percentile
     from sodapy import Socrata
+    import argparse
+    import collections
     import configparser
+    import heapq
+    import itertools
     import json
+    import math
     import os
+    import queue
+    import random
     import re
     import requests
+    import requests.adapters
+    import threading
     import time
+    import zlib
 
     process_start_time = time.time()
 
@@ -42,19 +141,66 @@ def main():
     TESTING = True                              # OPTION
     TURN_ON_WRITE_OUTPUT_TO_CSV = True          # OPTION
     TURN_ON_UPSERT_OUTPUT_TO_SOCRATA = True     # OPTION
+    NUMBER_OF_INSPECTION_WORKERS = 1            # OPTION. Datasets inspected concurrently. 1 is a serial run.
+    TURN_ON_SERVER_SIDE_NULL_COUNTING = False   # OPTION. SoQL count() aggregates instead of downloading all records
+    UPSERT_CHUNK_SIZE = 1000                    # OPTION. Field and overview records sent per upsert request
+    PREFETCH_PAGE_DEPTH = 2                     # OPTION. Pages fetched ahead of the page being counted. Minimum 1.
+    TURN_ON_KEYSET_PAGINATION = True            # OPTION. Page by $where :id > last :id instead of $offset
+    TURN_ON_INCREMENTAL_INSPECTION = False      # OPTION. Reuse previous results for datasets unchanged since last run
+    TURN_ON_FORCE_FULL_RESCAN = False           # OPTION. Inspect every dataset even when incremental is on
+    TURN_ON_RESUME_FROM_JOURNAL = False         # OPTION. Every run resumes from the journal, as --resume does
+    REQUESTS_PER_SECOND = 5.0                   # OPTION. Most reads per second across all workers
+    MAXIMUM_RETRIES = 5                         # OPTION. Retries of a throttled read before giving up
+    TURN_ON_RECORD_KEY_SCANNING = True          # OPTION. Stream each page, keeping only field counts, not records
+    RECORD_KEY_SCANNING_RECORD_BYTES = 2048     # OPTION. Smaller records are decoded a page at a time, for less CPU
+    COLUMN_METADATA_CACHE_HOURS = 24.0          # OPTION. Age at which cached field names are requested again
+    TURN_ON_COLUMN_SHARDED_FETCHING = True      # OPTION. Fetch wide datasets in groups of fields. Keyset only.
+    COLUMN_SHARD_FIELD_THRESHOLD = 300          # OPTION. Datasets with more fields than this are fetched in groups
+    COLUMNS_PER_SHARD = 50                      # OPTION. Fields selected by each request of a sharded page
+    COLUMN_SHARD_WORKERS = 4                    # OPTION. Field groups of a page requested concurrently
+    PAGE_FETCH_WORKERS = 1                      # OPTION. Pages of one dataset fetched at once. Keyset only.
+    TURN_ON_LARGEST_FIRST_SCHEDULING = True     # OPTION. Inspect the longest datasets first. Only with 2+ workers.
+    TURN_ON_PREFLIGHT_COST_ESTIMATE = True      # OPTION. count(*) datasets without timings, to order them or budget
+    INSPECTION_BUDGET_MINUTES = None            # OPTION. Datasets that would finish later are deferred. None is off.
+    TURN_ON_SAMPLING = False                    # OPTION. Estimate nulls of large datasets from a sample of pages
+    SAMPLING_RECORD_THRESHOLD = 1000000         # OPTION. Datasets with more records than this are sampled
+    SAMPLED_PAGES = 20                          # OPTION. Pages sampled from each dataset, one per stratum. Minimum 2.
+    FULL_SCAN_EVERY_DAYS = 7                    # OPTION. Sampled datasets are still inspected in full this often
+    NUMBER_OF_SHARDS = 1                        # OPTION. Partitions of the inventory, each run with --shard N
+    CPU_WORKER_PROCESSES = 0                    # OPTION. Processes decoding and counting pages. 0 is in the threads.
+    TURN_ON_SHARED_RATE_LIMIT = True            # OPTION. One REQUESTS_PER_SECOND shared with cleanup and shards
 
     _root_url_for_project = os.path.dirname(__file__)
+    argument_parser = argparse.ArgumentParser(description="Inspect the datasets of the open data portal for nulls")
+    argument_parser.add_argument("--shard", type=int, default=None, metavar="N",
+                                 help="Inspect only the Nth of NUMBER_OF_SHARDS partitions of the inventory and "
+                                      "journal the results to a shard file for the merge")
+    argument_parser.add_argument("--merge", action="store_true",
+                                 help="Write the outputs and do the upserts for all shard files of the run date")
+    argument_parser.add_argument("--resume", action="store_true",
+                                 help="Skip the datasets an interrupted run completed earlier on the run date, per "
+                                      "its journal")
+    argument_parser.add_argument("--run-date", type=date.fromisoformat, default=None, metavar="YYYY-MM-DD",
+                                 help="Date of the run, naming its journal, shard files, and outputs. Defaults to the "
+                                      "date the process starts. Give the shard runs and the merge the same date.")
+    arguments = argument_parser.parse_args()
+    column_metadata_cache_file_name = "__column_metadata_cache.json"
+    confidence_interval_z_score = 1.96
     config_file = None
-    correctional_enterprises_employees_api_id = "mux9-y6mb"
-    correctional_enterprises_employees_json_file = os.path.join(
-        _root_url_for_project,
-        r"EssentialExtraFilesForOpenDataInspectorSuccess\MarylandCorrectionalEnterprises_JSON.json")
-
     data_freshness_report_api_id = "t8k3-edvn"
+    dataset_performance_file_name = "__dataset_performance"
+    dataset_schedule_history_file_name = "__dataset_schedule_history.json"
+    dataset_performance_headers = ['DATASET NAME', 'DATASET ID', 'TOTAL SECONDS', 'INSPECTION SECONDS',
+                                   'HTTP REQUESTS', 'BYTES DOWNLOADED', 'HTTP SECONDS', 'JSON DECODE SECONDS',
+                                   'NULL COUNTING SECONDS', 'UPSERT SECONDS', 'CSV WRITE SECONDS']
     # data_json_url_name = "data.json" # TODO: for redesign toward using data.json instead of data freshness report
+    default_fields_per_record = 20
+    default_seconds_per_value = 0.00001
     field_level_stats_file_name = "_FIELD_LEVEL_STATS"
     field_level_stats_socrata_headers = ['DATASET NAME', 'FIELD NAME', 'TOTAL NULL VALUE COUNT', 'TOTAL RECORD COUNT',
                                          'PERCENT NULL', 'HYPERLINK', 'DATASET ID', 'FIELD ID', 'DATE', 'ROW ID']
+    inspection_journal_file_name = "_INSPECTION_JOURNAL"
+    inspection_state_file_name = "__inspection_state.json"
     limit_max_and_offset = 10000
     md_statewide_vehicle_crash_startswith = "Maryland Statewide Vehicle Crashes"
     opendata_maryland_gov_domain = "opendata.maryland.gov"
@@ -65,18 +211,618 @@ def main():
                                             'DATASET ID', 'DATA PROVIDER', 'DATE', 'ROW ID']
     performance_summary_file_name = "__script_performance_summary"
     problem_datasets_file_name = "_PROBLEM_DATASETS"
+    rate_limiter_state_file_name = "__rate_limiter_state.json"
     real_property_hidden_names_api_id = "ed4q-f8tm"
-    real_property_hidden_names_json_file = os.path.join(
-        _root_url_for_project,
-        r"EssentialExtraFilesForOpenDataInspectorSuccess\RealPropertyHiddenOwner_JSON.json")
     root_path_for_csv_output = os.path.join(_root_url_for_project, "OUTPUT_CSVs")
     root_url_for_dataset_access = r"{root_url}/resource/".format(root_url=opendata_maryland_gov_url)
+    run_date = arguments.run_date or date.today()
+    sampling_socrata_headers = ['IS ESTIMATE', 'PERCENT NULL LOWER', 'PERCENT NULL UPPER']
+    shard_statistic_names = ("HTTP read requests", "HTTP retries after throttling", "HTTP bytes on the wire",
+                             "Throttle events", "Time waiting on rate limiter (seconds)")
+    slowest_datasets_reported = 10
+    soql_aggregate_fields_per_request = 50
 
-    assert os.path.exists(correctional_enterprises_employees_json_file)
-    assert os.path.exists(real_property_hidden_names_json_file)
     assert os.path.exists(root_path_for_csv_output)
 
+    # Only sampling adds its columns to the field and overview outputs. The Socrata field and overview level datasets
+    #   need the sampling columns added to their schemas before sampling is turned on.
+    if TURN_ON_SAMPLING:
+        field_level_stats_socrata_headers = field_level_stats_socrata_headers + sampling_socrata_headers
+        overview_level_stats_socrata_headers = overview_level_stats_socrata_headers + sampling_socrata_headers
+
+    # CLASSES
+    class ColumnMetadataCache:
+        """
+        Field names of datasets from the views metadata, kept on disk between runs.
+
+        Socrata leaves the X-SODA2-Fields header off the responses of datasets with a lot of fields. For those the
+            column list is requested once from /api/views/ and saved with the time it was requested. Field names are
+            served from memory, and from the file on later runs, until they are older than the time to live. An
+            expired entry is still used if the views metadata cannot be read. Datasets are looked up from several
+            threads.
+        """
+
+        def __init__(self, file_path: str, time_to_live_seconds: float, request_function):
+            """
+            :param file_path: Path to the column metadata cache .json file
+            :param time_to_live_seconds: Age at which cached field names are requested again
+            :param request_function: Function making a read request, called with dataset_api_id and url keywords
+            """
+            self.cache_hit_count = 0
+            self.cache_miss_count = 0
+            self.cached_columns = {}
+            self.file_path = file_path
+            self.is_changed = False
+            self.lock = threading.Lock()
+            self.request_function = request_function
+            self.time_to_live_seconds = time_to_live_seconds
+            if os.path.exists(file_path):
+                try:
+                    self.cached_columns = load_json(json_file_contents=read_json_file(file_path=file_path))
+                except ValueError as ve:
+                    print("Column metadata cache could not be read, starting empty. {}".format(ve))
+
+        def get_cached_field_names(self, dataset_api_id: str) -> list:
+            """
+            Get the visible field names of a dataset only if they are cached and fresh, without making a request.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :return: list of field names, or None if they are not cached or have expired
+            """
+            with self.lock:
+                cached_entry = self.cached_columns.get(dataset_api_id)
+                if (cached_entry is not None
+                        and time.time() - cached_entry["requested_at"] < self.time_to_live_seconds):
+                    self.cache_hit_count += 1
+                    return cached_entry["field_names"]
+            return None
+
+        def get_field_names(self, dataset_api_id: str) -> list:
+            """
+            Get the visible field names of a dataset, from the cache while fresh, otherwise from the views metadata.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :return: list of field names, or None if there are none cached and the views metadata could not be read
+            """
+            with self.lock:
+                cached_entry = self.cached_columns.get(dataset_api_id)
+                if (cached_entry is not None
+                        and time.time() - cached_entry["requested_at"] < self.time_to_live_seconds):
+                    self.cache_hit_count += 1
+                    return cached_entry["field_names"]
+            url = "{}/api/views/{}.json".format(opendata_maryland_gov_url, dataset_api_id)
+            try:
+                response = self.request_function(dataset_api_id=dataset_api_id, url=url)
+                response.raise_for_status()
+                field_names_dictionary = grab_field_names_from_view_columns(column_list=response.json()["columns"])
+            except Exception as e:
+                print("\tViews metadata columns unavailable: {}. {}".format(dataset_api_id, e))
+                return None if cached_entry is None else cached_entry["field_names"]
+            with self.lock:
+                self.cache_miss_count += 1
+                self.cached_columns[dataset_api_id] = {"field_names": field_names_dictionary["visible"],
+                                                       "requested_at": time.time()}
+                self.is_changed = True
+            return field_names_dictionary["visible"]
+
+        def save(self) -> None:
+            """
+            Save the cache for later runs, if anything was added. Written to a temporary file first so a failed write
+                cannot leave a partial cache file behind.
+
+            :return: None
+            """
+            with self.lock:
+                if not self.is_changed:
+                    return
+                temporary_file_path = "{}.tmp".format(self.file_path)
+                try:
+                    with open(temporary_file_path, 'w') as file_handler:
+                        json.dump(self.cached_columns, file_handler)
+                    os.replace(temporary_file_path, self.file_path)
+                    self.is_changed = False
+                except IOError as io_err:
+                    print(io_err)
+            return
+
+        def statistics(self) -> dict:
+            """
+            Summarize the use of the cache during the run.
+
+            :return: dictionary of statistic names and values, in reporting order
+            """
+            return {"Column metadata cache hits": self.cache_hit_count,
+                    "Column metadata requests": self.cache_miss_count}
+
+    class DatasetScheduler:
+        """
+        Order the datasets of a run so the datasets expected to take longest are inspected first, and defer datasets
+            that will not fit in a time budget to the next run.
+
+        Inspected largest first (LPT), a long dataset cannot be picked up late and stretch the run while the other
+            workers sit idle. The time a dataset takes is estimated from its inspection time in an earlier run, kept in
+            a history file, or else from its number of records, counted with count(*), at the fields per record and
+            seconds per value seen across the history. No field names are requested for the estimate. Datasets with
+            neither are estimated at the median. The finish time of every dataset is
+            predicted by handing the datasets in order to whichever worker frees up first, for comparison with the
+            actual finish times. With a budget, the datasets inspected least recently are scheduled first and those
+            that would push the predicted finish past the budget are deferred, which makes them the least recently
+            inspected in the next run. The least recently inspected dataset is never deferred, so a dataset too long
+            for the budget on its own still gets its turn. Finish times are recorded from several threads.
+        """
+
+        def __init__(self, file_path: str, worker_count: int, record_count_function=None):
+            """
+            :param file_path: Path to the dataset schedule history .json file
+            :param worker_count: Number of datasets inspected concurrently
+            :param record_count_function: Optional function returning the number of records of a dataset, called with
+                dataset_api_id, for datasets without an earlier inspection time
+            """
+            self.actual_finish_seconds = {}
+            self.deferred_dataset_api_ids = []
+            self.estimated_seconds = {}
+            self.file_path = file_path
+            self.history = {}
+            self.is_changed = False
+            self.lock = threading.Lock()
+            self.predicted_finish_seconds = {}
+            self.record_count_function = record_count_function
+            self.start_time = time.perf_counter()
+            self.worker_count = worker_count
+            if os.path.exists(file_path):
+                try:
+                    self.history = load_json(json_file_contents=read_json_file(file_path=file_path))
+                except ValueError as ve:
+                    print("Dataset schedule history could not be read, starting empty. {}".format(ve))
+
+        def build_schedule(self, dataset_api_ids: list, is_largest_first: bool, budget_seconds: float = None) -> list:
+            """
+            Order the datasets for inspection, defer those that do not fit in the budget, and predict finish times.
+
+            :param dataset_api_ids: Socrata api ids of the datasets to inspect, in inventory order
+            :param is_largest_first: True to order by estimated time, longest first. False keeps the inventory order.
+            :param budget_seconds: Optional seconds the inspection of the scheduled datasets should finish within
+            :return: list of the api ids of the datasets to inspect, in the order to dispatch them
+            """
+            inventory_positions = {dataset_api_id: position for position, dataset_api_id in enumerate(dataset_api_ids)}
+            self.estimated_seconds = self.estimate_seconds(
+                dataset_api_ids=dataset_api_ids,
+                is_counting_records=is_largest_first or budget_seconds is not None)
+
+            def order(api_ids: list) -> list:
+                if is_largest_first:
+                    return sorted(api_ids, key=lambda api_id: self.estimated_seconds[api_id], reverse=True)
+                return sorted(api_ids, key=lambda api_id: inventory_positions[api_id])
+
+            scheduled_dataset_api_ids = list(dataset_api_ids)
+            if budget_seconds is not None:
+                scheduled_dataset_api_ids = []
+                for dataset_api_id in sorted(dataset_api_ids,
+                                             key=lambda api_id: self.history.get(api_id, {}).get("last_inspected", "")):
+                    predicted_finish_seconds = self.predict_finish_seconds(
+                        dataset_api_ids=order(scheduled_dataset_api_ids + [dataset_api_id]))
+                    if (len(scheduled_dataset_api_ids) == 0
+                            or max(predicted_finish_seconds.values()) <= budget_seconds):
+                        scheduled_dataset_api_ids.append(dataset_api_id)
+                    else:
+                        self.deferred_dataset_api_ids.append(dataset_api_id)
+            scheduled_dataset_api_ids = order(scheduled_dataset_api_ids)
+            self.predicted_finish_seconds = self.predict_finish_seconds(dataset_api_ids=scheduled_dataset_api_ids)
+            return scheduled_dataset_api_ids
+
+        def count_records(self, dataset_api_id: str) -> int:
+            """
+            Count the records of a dataset with the record count function, for an estimate of its inspection time.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :return: number of records, or None if they could not be counted
+            """
+            try:
+                return self.record_count_function(dataset_api_id=dataset_api_id)
+            except Exception as e:
+                print("\tPreflight count failed, time estimated at the median: {}. {}".format(dataset_api_id, e))
+                return None
+
+        def estimate_seconds(self, dataset_api_ids: list, is_counting_records: bool) -> dict:
+            """
+            Estimate the inspection time of each dataset from the history, or from its number of records.
+
+            :param dataset_api_ids: Socrata api ids of the datasets
+            :param is_counting_records: True to count the records of datasets without history, if there is a function
+            :return: dictionary of estimated seconds keyed by dataset api id
+            """
+            timed_history_entries = [history_entry for history_entry in self.history.values()
+                                     if history_entry.get("value_count")]
+            total_value_count = sum(history_entry["value_count"] for history_entry in timed_history_entries)
+            if total_value_count > 0:
+                seconds_per_value = (sum(history_entry["inspection_seconds"] for history_entry in timed_history_entries)
+                                     / total_value_count)
+            else:
+                seconds_per_value = default_seconds_per_value
+            counted_history_entries = [history_entry for history_entry in timed_history_entries
+                                       if history_entry.get("record_count")]
+            total_record_count = sum(history_entry["record_count"] for history_entry in counted_history_entries)
+            if total_record_count > 0:
+                fields_per_record = (sum(history_entry["value_count"] for history_entry in counted_history_entries)
+                                     / total_record_count)
+            else:
+                fields_per_record = default_fields_per_record
+
+            estimated_seconds = {}
+            for dataset_api_id in dataset_api_ids:
+                if dataset_api_id in self.history:
+                    estimated_seconds[dataset_api_id] = self.history[dataset_api_id]["inspection_seconds"]
+            untimed_dataset_api_ids = [dataset_api_id for dataset_api_id in dataset_api_ids
+                                       if dataset_api_id not in estimated_seconds]
+            if is_counting_records and self.record_count_function is not None and len(untimed_dataset_api_ids) > 0:
+                print("Counting the records of {} datasets without earlier timings".format(
+                    len(untimed_dataset_api_ids)))
+                with ThreadPoolExecutor(max_workers=self.worker_count) as preflight_executor:
+                    record_counts = preflight_executor.map(self.count_records, untimed_dataset_api_ids)
+                    for dataset_api_id, record_count in zip(untimed_dataset_api_ids, record_counts):
+                        if record_count is not None:
+                            estimated_seconds[dataset_api_id] = record_count * fields_per_record * seconds_per_value
+            median_seconds = calculate_percentile(values=list(estimated_seconds.values()), percentile=50)
+            for dataset_api_id in dataset_api_ids:
+                estimated_seconds.setdefault(dataset_api_id, median_seconds)
+            return estimated_seconds
+
+        def get_finish_seconds(self, dataset_api_id: str) -> tuple:
+            """
+            Get the actual and predicted finish times of a dataset, in seconds from the start of the inspection.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :return: tuple of actual and predicted seconds, either None if unknown
+            """
+            with self.lock:
+                return (self.actual_finish_seconds.get(dataset_api_id),
+                        self.predicted_finish_seconds.get(dataset_api_id))
+
+        def is_full_scan_due(self, dataset_api_id: str, full_scan_every_days: int) -> bool:
+            """
+            Check whether a dataset is due to be inspected in full rather than sampled.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :param full_scan_every_days: Days after which a dataset is inspected in full again
+            :return: True if the dataset has never been inspected in full or not for full_scan_every_days
+            """
+            with self.lock:
+                last_full_scan = self.history.get(dataset_api_id, {}).get("last_full_scan")
+            if last_full_scan is None:
+                return True
+            return (run_date - date.fromisoformat(last_full_scan)).days >= full_scan_every_days
+
+        def predict_finish_seconds(self, dataset_api_ids: list) -> dict:
+            """
+            Predict when each dataset will finish when the datasets are handed out in order to whichever worker frees
+                up first.
+
+            :param dataset_api_ids: Socrata api ids of the datasets, in dispatch order
+            :return: dictionary of predicted finish seconds keyed by dataset api id
+            """
+            worker_free_seconds = [0.0] * max(min(self.worker_count, len(dataset_api_ids)), 1)
+            predicted_finish_seconds = {}
+            for dataset_api_id in dataset_api_ids:
+                start_seconds = heapq.heappop(worker_free_seconds)
+                predicted_finish_seconds[dataset_api_id] = start_seconds + self.estimated_seconds[dataset_api_id]
+                heapq.heappush(worker_free_seconds, predicted_finish_seconds[dataset_api_id])
+            return predicted_finish_seconds
+
+        def record_finish(self, dataset_api_id: str) -> None:
+            """
+            Record that the inspection of a dataset has finished.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :return: None
+            """
+            with self.lock:
+                self.actual_finish_seconds[dataset_api_id] = time.perf_counter() - self.start_time
+            return
+
+        def record_inspection(self, dataset_api_id: str, inspection_seconds: float, value_count: int = None,
+                              record_count: int = None, is_full_scan: bool = True) -> None:
+            """
+            Remember the inspection time and number of values of a dataset inspected today, for later runs.
+
+            The time of a sampled inspection only replaces the time of an earlier full inspection when there is none.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :param inspection_seconds: Seconds the inspection took
+            :param value_count: Number of values in the dataset, None if unknown
+            :param record_count: Number of records in the dataset, None if unknown
+            :param is_full_scan: False if the dataset was sampled
+            :return: None
+            """
+            with self.lock:
+                history_entry = dict(self.history.get(dataset_api_id, {}))
+                if is_full_scan or "inspection_seconds" not in history_entry:
+                    history_entry.update({"inspection_seconds": round(inspection_seconds, 3),
+                                          "record_count": record_count,
+                                          "value_count": value_count})
+                history_entry["last_inspected"] = build_today_date_string()
+                if is_full_scan:
+                    history_entry["last_full_scan"] = build_today_date_string()
+                self.history[dataset_api_id] = history_entry
+                self.is_changed = True
+            return
+
+        def save(self) -> None:
+            """
+            Save the history for later runs, if anything was added. Written to a temporary file first so a failed
+                write cannot leave a partial history file behind.
+
+            :return: None
+            """
+            with self.lock:
+                if not self.is_changed:
+                    return
+                temporary_file_path = "{}.tmp".format(self.file_path)
+                try:
+                    with open(temporary_file_path, 'w') as file_handler:
+                        json.dump(self.history, file_handler)
+                    os.replace(temporary_file_path, self.file_path)
+                    self.is_changed = False
+                except IOError as io_err:
+                    print(io_err)
+            return
+
+        def start(self) -> None:
+            """
+            Start the clock that finish times are measured from, as the first dataset is dispatched.
+
+            :return: None
+            """
+            self.start_time = time.perf_counter()
+            return
+
+        def statistics(self) -> dict:
+            """
+            Summarize the schedule of the run and how well its finish times were predicted.
+
+            :return: dictionary of statistic names and values, in reporting order
+            """
+            with self.lock:
+                finish_errors = [abs(self.actual_finish_seconds[dataset_api_id] - predicted_seconds)
+                                 for dataset_api_id, predicted_seconds in self.predicted_finish_seconds.items()
+                                 if dataset_api_id in self.actual_finish_seconds]
+                return {"Datasets deferred by the time budget": len(self.deferred_dataset_api_ids),
+                        "Predicted inspection finish (seconds)": round(
+                            max(self.predicted_finish_seconds.values(), default=0.0), 2),
+                        "Actual inspection finish (seconds)": round(
+                            max(self.actual_finish_seconds.values(), default=0.0), 2),
+                        "Finish time prediction error p50 (seconds)": round(
+                            calculate_percentile(values=finish_errors, percentile=50), 2),
+                        "Finish time prediction error max (seconds)": round(max(finish_errors, default=0.0), 2)}
+
+    class PerformanceRecorder:
+        """
+        Tally where the time goes for each dataset so that slow datasets and slow phases can be identified.
+
+        Time in HTTP, json decode, null counting, upserts, and csv writes is added up per dataset along with the
+            requests made and bytes downloaded. Inspection time is the wall clock time of the whole inspection of the
+            dataset. Pages are prefetched in the background, so HTTP and json decode time overlap null counting and
+            the parts need not add up to the inspection time. Datasets are added to from several threads.
+        """
+
+        measurement_names = ("Inspection", "HTTP", "JSON decode", "Null counting", "Upsert", "CSV write")
+
+        def __init__(self):
+            self.dataset_measurements = {}
+            self.lock = threading.Lock()
+
+        def add(self, dataset_api_id: str, measurement_name: str, seconds: float, request_count: int = 0,
+                byte_count: int = 0) -> None:
+            """
+            Add time, and optionally requests and bytes, to the tally of a dataset.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :param measurement_name: One of measurement_names
+            :param seconds: Seconds spent
+            :param request_count: Number of HTTP requests made
+            :param byte_count: Number of bytes downloaded
+            :return: None
+            """
+            with self.lock:
+                if dataset_api_id not in self.dataset_measurements:
+                    self.dataset_measurements[dataset_api_id] = {"requests": 0, "bytes": 0,
+                                                                 "seconds": dict.fromkeys(self.measurement_names, 0.0)}
+                measurements = self.dataset_measurements[dataset_api_id]
+                measurements["seconds"][measurement_name] += seconds
+                measurements["requests"] += request_count
+                measurements["bytes"] += byte_count
+            return
+
+        def build_report_records(self, dataset_names: dict) -> list:
+            """
+            Build one record per dataset for the dataset performance csv, slowest dataset first.
+
+            Total seconds is the inspection time plus the upsert and csv write time spent in the main thread.
+
+            :param dataset_names: dictionary of dataset names keyed by dataset api id
+            :return: list of lists of values in the order of dataset_performance_headers
+            """
+            report_records = []
+            with self.lock:
+                for dataset_api_id, measurements in self.dataset_measurements.items():
+                    seconds = measurements["seconds"]
+                    total_seconds = seconds["Inspection"] + seconds["Upsert"] + seconds["CSV write"]
+                    report_records.append([dataset_names.get(dataset_api_id, ""), dataset_api_id,
+                                           round(total_seconds, 3), round(seconds["Inspection"], 3),
+                                           measurements["requests"], measurements["bytes"],
+                                           round(seconds["HTTP"], 3), round(seconds["JSON decode"], 3),
+                                           round(seconds["Null counting"], 3), round(seconds["Upsert"], 3),
+                                           round(seconds["CSV write"], 3)])
+            report_records.sort(key=lambda report_record: report_record[2], reverse=True)
+            return report_records
+
+        def get_measurements(self, dataset_api_id: str) -> dict:
+            """
+            Get a copy of everything tallied for a dataset, to be restored in another process.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :return: dictionary of requests, bytes, and seconds per measurement, None if nothing was tallied
+            """
+            with self.lock:
+                if dataset_api_id not in self.dataset_measurements:
+                    return None
+                measurements = self.dataset_measurements[dataset_api_id]
+                return {"requests": measurements["requests"], "bytes": measurements["bytes"],
+                        "seconds": dict(measurements["seconds"])}
+
+        def get_seconds(self, dataset_api_id: str, measurement_name: str) -> float:
+            """
+            Get the time tallied for a dataset in one measurement.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :param measurement_name: One of measurement_names
+            :return: Seconds spent, 0.0 if nothing was tallied
+            """
+            with self.lock:
+                if dataset_api_id not in self.dataset_measurements:
+                    return 0.0
+                return self.dataset_measurements[dataset_api_id]["seconds"][measurement_name]
+
+        def restore_measurements(self, dataset_api_id: str, measurements: dict) -> None:
+            """
+            Add the tallies of a dataset taken in another process, as returned by get_measurements.
+
+            :param dataset_api_id: Socrata api id of the dataset
+            :param measurements: dictionary of requests, bytes, and seconds per measurement, or None
+            :return: None
+            """
+            if measurements is None:
+                return
+            for measurement_name, seconds in measurements["seconds"].items():
+                self.add(dataset_api_id=dataset_api_id, measurement_name=measurement_name, seconds=seconds)
+            self.add(dataset_api_id=dataset_api_id, measurement_name="Inspection", seconds=0.0,
+                     request_count=measurements["requests"], byte_count=measurements["bytes"])
+            return
+
+        def statistics(self, dataset_names: dict, slowest_count: int) -> dict:
+            """
+            Summarize the dataset timings of the run with percentiles and the slowest datasets.
+
+            :param dataset_names: dictionary of dataset names keyed by dataset api id
+            :param slowest_count: Number of slowest datasets to list
+            :return: dictionary of statistic names and values, in reporting order
+            """
+            report_records = self.build_report_records(dataset_names=dataset_names)
+            total_seconds_list = [report_record[2] for report_record in report_records]
+            recorder_statistics = {}
+            for percentile in (50, 90, 99):
+                recorder_statistics["Dataset time p{} (seconds)".format(percentile)] = round(
+                    calculate_percentile(values=total_seconds_list, percentile=percentile), 3)
+            recorder_statistics["Dataset time max (seconds)"] = max(total_seconds_list, default=0.0)
+            for measurement_name in self.measurement_names[1:]:
+                recorder_statistics["Total {} time across datasets (seconds)".format(measurement_name)] = round(
+                    sum(measurements["seconds"][measurement_name]
+                        for measurements in self.dataset_measurements.values()), 2)
+            for rank, report_record in enumerate(report_records[:slowest_count], start=1):
+                recorder_statistics["Slowest dataset {}".format(rank)] = "{} ({}) {:.2f} seconds".format(
+                    report_record[0], report_record[1], report_record[2])
+            return recorder_statistics
+
+    class UpsertBatcher:
+        """
+        Collect zipper dictionaries bound for a Socrata dataset and upsert them in chunks as array payloads.
+
+        Chunks are sent when they reach the chunk size and whatever remains is sent when flush() is called. A chunk
+            that fails, or that Socrata reports errors for, is written to the problem datasets csv once for every
+            dataset with records in the chunk rather than being lost.
+        """
+
+        def __init__(self, client: Socrata, dataset_identifier: str, chunk_size: int, flush_callback=None):
+            """
+            :param client: Socrata connection client
+            :param dataset_identifier: Unique Socrata dataset identifier. Not the data page identifier but primary page id.
+            :param chunk_size: Number of zipper dictionaries sent in each upsert
+            :param flush_callback: Optional function called with the dataset identifier and the 'DATASET ID' values
+                of every chunk that is upserted successfully
+            """
+            self.client = client
+            self.dataset_identifier = dataset_identifier
+            self.chunk_size = chunk_size
+            self.flush_callback = flush_callback
+            self.pending_zippers = []
+
+        def add(self, zipper: dict) -> None:
+            """
+            Queue a zipper for upsert, sending the chunk if it is full.
+
+            :param zipper: dictionary of zipped results (headers and data values)
+            :return: None
+            """
+            self.pending_zippers.append(zipper)
+            if len(self.pending_zippers) >= self.chunk_size:
+                self.flush()
+            return
+
+        def flush(self) -> None:
+            """
+            Upsert all queued zippers to Socrata as one array payload and report any failure.
+
+            :return: None
+            """
+            if len(self.pending_zippers) == 0:
+                return
+            chunk = self.pending_zippers
+            self.pending_zippers = []
+            failure_message = None
+            upsert_start_time = time.perf_counter()
+            try:
+                upsert_response = self.client.upsert(dataset_identifier=self.dataset_identifier,
+                                                     payload=chunk,
+                                                     content_type='json')
+            except Exception as e:
+                failure_message = "Error upserting chunk of {} records to Socrata. {}".format(len(chunk), e)
+            else:
+                error_count = upsert_response.get("Errors", 0) if isinstance(upsert_response, dict) else 0
+                if error_count:
+                    failure_message = "Socrata reported {} errors upserting chunk of {} records".format(error_count,
+                                                                                                     len(chunk))
+
+            # The time of the chunk is shared out among its datasets by their number of records in it
+            upsert_seconds = time.perf_counter() - upsert_start_time
+            chunk_dataset_api_ids = [zipper["DATASET ID"] for zipper in chunk]
+            for chunk_dataset_api_id in set(chunk_dataset_api_ids):
+                performance_recorder.add(dataset_api_id=chunk_dataset_api_id,
+                                         measurement_name="Upsert",
+                                         seconds=upsert_seconds * chunk_dataset_api_ids.count(chunk_dataset_api_id)
+                                         / len(chunk))
+            if failure_message is None:
+                print("\tUPSERTED: {} records to {}".format(len(chunk), self.dataset_identifier))
+                if self.flush_callback is not None:
+                    self.flush_callback(dataset_identifier=self.dataset_identifier,
+                                        dataset_api_ids=sorted(set(zipper["DATASET ID"] for zipper in chunk)))
+                return
+            print("{}: {}".format(failure_message, self.dataset_identifier))
+            for chunk_dataset_name in sorted(set(zipper["DATASET NAME"] for zipper in chunk)):
+                write_problematic_datasets_to_csv(root_file_destination_location=root_path_for_csv_output,
+                                                  filename=problem_datasets_csv_filename,
+                                                  dataset_name=chunk_dataset_name,
+                                                  message=failure_message.replace(",", ";"),
+                                                  resource=self.dataset_identifier)
+            return
+
     # FUNCTIONS (alphabetic)
+    def append_to_inspection_journal(file_path: str, journal_entry: dict) -> None:
+        """
+        Append an entry to the inspection journal and force it to disk so it survives a crash
+
+        :param file_path: Path to the inspection journal file
+        :param journal_entry: dictionary to be written as one line of json
+        :return: None
+        """
+        try:
+            with open(file_path, 'a') as file_handler:
+                file_handler.write("{}\n".format(json.dumps(journal_entry)))
+                file_handler.flush()
+                os.fsync(file_handler.fileno())
+        except IOError as io_err:
+            print(io_err)
+            exit()
+        return
+
     def build_csv_file_name_with_date(today_date_string: str, filename: str) -> str:
         """
         Build a string, ending in .csv, that contains todays date and the provided file name
@@ -120,13 +866,66 @@ def main():
             datasets_dictionary[dataset_name] = api_id
         return datasets_dictionary
 
+    def build_keyset_dataset_url(url_root: str, api_id: str, limit_amount: int, last_row_id: str = None,
+                                 select_field_names: list = None) -> str:
+        """
+        Build the url used for each request for data from socrata when paging by the :id system field
+
+        Records are ordered by :id and each request asks for the records after the last :id seen instead of skipping
+            an ever larger $offset. Time per request stays flat across a dataset and records are not skipped or
+            repeated if the dataset changes during processing.
+
+        :param url_root: Root socrata url common to all datasets
+        :param api_id: ID specific to dataset of interest
+        :param limit_amount: Upper limit on number of records to be returned in response to request
+        :param last_row_id: The :id of the last record of the previous request. None for the first request.
+        :param select_field_names: Fields to select along with :id. None selects every field.
+        :return: String url
+        """
+        select_string = "*" if select_field_names is None else ",".join(select_field_names)
+        url = "{}{}.json?$select=:id,{}&$order=:id&$limit={}".format(url_root, api_id, select_string, limit_amount)
+        if last_row_id is None:
+            return url
+        else:
+            return "{}&$where=:id > '{}'".format(url, last_row_id)
+
+    def build_offset_dataset_url(url_root: str, api_id: str, limit_amount: int, offset: int) -> str:
+        """
+        Build the url used to request a page of records from socrata by its offset in :id order
+
+        Unlike keyset paging every page can be requested without waiting for the page before it. The :id of each
+            record is selected so that paging can carry on by keyset from the last page.
+
+        :param url_root: Root socrata url common to all datasets
+        :param api_id: ID specific to dataset of interest
+        :param limit_amount: Upper limit on number of records to be returned in response to request
+        :param offset: Number of records, in :id order, before the first record of the page
+        :return: String url
+        """
+        return "{}{}.json?$select=:id,*&$order=:id&$limit={}&$offset={}".format(url_root, api_id, limit_amount,
+                                                                              offset)
+
+    def build_shard_file_name(file_name: str, shard_number: int = None) -> str:
+        """
+        Build the name of a file kept by one shard, so that shards sharing a folder do not overwrite each other
+
+        :param file_name: Name of the file in an unsharded run
+        :param shard_number: Number of the shard, 1 to NUMBER_OF_SHARDS, or None in an unsharded run
+        :return: string that is 'name_SHARD_n_OF_N.extension', or the file name unchanged when not sharded
+        """
+        if shard_number is None:
+            return file_name
+        file_root, file_extension = os.path.splitext(file_name)
+        return "{}_SHARD_{}_OF_{}{}".format(file_root, shard_number, NUMBER_OF_SHARDS, file_extension)
+
     def build_today_date_string() -> str:
         """
-        Build a string representing todays date.
+        Build a string representing the date of the run, fixed when the process starts or given with --run-date, so
+            a run crossing midnight keeps one date.
 
         :return: string representing date formatted as Year Month Day. Formatted to meet Socrata accepted style
         """
-        return "{:%Y-%m-%d}".format(date.today())
+        return "{:%Y-%m-%d}".format(run_date)
 
     def calculate_percent_null(null_count_total: int, total_data_values: int) -> float:
         """
@@ -173,6 +972,130 @@ def main():
         else:
             return int(total_records_processed * number_of_fields_in_dataset)
 
+    def choose_sampled_page_offsets(record_count: int, sampled_page_count: int) -> list:
+        """
+        Choose the pages of a stratified random sample of the records of a dataset, as offsets in :id order
+
+        The pages are split into sampled_page_count strata of consecutive pages and one page is picked at random from
+            each, the first stratum included, so that the sample is spread across the whole dataset and every page of
+            a stratum is as likely to be picked.
+
+        :param record_count: Number of records in the dataset
+        :param sampled_page_count: Number of pages to sample, fewer than the pages of the dataset
+        :return: sorted list of the offsets of the sampled pages, offset 0 when the first page is picked
+        """
+        page_count = int(math.ceil(record_count / limit_max_and_offset))
+        stratum_boundaries = [page_count * stratum // sampled_page_count for stratum in range(sampled_page_count + 1)]
+        return [random.randrange(stratum_boundaries[stratum], stratum_boundaries[stratum + 1]) * limit_max_and_offset
+                for stratum in range(sampled_page_count)]
+
+    def count_null_values_in_page(field_null_count_dict: dict, records: list) -> None:
+        """
+        Count the null values in every field for a whole page of socrata records in one pass
+
+        Socrata leaves null/empty values out of records, so the fields missing from a record are its nulls. The
+            missing fields of each record are found with a set difference, which does the checking of every field
+            in C rather than in a Python loop, and the missing fields of the whole page are tallied at once. Keys that
+            are not fields of the dataset, like :id, are ignored.
+
+        :param field_null_count_dict: dictionary that counts the nulls for each field in the dataset
+        :param records: list of the data records in the page
+        :return: nothing
+        """
+        field_names = frozenset(field_null_count_dict.keys())
+        missing_field_counts = collections.Counter(itertools.chain.from_iterable(map(field_names.difference,
+                                                                                      records)))
+        for field_name, missing_count in missing_field_counts.items():
+            field_null_count_dict[field_name] += missing_count
+        return
+
+    def count_null_values_in_process_pool(dataset_api_id: str, response: requests.Response, field_names: list) -> dict:
+        """
+        Hand the body of a page to the process pool to decode and count, and wait for its counts
+
+        The calling thread only reads the body. Decoding and counting happen in a worker process, so threads
+            fetching other pages are not held up by them. The counts arrive as one array in the order of the field
+            names and are returned in the form scan_record_keys() returns them, for the same page.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param response: requests response of the page, with stream=True when TURN_ON_RECORD_KEY_SCANNING
+        :param field_names: List of field names of the dataset, or of a field group
+        :return: dictionary of the number of records, the :id of the last record, and the count of records missing
+            each field
+        """
+        page_bytes = response.content
+        if TURN_ON_RECORD_KEY_SCANNING:
+            read_session.record_streamed_bytes(response=response, bytes_decoded=len(page_bytes))
+            performance_recorder.add(dataset_api_id=dataset_api_id,
+                                     measurement_name="HTTP",
+                                     seconds=0.0,
+                                     byte_count=len(page_bytes))
+        record_count, last_row_id, missing_counts = cpu_process_pool.submit(count_missing_fields_in_page_bytes,
+                                                                            page_bytes, field_names).result()
+        return {"last_row_id": last_row_id,
+                "missing_field_counts": collections.Counter({field_name: missing_count
+                                                             for field_name, missing_count in zip(field_names,
+                                                                                                  missing_counts)
+                                                             if missing_count > 0}),
+                "record_count": record_count}
+
+    def count_nulls_with_soql_aggregates(dataset_api_id: str) -> dict:
+        """
+        Count the records and the null values in every field of a dataset using SoQL aggregates on the Socrata side.
+
+        Rather than downloading every record, ask Socrata for count(*) and count(field) per field. Socrata's count of a
+            field only counts non-null values so the null count is the difference. Fields are batched into the $select
+            of each request, soql_aggregate_fields_per_request at a time.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: dictionary of record count, column count, and null counts per field, or None if the field names
+            could not be determined or the dataset has no records. The row scan handles those cases.
+        """
+        url = build_dataset_url(url_root=root_url_for_dataset_access,
+                                api_id=dataset_api_id,
+                                limit_amount=1,
+                                offset=0,
+                                total_count=0)
+        socrata_url_response = request_for_dataset(dataset_api_id=dataset_api_id, url=url)
+        socrata_url_response.raise_for_status()
+        field_headers = determine_field_headers(dataset_api_id=dataset_api_id,
+                                                socrata_url_response=socrata_url_response)
+        if field_headers is None or len(socrata_url_response.json()) == 0:
+            return None
+
+        null_count_for_each_field_dict = {}
+        total_record_count = None
+        aggregate_url = "{}{}.json".format(root_url_for_dataset_access, dataset_api_id)
+        for index in range(0, len(field_headers), soql_aggregate_fields_per_request):
+            fields_batch = field_headers[index: index + soql_aggregate_fields_per_request]
+
+            # Field names are quoted and aliases are positional so that neither can collide with SoQL reserved words
+            #   or trip on unusual characters
+            select_clauses = ["count(*) AS total_count"]
+            for position, field_name in enumerate(fields_batch):
+                select_clauses.append("count(`{}`) AS field_count_{}".format(field_name, position))
+            print("{}?$select=count(...) fields {}-{}".format(aggregate_url, index, index + len(fields_batch) - 1))
+            aggregate_response = request_for_dataset(dataset_api_id=dataset_api_id,
+                                                     url=aggregate_url,
+                                                     params={"$select": ", ".join(select_clauses)})
+            aggregate_response.raise_for_status()
+            aggregate_record = aggregate_response.json()[0]
+
+            batch_record_count = int(aggregate_record["total_count"])
+            if total_record_count is None:
+                total_record_count = batch_record_count
+            elif batch_record_count != total_record_count:
+                raise ValueError("Record count changed between aggregate requests")
+            for position, field_name in enumerate(fields_batch):
+                field_value_count = int(aggregate_record.get("field_count_{}".format(position), 0))
+                null_count_for_each_field_dict[field_name] = total_record_count - field_value_count
+
+        if total_record_count == 0:
+            return None
+        return {"null_count_for_each_field_dict": null_count_for_each_field_dict,
+                "number_of_columns_in_dataset": len(field_headers),
+                "total_record_count": total_record_count}
+
     def create_socrata_client(cfg_parser: configparser.ConfigParser, maryland_domain: str, dataset_key: str) -> Socrata:
         """
         Create and return a Socrata client for use.
@@ -189,7 +1112,83 @@ def main():
         app_token = cfg_parser[dataset_key]["APP_TOKEN"]
         username = cfg_parser["DEFAULT"]["USERNAME"]
         password = cfg_parser["DEFAULT"]["PASSWORD"]
-        return Socrata(domain=maryland_domain, app_token=app_token, username=username, password=password)
+
+        # sodapy assumes https. A plain http portal, like the local stand-in server, needs an http adapter.
+        session_adapter = None
+        if cfg_parser["DEFAULT"].get("URI_SCHEME", "https") == "http":
+            session_adapter = {"prefix": "http://", "adapter": requests.adapters.HTTPAdapter()}
+        return Socrata(domain=maryland_domain, app_token=app_token, username=username, password=password,
+                       session_adapter=session_adapter)
+
+    def determine_field_headers(dataset_api_id: str, socrata_url_response: requests.Response) -> list:
+        """
+        Determine the field names of a dataset from a Socrata response.
+
+        For datasets with a lot of fields it looks like Socrata doesn't return the field headers in the
+            response.info() so the X-SODA2-Fields key DNE. If Socrata didn't send the headers the field names come
+            from the columns of the views metadata, through the column metadata cache.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param socrata_url_response: response from a request for records of the dataset
+        :return: list of field names, or None if the field names could not be determined
+        """
+        if "X-SODA2-Fields" in socrata_url_response.headers:
+
+            # The :id system field is only present when selected for keyset pagination. It is not a dataset field.
+            dataset_fields_string = socrata_url_response.headers["X-SODA2-Fields"].replace('":id"', '')
+            return re.findall("[a-zA-Z0-9_]+", dataset_fields_string)
+        return column_metadata_cache.get_field_names(dataset_api_id=dataset_api_id)
+
+    def estimate_null_counts_from_sample(page_counts_list: list, field_names: list, record_count: int,
+                                         page_count: int) -> dict:
+        """
+        Estimate the null count of every field of a dataset, with confidence intervals on the percent null of every
+            field and of the whole dataset, from the counts of a sample of its pages
+
+        Each page is a cluster of records. The share of values that are null is estimated by the ratio of the nulls to
+            the values across the sampled pages and scaled up to the record count of the dataset. Its standard error is
+            that of a ratio estimate from a simple random sample of clusters, with the finite population correction,
+            which overstates the error of the stratified sample taken. Intervals reach confidence_interval_z_score
+            standard errors either side of the estimate, within 0 to 100 percent.
+
+        :param page_counts_list: list of dictionaries of the record count and the count of records missing each field,
+            one for each sampled page
+        :param field_names: Field names of the dataset
+        :param record_count: Number of records in the dataset
+        :param page_count: Number of pages in the dataset
+        :return: dictionary of the estimated null count of each field, the lower and upper percent null of each field,
+            and the lower and upper percent null of the dataset
+        """
+        sampled_page_count = len(page_counts_list)
+        sampled_record_counts = [page_counts["record_count"] for page_counts in page_counts_list]
+
+        def estimate_null_share(null_counts: list, value_counts: list) -> tuple:
+            null_share = sum(null_counts) / sum(value_counts)
+            mean_value_count = sum(value_counts) / sampled_page_count
+            squared_residual_total = sum((null_count - null_share * value_count) ** 2
+                                         for null_count, value_count in zip(null_counts, value_counts))
+            variance = ((1.0 - sampled_page_count / page_count) * squared_residual_total
+                        / (sampled_page_count * (sampled_page_count - 1) * mean_value_count ** 2))
+            margin = confidence_interval_z_score * math.sqrt(max(variance, 0.0))
+            return null_share, max(null_share - margin, 0.0), min(null_share + margin, 1.0)
+
+        null_count_for_each_field_dict = {}
+        percent_null_bounds_for_each_field_dict = {}
+        for field_name in field_names:
+            null_share, lower_share, upper_share = estimate_null_share(
+                null_counts=[page_counts["missing_field_counts"].get(field_name, 0)
+                             for page_counts in page_counts_list],
+                value_counts=sampled_record_counts)
+            null_count_for_each_field_dict[field_name] = int(round(null_share * record_count))
+            percent_null_bounds_for_each_field_dict[field_name] = [round(lower_share * 100.0, 2),
+                                                                   round(upper_share * 100.0, 2)]
+        _, lower_share, upper_share = estimate_null_share(
+            null_counts=[sum(page_counts["missing_field_counts"].get(field_name, 0) for field_name in field_names)
+                         for page_counts in page_counts_list],
+            value_counts=[sampled_record_count * len(field_names) for sampled_record_count in sampled_record_counts])
+        return {"null_count_for_each_field_dict": null_count_for_each_field_dict,
+                "percent_null_bounds": [round(lower_share * 100.0, 2), round(upper_share * 100.0, 2)],
+                "percent_null_bounds_for_each_field_dict": percent_null_bounds_for_each_field_dict}
 
     def generate_freshness_report_json_objects(dataset_url: str) -> dict:
         """
@@ -201,7 +1200,7 @@ def main():
         json_objects = None
         url = dataset_url
         try:
-            response = requests.get(url)
+            response = read_session.get(url)
         except Exception as e:
             if hasattr(e, "reason"):
                 print("build_datasets_inventory(): Failed to reach a server. Reason: {}".format(e.reason))
@@ -212,6 +1211,325 @@ def main():
             json_objects = response.json()
         return json_objects
 
+    def generate_record_pages(dataset_api_id: str, is_sampling_allowed: bool = False):
+        """
+        Yield the pages of records of a dataset while the following pages are fetched in the background.
+
+        A worker thread requests the pages, up to PREFETCH_PAGE_DEPTH pages ahead of the page being counted, so that
+            network I/O overlaps with null counting. Each page is a dictionary of the url, the response, the number of
+            records, the :id of the last record, the field names once known, and the exception if the request failed.
+            With TURN_ON_RECORD_KEY_SCANNING the page is streamed and its records are counted by scan_record_keys() in
+            the worker thread as they arrive, and the page carries the count of records missing each field instead of
+            the list of record dictionaries. Scanning bounds memory but takes more CPU than decoding the page whole,
+            so once a scanned page shows records averaging under RECORD_KEY_SCANNING_RECORD_BYTES the later pages of
+            the dataset are decoded whole. Wide and long text datasets, where memory is the constraint, are scanned.
+            With CPU_WORKER_PROCESSES above 0 the body of each page whose field names are known is decoded and counted
+            in the process pool instead, by count_null_values_in_process_pool(), and the page carries the counts.
+            With TURN_ON_COLUMN_SHARDED_FETCHING a page of a dataset with more than COLUMN_SHARD_FIELD_THRESHOLD fields
+            is requested a group of COLUMNS_PER_SHARD fields at a time, up to COLUMN_SHARD_WORKERS groups at once.
+            Every group selects :id and asks for the same keyset range so the groups hold the same records, which is
+            checked, and the counts of the groups are merged into one page. The first page is requested whole unless
+            the field names are already in the column metadata cache.
+            With PAGE_FETCH_WORKERS above 1 and keyset paging, a full first page of a dataset that is not sharded is
+            followed by a count(*) of its records. The remaining pages are then known and are requested by offset,
+            that many at a time, and yielded in the order they arrive. Null counts do not depend on the order. A page
+            holding fewer records than counted fails the dataset, as records may have been skipped. Afterward the
+            count and the last :id of the dataset are requested again. If either changed, or the last page did not
+            hold the rest of the records counted, records may have moved between pages. A page marked "is_restart"
+            then tells the consumer to discard its counts, and the dataset is paged again by keyset.
+            When sampling is allowed, and the count is over SAMPLING_RECORD_THRESHOLD, only SAMPLED_PAGES pages are
+            requested, one page picked at random from each stratum of pages. The first page, already requested, is
+            only part of the sample if it was picked, as the "is_first_page_sampled" of the record and page counts
+            of the dataset that the sampled pages carry under "sample".
+            Paging ends after a failed request or the first page with fewer records than the limit. Closing the
+            generator stops the worker thread.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param is_sampling_allowed: True to sample the pages of a dataset with more than SAMPLING_RECORD_THRESHOLD
+            records
+        :return: generator of page dictionaries
+        """
+        page_queue = queue.Queue(maxsize=PREFETCH_PAGE_DEPTH)
+        small_records_event = threading.Event()
+        stop_event = threading.Event()
+
+        is_sharding_possible = TURN_ON_COLUMN_SHARDED_FETCHING and TURN_ON_KEYSET_PAGINATION
+        is_page_planning_possible = PAGE_FETCH_WORKERS > 1 and TURN_ON_KEYSET_PAGINATION
+        is_sampling_possible = is_sampling_allowed and TURN_ON_KEYSET_PAGINATION
+
+        def put_page(page) -> None:
+            while not stop_event.is_set():
+                try:
+                    page_queue.put(page, timeout=0.5)
+                    return
+                except queue.Full:
+                    continue
+            return
+
+        def build_page(url: str, field_names: list) -> dict:
+            return {"url": url, "response": None, "records": None, "record_count": 0, "last_row_id": None,
+                    "missing_field_counts": None, "field_names": field_names, "sample": None, "exception": None,
+                    "is_restart": False}
+
+        def fetch_field_group(field_group: list, last_row_id: str) -> dict:
+            url = build_keyset_dataset_url(url_root=root_url_for_dataset_access,
+                                           api_id=dataset_api_id,
+                                           limit_amount=limit_max_and_offset,
+                                           last_row_id=last_row_id,
+                                           select_field_names=field_group)
+            response = request_for_dataset(dataset_api_id=dataset_api_id,
+                                           url=url,
+                                           stream=TURN_ON_RECORD_KEY_SCANNING)
+            response.raise_for_status()
+            decode_start_time = time.perf_counter()
+            if cpu_process_pool is not None:
+                group_counts = count_null_values_in_process_pool(dataset_api_id=dataset_api_id,
+                                                                 response=response,
+                                                                 field_names=field_group)
+            elif TURN_ON_RECORD_KEY_SCANNING:
+                record_reader = StreamingRecordReader(response=response)
+                group_counts = scan_record_keys(record_reader=record_reader, field_names=field_group)
+                read_session.record_streamed_bytes(response=response, bytes_decoded=record_reader.byte_count)
+                performance_recorder.add(dataset_api_id=dataset_api_id,
+                                         measurement_name="HTTP",
+                                         seconds=0.0,
+                                         byte_count=record_reader.byte_count)
+            else:
+                group_counts = scan_record_keys(record_reader=response.json(), field_names=field_group)
+            performance_recorder.add(dataset_api_id=dataset_api_id,
+                                     measurement_name="JSON decode",
+                                     seconds=time.perf_counter() - decode_start_time)
+            return group_counts
+
+        def fetch_offset_page(offset: int, field_names: list, sample: dict) -> dict:
+            page = build_page(url=build_offset_dataset_url(url_root=root_url_for_dataset_access,
+                                                           api_id=dataset_api_id,
+                                                           limit_amount=limit_max_and_offset,
+                                                           offset=offset),
+                              field_names=field_names)
+            page["sample"] = sample
+            try:
+                fetch_whole_page(page=page)
+            except Exception as e:
+                page["exception"] = e
+            return page
+
+        def fetch_planned_pages(field_names: list, planned_record_count: int, planned_offsets: list,
+                                sample: dict) -> dict:
+
+            # The pages after the first, by offset in :id order. Few more pages than there are workers are requested
+            #   at once so that pages waiting for the counter do not pile up.
+            offsets_to_request = iter(planned_offsets)
+            last_planned_page = None
+            print("{} pages of {} records planned{}, fetching {} at a time: {}".format(
+                len(planned_offsets) + 1, limit_max_and_offset,
+                "" if sample is None else " as a sample of {}".format(sample["page_count"]),
+                PAGE_FETCH_WORKERS, dataset_api_id))
+            with ThreadPoolExecutor(max_workers=min(PAGE_FETCH_WORKERS, len(planned_offsets))) as page_executor:
+                page_futures = {page_executor.submit(fetch_offset_page, offset=offset, field_names=field_names,
+                                                     sample=sample): offset
+                                for offset in itertools.islice(offsets_to_request, PAGE_FETCH_WORKERS)}
+                while page_futures:
+                    completed_futures, _ = wait(page_futures, return_when=FIRST_COMPLETED)
+                    for page_future in completed_futures:
+                        offset = page_futures.pop(page_future)
+                        page = page_future.result()
+
+                        # A page short of its planned records means records moved between pages, as when records
+                        #   were deleted during fetching, and others may have been skipped
+                        expected_record_count = min(limit_max_and_offset, planned_record_count - offset)
+                        if page["exception"] is None and page["record_count"] < expected_record_count:
+                            page["exception"] = ValueError(
+                                "Dataset changed while paging. Page at offset {} held {} records of {} counted".format(
+                                    offset, page["record_count"], expected_record_count))
+                        put_page(page)
+                        if page["exception"] is not None:
+                            last_planned_page = page
+                        elif offset == planned_offsets[-1] and last_planned_page is None:
+                            last_planned_page = page
+                    if stop_event.is_set() or (last_planned_page is not None
+                                               and last_planned_page["exception"] is not None):
+                        for page_future in page_futures:
+                            page_future.cancel()
+                        break
+                    for offset in itertools.islice(offsets_to_request, len(completed_futures)):
+                        page_futures[page_executor.submit(fetch_offset_page, offset=offset, field_names=field_names,
+                                                          sample=sample)] = offset
+            return last_planned_page
+
+        def fetch_whole_page(page: dict) -> None:
+            print(page["url"])
+            page["response"] = request_for_dataset(dataset_api_id=dataset_api_id,
+                                                   url=page["url"],
+                                                   stream=TURN_ON_RECORD_KEY_SCANNING)
+            decode_start_time = time.perf_counter()
+
+            # Field names only come with the first page. Without them the records are decoded as before. Reading a
+            #   streamed body is timed along with decoding it.
+            if ((TURN_ON_RECORD_KEY_SCANNING or is_sharding_possible or cpu_process_pool is not None)
+                    and page["field_names"] is None):
+                page["field_names"] = determine_field_headers(dataset_api_id=dataset_api_id,
+                                                              socrata_url_response=page["response"])
+            if cpu_process_pool is not None and page["field_names"] is not None:
+                page.update(count_null_values_in_process_pool(dataset_api_id=dataset_api_id,
+                                                              response=page["response"],
+                                                              field_names=page["field_names"]))
+            elif (TURN_ON_RECORD_KEY_SCANNING and page["field_names"] is not None
+                  and not small_records_event.is_set()):
+                record_reader = StreamingRecordReader(response=page["response"])
+                page.update(scan_record_keys(record_reader=record_reader, field_names=page["field_names"]))
+                if record_reader.byte_count < RECORD_KEY_SCANNING_RECORD_BYTES * max(record_reader.record_count, 1):
+                    small_records_event.set()
+                read_session.record_streamed_bytes(response=page["response"], bytes_decoded=record_reader.byte_count)
+                performance_recorder.add(dataset_api_id=dataset_api_id,
+                                         measurement_name="HTTP",
+                                         seconds=0.0,
+                                         byte_count=record_reader.byte_count)
+            else:
+                page["records"] = page["response"].json()
+                if TURN_ON_RECORD_KEY_SCANNING:
+                    read_session.record_streamed_bytes(response=page["response"],
+                                                       bytes_decoded=len(page["response"].content))
+                page["record_count"] = len(page["records"])
+                if page["record_count"] > 0:
+                    page["last_row_id"] = page["records"][-1].get(":id")
+            performance_recorder.add(dataset_api_id=dataset_api_id,
+                                     measurement_name="JSON decode",
+                                     seconds=time.perf_counter() - decode_start_time)
+            return
+
+        def fetch_pages() -> None:
+            field_groups = None
+            field_names = None
+            is_keyset_rescan = False
+            last_row_id = None
+            shard_executor = None
+            socrata_record_offset_value = 0
+            total_record_count = 0
+
+            # Sharding needs the :id order of keyset paging to line up the records of the field groups. When the
+            #   field names of a dataset wide enough to shard are already cached even the first page can be sharded.
+            #   Other datasets take their field names from X-SODA2-Fields of the first page as usual.
+            if is_sharding_possible:
+                cached_field_names = column_metadata_cache.get_cached_field_names(dataset_api_id=dataset_api_id)
+                if cached_field_names is not None and len(cached_field_names) > COLUMN_SHARD_FIELD_THRESHOLD:
+                    field_names = cached_field_names
+            try:
+                while not stop_event.is_set():
+                    if (is_sharding_possible and field_groups is None and field_names is not None
+                            and len(field_names) > COLUMN_SHARD_FIELD_THRESHOLD):
+                        field_groups = [field_names[index: index + COLUMNS_PER_SHARD]
+                                        for index in range(0, len(field_names), COLUMNS_PER_SHARD)]
+                        shard_executor = ThreadPoolExecutor(max_workers=min(COLUMN_SHARD_WORKERS, len(field_groups)))
+
+                    # Once the first page is full the records are counted, so the remaining pages are known and can
+                    #   be requested concurrently, or sampled. Paging in order continues if the count fails, if the
+                    #   dataset grew, or if the pages are neither requested concurrently nor sampled.
+                    if ((is_page_planning_possible or is_sampling_possible) and field_groups is None
+                            and not is_keyset_rescan and socrata_record_offset_value == limit_max_and_offset):
+                        try:
+                            planned_record_count = request_record_count(dataset_api_id=dataset_api_id)
+                        except Exception as e:
+                            print("\tRecord count failed, paging in order: {}. {}".format(dataset_api_id, e))
+                            planned_record_count = None
+                        if planned_record_count is not None and planned_record_count <= limit_max_and_offset:
+                            break
+                        sample = None
+                        if planned_record_count is not None:
+                            planned_offsets = list(range(limit_max_and_offset, planned_record_count,
+                                                         limit_max_and_offset))
+                            if (is_sampling_possible and planned_record_count > SAMPLING_RECORD_THRESHOLD
+                                    and 2 <= SAMPLED_PAGES <= len(planned_offsets)):
+                                sampled_offsets = choose_sampled_page_offsets(record_count=planned_record_count,
+                                                                              sampled_page_count=SAMPLED_PAGES)
+                                sample = {"page_count": len(planned_offsets) + 1, "record_count": planned_record_count,
+                                          "is_first_page_sampled": sampled_offsets[0] == 0}
+                                planned_offsets = [offset for offset in sampled_offsets if offset > 0]
+                        if sample is not None or (planned_record_count is not None and is_page_planning_possible):
+                            last_planned_page = fetch_planned_pages(field_names=field_names,
+                                                                    planned_record_count=planned_record_count,
+                                                                    planned_offsets=planned_offsets,
+                                                                    sample=sample)
+                            if (sample is not None or last_planned_page is None
+                                    or last_planned_page["exception"] is not None):
+                                break
+
+                            # Records added or deleted while pages were requested by offset shift the records after
+                            #   them between pages, so some may have been counted twice or skipped
+                            try:
+                                is_dataset_unchanged = (
+                                    last_planned_page["record_count"] == planned_record_count - planned_offsets[-1]
+                                    and request_record_count(dataset_api_id=dataset_api_id) == planned_record_count
+                                    and request_last_row_id(
+                                        dataset_api_id=dataset_api_id) == last_planned_page["last_row_id"])
+                            except Exception as e:
+                                print("\tRecount failed: {}. {}".format(dataset_api_id, e))
+                                is_dataset_unchanged = False
+                            if is_dataset_unchanged:
+                                break
+                            print("\tDataset changed while paging, paging again by keyset: {}".format(dataset_api_id))
+                            restart_page = build_page(url=None, field_names=field_names)
+                            restart_page["is_restart"] = True
+                            put_page(restart_page)
+                            is_keyset_rescan = True
+                            last_row_id = None
+                            socrata_record_offset_value = 0
+                            total_record_count = 0
+                            continue
+
+                    if TURN_ON_KEYSET_PAGINATION:
+                        url = build_keyset_dataset_url(url_root=root_url_for_dataset_access,
+                                                       api_id=dataset_api_id,
+                                                       limit_amount=limit_max_and_offset,
+                                                       last_row_id=last_row_id)
+                    else:
+                        url = build_dataset_url(url_root=root_url_for_dataset_access,
+                                                api_id=dataset_api_id,
+                                                limit_amount=limit_max_and_offset,
+                                                offset=socrata_record_offset_value,
+                                                total_count=total_record_count)
+                    page = build_page(url=url, field_names=field_names)
+                    try:
+                        if field_groups is not None:
+                            print("{} in {} groups of fields".format(url, len(field_groups)))
+                            field_group_futures = [shard_executor.submit(fetch_field_group,
+                                                                         field_group=field_group,
+                                                                         last_row_id=last_row_id)
+                                                   for field_group in field_groups]
+                            page.update(merge_field_group_counts(
+                                field_group_counts_list=[future.result() for future in field_group_futures]))
+                        else:
+                            fetch_whole_page(page=page)
+                            field_names = page["field_names"]
+                    except Exception as e:
+                        page["exception"] = e
+                    put_page(page)
+
+                    # Any page that is short of the max limit indicates no other request is needed. Pacing of the
+                    #   requests is left to the rate limiter of the read session.
+                    if page["exception"] is not None or page["record_count"] != limit_max_and_offset:
+                        break
+                    last_row_id = page["last_row_id"]
+                    total_record_count += limit_max_and_offset
+                    socrata_record_offset_value += limit_max_and_offset
+            finally:
+                if shard_executor is not None:
+                    shard_executor.shutdown()
+            put_page(None)
+            return
+
+        fetch_thread = threading.Thread(target=fetch_pages, daemon=True)
+        fetch_thread.start()
+        try:
+            while True:
+                page = page_queue.get()
+                if page is None:
+                    break
+                yield page
+        finally:
+            stop_event.set()
+        return
+
     def generate_id_from_args(*args, separator: str = "."):
         """
         Create a string from args, separated by separator value.
@@ -224,23 +1542,16 @@ def main():
         arg_stringified_list = [str(arg) for arg in args]
         return sep.join(arg_stringified_list)
 
-    def grab_field_names_for_mega_columned_datasets(socrata_json_object: dict) -> dict:
+    def grab_field_names_from_view_columns(column_list: list) -> dict:
         """
-        Generate a dictionary of column names. Specific to very large datasets where field names are suppressed by socrata.
+        Generate a dictionary of column names from the columns of the views metadata. Used for datasets with so many
+            fields that socrata suppresses the field names.
 
-        :param socrata_json_object: response.info() json content from socrata
+        :param column_list: list of column dictionaries from the views metadata of a dataset
         :return: dictionary of hidden and visible field names in dataset
         """
-        column_list = None
         field_names_list_visible = []
         field_names_list_hidden = []
-        try:
-            meta = socrata_json_object['meta']
-            view = meta['view']
-            column_list = view['columns']
-        except KeyError as ke:
-            print("Problem accessing json dictionary in Mega Column Dataset File. Key not found = {}".format(ke))
-            exit()
         for dictionary in column_list:
             temp_field_list = dictionary.keys()
             if 'flags' in temp_field_list:
@@ -265,21 +1576,239 @@ def main():
         strings_list = re.findall(re_string,string_with_illegals)
         return "".join(strings_list)
 
-    def inspect_record_for_null_values(field_null_count_dict: dict, record_dictionary: dict) -> None:
+    def inspect_dataset(dataset_name: str, dataset_api_id: str) -> dict:
         """
-        Inspect the socrata record for the number of null values
+        Request all records of a dataset from Socrata and inventory the null values in every field.
 
-        :param field_null_count_dict: dictionary that counts the nulls for each field in the dataset
-        :param record_dictionary: the data record to be evaluated
-        :return: nothing
+        With TURN_ON_SAMPLING, a dataset with more than SAMPLING_RECORD_THRESHOLD records is inspected from a sample
+            of its pages unless a full scan is due, and its null counts are estimates with confidence intervals.
+
+        NOTE: Runs in a worker thread when NUMBER_OF_INSPECTION_WORKERS is greater than 1. Nothing shared is modified
+            here; counters and outputs are handled by the caller as results are collected.
+
+        :param dataset_name: Name of the dataset from the data freshness report
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: dictionary of inspection results for the dataset
         """
-        # In the response from a request to Socrata, only the fields with non-null/empty values appear to be included
-        record_dictionary_fields = record_dictionary.keys()
-        for field_name in field_null_count_dict.keys():
-            # It appears Socrata does not send empty fields so absence will be presumed to indicate empty/null values
-            if field_name not in record_dictionary_fields:
-                field_null_count_dict[field_name] += 1
-        return
+
+        # Variables for next lower scope (alphabetic)
+        field_headers = None
+        is_problematic = False
+        is_sampling_allowed = (TURN_ON_SAMPLING
+                               and not dataset_scheduler.is_full_scan_due(dataset_api_id=dataset_api_id,
+                                                                          full_scan_every_days=FULL_SCAN_EVERY_DAYS))
+        first_page_counts = None
+        null_count_for_each_field_dict = {}
+        number_of_columns_in_dataset = None
+        page_counts_list = []
+        problem_message = None
+        problem_resource = None
+        sample = None
+        total_record_count = 0
+
+        # Maryland Statewide Vehicle Crashes are excel files, not Socrata records,
+        #   but they will return empty json objects endlessly
+        if dataset_name.startswith(md_statewide_vehicle_crash_startswith):
+            return {"dataset_name": dataset_name,
+                    "dataset_api_id": dataset_api_id,
+                    "is_problematic": True,
+                    "null_count_for_each_field_dict": null_count_for_each_field_dict,
+                    "number_of_columns_in_dataset": number_of_columns_in_dataset,
+                    "problem_message": """Intentionally skipped. Dataset was an excel file as of 20180409. Call to Socrata endlessly returns empty json objects.""",
+                    "problem_resource": problem_resource,
+                    "total_record_count": total_record_count}
+
+        # Let Socrata do the counting when possible. Any failure falls back to the row scan below.
+        if TURN_ON_SERVER_SIDE_NULL_COUNTING:
+            try:
+                aggregate_results = count_nulls_with_soql_aggregates(dataset_api_id=dataset_api_id)
+            except Exception as e:
+                print("\tSoQL aggregate counting failed, falling back to row scan: {}. {}".format(dataset_api_id, e))
+                aggregate_results = None
+            if aggregate_results is not None:
+                aggregate_results.update({"dataset_name": dataset_name,
+                                          "dataset_api_id": dataset_api_id,
+                                          "is_problematic": False,
+                                          "problem_message": None,
+                                          "problem_resource": None})
+                return aggregate_results
+
+        # Some datasets will have more records than are returned in a single response; varies with the limit_max value.
+        #   Pages arrive while the following pages are fetched in the background, the first page always first.
+        record_pages = generate_record_pages(dataset_api_id=dataset_api_id, is_sampling_allowed=is_sampling_allowed)
+        for page in record_pages:
+            url = page["url"]
+            socrata_url_response = page["response"]
+
+            # The dataset changed while its pages were requested by offset, and is counted over from the first page
+            if page["is_restart"]:
+                first_page_counts = None
+                null_count_for_each_field_dict = dict.fromkeys(null_count_for_each_field_dict, 0)
+                page_counts_list = []
+                total_record_count = 0
+                continue
+
+            if page["exception"] is not None:
+                e = page["exception"]
+                problem_resource = url
+                is_problematic = True
+                if hasattr(e, "reason"):
+                    problem_message = "Failed to reach a server. Reason: {}".format(e.reason)
+                elif hasattr(e, "code"):
+                    problem_message = "The server couldn't fulfill the request. Error Code: {}".format(e.code)
+                else:
+                    problem_message = "Request failed. {}".format(e)
+                break
+
+            # Only need to get the field headers the first time through. Pages carry them once they are known.
+            if field_headers is None:
+                field_headers = page["field_names"]
+            if field_headers is None:
+                field_headers = determine_field_headers(dataset_api_id=dataset_api_id,
+                                                        socrata_url_response=socrata_url_response)
+            if field_headers is None:
+                # Too many fields for transfer and the views metadata could not supply them either
+                problem_message = ("Too many fields. Socrata suppressed X-SODA2-FIELDS value in response and the "
+                                   "views metadata columns were unavailable.")
+                problem_resource = url
+                is_problematic = True
+                break
+
+            # Need a dictionary of headers to store null count, but only on first time through.
+            if len(null_count_for_each_field_dict) == 0:
+                for header in field_headers:
+                    null_count_for_each_field_dict[header] = 0
+
+            if number_of_columns_in_dataset is None:
+                number_of_columns_in_dataset = len(field_headers)
+
+            # Some datasets are html or other type but socrata returns an empty object rather than a json object with
+            #   reason or code. These datasets are then not recognized as problematic and throw off the tracking counts.
+            #   An empty page after full pages only means the record count is a multiple of the page size.
+            if page["record_count"] == 0 and total_record_count > 0:
+                break
+            if page["record_count"] == 0:
+                problem_message = "Response object was empty"
+                problem_resource = url
+                is_problematic = True
+                break
+
+            # Pages scanned for keys arrive already counted
+            counting_start_time = time.perf_counter()
+            missing_field_counts = page["missing_field_counts"]
+            if missing_field_counts is None:
+                missing_field_counts = dict.fromkeys(field_headers, 0)
+                count_null_values_in_page(field_null_count_dict=missing_field_counts, records=page["records"])
+            for field_name, missing_count in missing_field_counts.items():
+                null_count_for_each_field_dict[field_name] += missing_count
+            performance_recorder.add(dataset_api_id=dataset_api_id,
+                                     measurement_name="Null counting",
+                                     seconds=time.perf_counter() - counting_start_time)
+
+            # The first page is kept apart until it is known whether the dataset is sampled and the page was picked
+            if total_record_count == 0:
+                first_page_counts = {"missing_field_counts": missing_field_counts,
+                                     "record_count": page["record_count"]}
+            elif page["sample"] is not None:
+                page_counts_list.append({"missing_field_counts": missing_field_counts,
+                                         "record_count": page["record_count"]})
+            if page["sample"] is not None:
+                sample = page["sample"]
+
+            total_record_count += page["record_count"]
+
+        # Stops the background fetching if the loop ended early
+        record_pages.close()
+
+        # Scale the sampled counts up to the whole dataset
+        percent_null_bounds = None
+        percent_null_bounds_for_each_field_dict = None
+        if sample is not None and not is_problematic:
+            if sample["is_first_page_sampled"]:
+                page_counts_list.insert(0, first_page_counts)
+            sample_estimates = estimate_null_counts_from_sample(page_counts_list=page_counts_list,
+                                                                field_names=field_headers,
+                                                                record_count=sample["record_count"],
+                                                                page_count=sample["page_count"])
+            null_count_for_each_field_dict = sample_estimates["null_count_for_each_field_dict"]
+            percent_null_bounds = sample_estimates["percent_null_bounds"]
+            percent_null_bounds_for_each_field_dict = sample_estimates["percent_null_bounds_for_each_field_dict"]
+            print("\tEstimated from {} of {} pages: {}".format(len(page_counts_list), sample["page_count"],
+                                                              dataset_api_id))
+            total_record_count = sample["record_count"]
+
+        return {"dataset_name": dataset_name,
+                "dataset_api_id": dataset_api_id,
+                "is_estimate": percent_null_bounds is not None,
+                "is_problematic": is_problematic,
+                "null_count_for_each_field_dict": null_count_for_each_field_dict,
+                "number_of_columns_in_dataset": number_of_columns_in_dataset,
+                "percent_null_bounds": percent_null_bounds,
+                "percent_null_bounds_for_each_field_dict": percent_null_bounds_for_each_field_dict,
+                "problem_message": problem_message,
+                "problem_resource": problem_resource,
+                "total_record_count": total_record_count}
+
+    def inspect_dataset_and_measure(dataset_name: str, dataset_api_id: str) -> dict:
+        """
+        Inspect a dataset, with or without incremental inspection, and add the time taken to its performance tally
+
+        :param dataset_name: Name of the dataset from the data freshness report
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: dictionary of inspection results for the dataset
+        """
+        inspection_start_time = time.perf_counter()
+        try:
+            return inspect_dataset_function(dataset_name=dataset_name, dataset_api_id=dataset_api_id)
+        finally:
+            performance_recorder.add(dataset_api_id=dataset_api_id,
+                                     measurement_name="Inspection",
+                                     seconds=time.perf_counter() - inspection_start_time)
+            dataset_scheduler.record_finish(dataset_api_id=dataset_api_id)
+
+    def inspect_dataset_if_changed(dataset_name: str, dataset_api_id: str) -> dict:
+        """
+        Reuse the previous run's inspection results for a dataset that has not changed since, otherwise inspect it.
+
+        A dataset is unchanged when its last modified values from the views metadata match those stored with its
+            results in the inspection state file. TURN_ON_FORCE_FULL_RESCAN inspects every dataset regardless, and
+            estimated results are not reused once a full scan of the dataset is due.
+
+        :param dataset_name: Name of the dataset from the data freshness report
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: dictionary of inspection results for the dataset, including its last modified value
+        """
+        last_modified = request_dataset_last_modified(dataset_api_id=dataset_api_id)
+        previous_state = previous_inspection_state.get(dataset_api_id)
+        if (not TURN_ON_FORCE_FULL_RESCAN and last_modified is not None and previous_state is not None
+                and previous_state["last_modified"] == last_modified
+                and not (previous_state["inspection_results"].get("is_estimate", False)
+                         and dataset_scheduler.is_full_scan_due(dataset_api_id=dataset_api_id,
+                                                                full_scan_every_days=FULL_SCAN_EVERY_DAYS))):
+            print("\tUnchanged since last inspection, reusing results: {}".format(dataset_api_id))
+            inspection_results = dict(previous_state["inspection_results"])
+            inspection_results.update({"dataset_name": dataset_name,
+                                       "dataset_api_id": dataset_api_id,
+                                       "is_problematic": False,
+                                       "is_unchanged": True,
+                                       "problem_message": None,
+                                       "problem_resource": None})
+        else:
+            inspection_results = inspect_dataset(dataset_name=dataset_name, dataset_api_id=dataset_api_id)
+            inspection_results["is_unchanged"] = False
+        inspection_results["last_modified"] = last_modified
+        return inspection_results
+
+    def is_dataset_in_shard(dataset_api_id: str, shard_number: int) -> bool:
+        """
+        Check whether a dataset belongs to a shard. A crc32 of the api id is used rather than hash(), which differs
+            from process to process, so that every shard and every host partition the inventory the same way.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param shard_number: Number of the shard, 1 to NUMBER_OF_SHARDS
+        :return: True if the dataset is inspected by the shard
+        """
+        return zlib.crc32(dataset_api_id.encode("utf-8")) % NUMBER_OF_SHARDS == shard_number - 1
 
     def load_json(json_file_contents) -> dict:
         """
@@ -290,6 +1819,120 @@ def main():
         """
         return json.loads(json_file_contents)
 
+    def journal_upsert_confirmation(dataset_identifier: str, dataset_api_ids: list) -> None:
+        """
+        Record in the inspection journal that the records of datasets were upserted to a Socrata dataset
+
+        :param dataset_identifier: Unique Socrata dataset identifier the records were upserted to
+        :param dataset_api_ids: api ids of the inspected datasets whose records were upserted
+        :return: None
+        """
+        for upserted_dataset_api_id in dataset_api_ids:
+            append_to_inspection_journal(file_path=inspection_journal_file_path,
+                                         journal_entry={"dataset_api_id": upserted_dataset_api_id,
+                                                        "upserted_to": dataset_identifier})
+        return
+
+    def load_csv_column_values(file_path: str, column_name: str) -> set:
+        """
+        Load the values of one column of an output csv file written earlier today
+
+        :param file_path: Path to the csv file
+        :param column_name: Header of the column
+        :return: set of the values in the column. Empty if there is no file.
+        """
+        column_values = set()
+        if not os.path.exists(file_path):
+            return column_values
+        with open(file_path, 'r') as file_handler:
+            column_position = file_handler.readline().rstrip("\n").split(",").index(column_name)
+            for line in file_handler:
+                values_list = line.rstrip("\n").split(",")
+                if len(values_list) > column_position:
+                    column_values.add(values_list[column_position])
+        return column_values
+
+    def load_inspection_journal(file_path: str) -> dict:
+        """
+        Load the datasets completed earlier today from the inspection journal, keyed by dataset api id
+
+        Entries are either the inspection results of a completed dataset or a confirmation that its records were
+            upserted to a Socrata dataset. The start time of the run, the statistics a shard file ends with, and a
+            line left partially written by a crash, are ignored.
+
+        :param file_path: Path to the inspection journal file
+        :return: dictionary of inspection results per dataset, each with the list of datasets it was upserted to
+        """
+        journaled_inspection_results = {}
+        upserted_to_for_each_dataset_dict = {}
+        if not os.path.exists(file_path):
+            return journaled_inspection_results
+        with open(file_path, 'r') as file_handler:
+            for line in file_handler:
+                try:
+                    journal_entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "dataset_api_id" not in journal_entry:
+                    continue
+
+                # A chunk can be upserted before the entry for the dataset is journaled, so order is not relied upon
+                if "upserted_to" in journal_entry:
+                    upserted_to_for_each_dataset_dict.setdefault(journal_entry["dataset_api_id"], []).append(
+                        journal_entry["upserted_to"])
+                else:
+                    journaled_inspection_results[journal_entry["dataset_api_id"]] = journal_entry
+        for dataset_api_id, journal_entry in journaled_inspection_results.items():
+            journal_entry["upserted_to"] = upserted_to_for_each_dataset_dict.get(dataset_api_id, [])
+        return journaled_inspection_results
+
+    def load_inspection_state(file_path: str) -> dict:
+        """
+        Load the inspection state saved by the previous run, keyed by dataset api id
+
+        :param file_path: Path to the inspection state .json file
+        :return: dictionary of last modified values and inspection results per dataset. Empty if there is no file.
+        """
+        if not os.path.exists(file_path):
+            return {}
+        return load_json(json_file_contents=read_json_file(file_path=file_path))
+
+    def load_run_start_time(file_path: str) -> float:
+        """
+        Load the time the run that started the inspection journal began, before any resumed runs
+
+        :param file_path: Path to the inspection journal file
+        :return: time value of the start of the run. None if it was not journaled.
+        """
+        run_start_time = None
+        with open(file_path, 'r') as file_handler:
+            for line in file_handler:
+                try:
+                    journal_entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "run_started_at" in journal_entry:
+                    run_start_time = journal_entry["run_started_at"]
+        return run_start_time
+
+    def load_shard_statistics(file_path: str) -> dict:
+        """
+        Load the statistics a shard run journaled last to its shard file
+
+        :param file_path: Path to the shard file
+        :return: dictionary of statistic names and values, empty if the shard has not finished
+        """
+        shard_statistics = {}
+        with open(file_path, 'r') as file_handler:
+            for line in file_handler:
+                try:
+                    journal_entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "shard_statistics" in journal_entry:
+                    shard_statistics = journal_entry["shard_statistics"]
+        return shard_statistics
+
     def make_zipper(dataset_headers_list: list, record_list: list) -> dict:
         """
         Zip headers and data values and return a dictionary
@@ -300,6 +1943,29 @@ def main():
         """
         return dict(zip(dataset_headers_list, record_list))
 
+    def merge_field_group_counts(field_group_counts_list: list) -> dict:
+        """
+        Merge the counts of the field groups of a sharded page into the counts of the whole page
+
+        Every group is requested for the same range of :id values, so each must hold the same records. A group that
+            holds a different number of records or ends on a different :id, as when the dataset changed between the
+            requests, fails the page rather than counting nulls against the wrong records.
+
+        :param field_group_counts_list: list of the scan_record_keys() dictionaries of the field groups
+        :return: dictionary of the number of records, the :id of the last record, and the count of records missing
+            each field
+        """
+        first_group_counts = field_group_counts_list[0]
+        missing_field_counts = collections.Counter()
+        for field_group_counts in field_group_counts_list:
+            if (field_group_counts["record_count"] != first_group_counts["record_count"]
+                    or field_group_counts["last_row_id"] != first_group_counts["last_row_id"]):
+                raise ValueError("Field groups of a page returned different records. Dataset changed while paging.")
+            missing_field_counts.update(field_group_counts["missing_field_counts"])
+        return {"last_row_id": first_group_counts["last_row_id"],
+                "missing_field_counts": missing_field_counts,
+                "record_count": first_group_counts["record_count"]}
+
     def read_json_file(file_path: str):
         """
         Read a .json file and grab all contents.
@@ -311,6 +1977,118 @@ def main():
             filecontents = file_handler.read()
         return filecontents
 
+    def request_dataset_last_modified(dataset_api_id: str) -> str:
+        """
+        Request the views metadata for a dataset and build a value that changes whenever its rows or columns change
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: String of the rowsUpdatedAt and viewLastModified values, or None if the metadata was unavailable
+        """
+        url = "{}/api/views/{}.json".format(opendata_maryland_gov_url, dataset_api_id)
+        try:
+            response = request_for_dataset(dataset_api_id=dataset_api_id, url=url)
+            response.raise_for_status()
+            view_metadata = response.json()
+        except Exception as e:
+            print("\tViews metadata unavailable: {}. {}".format(dataset_api_id, e))
+            return None
+        if "rowsUpdatedAt" not in view_metadata:
+            return None
+        return generate_id_from_args(view_metadata["rowsUpdatedAt"], view_metadata.get("viewLastModified"))
+
+    def request_for_dataset(dataset_api_id: str, url: str, **kwargs) -> requests.Response:
+        """
+        Make a read request on behalf of a dataset and add the time and bytes to its performance tally
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param url: url to which the request is made
+        :param kwargs: keyword arguments passed on to requests. With stream=True only the time to the response
+            headers is counted here; the bytes are added by the caller once the body has been read.
+        :return: requests response
+        """
+        request_start_time = time.perf_counter()
+        response = read_session.get(url, **kwargs)
+        performance_recorder.add(dataset_api_id=dataset_api_id,
+                                 measurement_name="HTTP",
+                                 seconds=time.perf_counter() - request_start_time,
+                                 request_count=1,
+                                 byte_count=0 if kwargs.get("stream", False) else len(response.content))
+        return response
+
+    def request_last_row_id(dataset_api_id: str) -> str:
+        """
+        Request the :id of the last record of a dataset, in :id order, from Socrata
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: :id of the last record, or None if the dataset has no records
+        """
+        url = "{}{}.json".format(root_url_for_dataset_access, dataset_api_id)
+        print("{}?$select=:id&$order=:id DESC&$limit=1".format(url))
+        last_row_response = request_for_dataset(dataset_api_id=dataset_api_id,
+                                                url=url,
+                                                params={"$select": ":id", "$order": ":id DESC", "$limit": 1})
+        last_row_response.raise_for_status()
+        last_row_records = last_row_response.json()
+        return last_row_records[0].get(":id") if last_row_records else None
+
+    def request_record_count(dataset_api_id: str) -> int:
+        """
+        Request the number of records in a dataset from Socrata with a count(*) aggregate
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: number of records
+        """
+        url = "{}{}.json".format(root_url_for_dataset_access, dataset_api_id)
+        print("{}?$select=count(*)".format(url))
+        count_response = request_for_dataset(dataset_api_id=dataset_api_id,
+                                             url=url,
+                                             params={"$select": "count(*) AS total_count"})
+        count_response.raise_for_status()
+        return int(count_response.json()[0]["total_count"])
+
+    def save_inspection_state(file_path: str, inspection_state: dict) -> None:
+        """
+        Save the inspection state for the next run. Written to a temporary file first so a failed write cannot
+            leave a partial state file behind.
+
+        :param file_path: Path to the inspection state .json file
+        :param inspection_state: dictionary of last modified values and inspection results per dataset
+        :return: None
+        """
+        temporary_file_path = "{}.tmp".format(file_path)
+        try:
+            with open(temporary_file_path, 'w') as file_handler:
+                json.dump(inspection_state, file_handler)
+            os.replace(temporary_file_path, file_path)
+        except IOError as io_err:
+            print(io_err)
+        return
+
+    def scan_record_keys(record_reader, field_names: list) -> dict:
+        """
+        Count the records of a page that are missing each field, one record at a time.
+
+        Only which fields each record contains matters for null counting, so each record is dropped as soon as its
+            keys are counted rather than the whole page of decoded records being held at once. Read from a
+            StreamingRecordReader, memory for a page is a single record and a chunk of the body, no matter how many
+            records the page holds or how long their values are.
+
+        :param record_reader: StreamingRecordReader of the response, or any iterable of record dictionaries
+        :param field_names: List of field names of the dataset
+        :return: dictionary of the number of records, the :id of the last record, and the count of records missing
+            each field
+        """
+        field_names = frozenset(field_names)
+        missing_field_counts = collections.Counter()
+        record = {}
+        record_count = 0
+        for record in record_reader:
+            missing_field_counts.update(field_names.difference(record))
+            record_count += 1
+        return {"last_row_id": record.get(":id"),
+                "missing_field_counts": missing_field_counts,
+                "record_count": record_count}
+
     def setup_config(cfg_file: str) -> configparser.ConfigParser:
         """
         Instantiate the parser for accessing a config file.
@@ -321,19 +2099,26 @@ def main():
         cfg_parser.read(filenames=cfg_file)
         return cfg_parser
 
-    def upsert_to_socrata(client: Socrata, dataset_identifier: str, zipper: dict) -> None:
+    def write_dataset_performance_to_csv(root_file_destination_location: str, filename: str, header_list: list,
+                                         records_list_list: list) -> None:
         """
-        Upsert data to Socrata dataset.
+        Write a csv file of the time spent on each dataset, slowest dataset first
 
-        :param client: Socrata connection client
-        :param dataset_identifier: Unique Socrata dataset identifier. Not the data page identifier but primary page id.
-        :param zipper: dictionary of zipped results (headers and data values)
+        :param root_file_destination_location: Path to the location of the file directory where the file will be created
+        :param filename: Name of the dataset performance file
+        :param header_list: List of headers for the data
+        :param records_list_list: List of lists of values to be written to csv as records
         :return: None
         """
+        file_path = os.path.join(root_file_destination_location, filename)
         try:
-            client.upsert(dataset_identifier=dataset_identifier, payload=zipper, content_type='json')
-        except Exception as e:
-            print("Error upserting to Socrata: {}. {}".format(dataset_identifier, e))
+            with open(file_path, 'w') as file_handler:
+                file_handler.write("{}\n".format(",".join(header_list)))
+                for record_list in records_list_list:
+                    file_handler.write("{}\n".format(",".join(str(value) for value in record_list)))
+        except IOError as io_err:
+            print(io_err)
+            exit()
         return
 
     def write_dataset_results_to_csv(root_file_destination_location: str, filename: str, header_list: list = None, records_list_list: list = None) -> None:
@@ -351,8 +2136,8 @@ def main():
             if os.path.exists(file_path) and records_list_list is not None:
                 with open(file_path, 'a') as file_handler:
                     for record_list in records_list_list:
-                        dataset_name,field_name_key,null_count_value,total_number_of_dataset_records,percent,hyperlink,api_id,unique_field_id,date_analyzed,row_id = record_list
-                        file_handler.write("{},{},{},{},{:6.2f},{},{},{},{},{}\n".format(dataset_name,
+                        dataset_name,field_name_key,null_count_value,total_number_of_dataset_records,percent,hyperlink,api_id,unique_field_id,date_analyzed,row_id = record_list[:10]
+                        file_handler.write("{},{},{},{},{:6.2f},{},{},{},{},{}".format(dataset_name,
                                                                                       field_name_key,
                                                                                       null_count_value,
                                                                                       total_number_of_dataset_records,
@@ -362,6 +2147,12 @@ def main():
                                                                                       unique_field_id,
                                                                                       date_analyzed,
                                                                                       row_id))
+
+                        # The sampling columns follow when sampling is on
+                        if len(record_list) > 10:
+                            is_estimate, percent_lower, percent_upper = record_list[10:]
+                            file_handler.write(",{},{:6.2f},{:6.2f}".format(is_estimate, percent_lower, percent_upper))
+                        file_handler.write("\n")
             else:
                 with open(file_path, 'w') as file_handler:
                     file_handler.write("{}\n".format(",".join(header_list)))
@@ -384,9 +2175,9 @@ def main():
         file_path = os.path.join(root_file_destination_location, filename)
         try:
             if os.path.exists(file_path) and record_list is not None:
-                dataset_name, hyperlink, total_number_of_dataset_columns, total_number_of_dataset_records, total_number_of_values, total_number_of_null_fields, percent_null, api_id, data_provider, date_analyzed, row_id = record_list
+                dataset_name, hyperlink, total_number_of_dataset_columns, total_number_of_dataset_records, total_number_of_values, total_number_of_null_fields, percent_null, api_id, data_provider, date_analyzed, row_id = record_list[:11]
                 with open(file_path, 'a') as file_handler:
-                    file_handler.write("{},{},{},{},{},{},{:6.2f},{},{},{},{}\n".format(dataset_name,
+                    file_handler.write("{},{},{},{},{},{},{:6.2f},{},{},{},{}".format(dataset_name,
                                                                                         hyperlink,
                                                                                         total_number_of_dataset_columns,
                                                                                         total_number_of_dataset_records,
@@ -398,6 +2189,12 @@ def main():
                                                                                         date_analyzed,
                                                                                         row_id)
                                        )
+
+                    # The sampling columns follow when sampling is on
+                    if len(record_list) > 11:
+                        is_estimate, percent_lower, percent_upper = record_list[11:]
+                        file_handler.write(",{},{:6.2f},{:6.2f}".format(is_estimate, percent_lower, percent_upper))
+                    file_handler.write("\n")
             else:
                 with open(file_path, "w") as file_handler:
                     file_handler.write("{}\n".format(",".join(header_list)))
@@ -432,7 +2229,7 @@ def main():
     def write_script_performance_summary(root_file_destination_location: str, filename, start_time: float,
                                          number_of_datasets_in_data_freshness_report: int, dataset_counter: int,
                                          valid_nulls_dataset_counter: int, valid_no_null_dataset_counter: int,
-                                         problem_dataset_counter: int) -> None:
+                                         problem_dataset_counter: int, additional_statistics: dict = None) -> None:
         """
         Write a summary file that details the performance of this script during processing
 
@@ -444,6 +2241,7 @@ def main():
         :param valid_nulls_dataset_counter: Number of datasets with at least on valid null
         :param valid_no_null_dataset_counter: Number of datasets with zero detected null values
         :param problem_dataset_counter: Number of datasets with problems
+        :param additional_statistics: Dictionary of statistic names and values, each written as a row after the counts
         :return: None
         """
         file_path = os.path.join(root_file_destination_location, filename)
@@ -456,6 +2254,8 @@ def main():
                 scriptperformancesummaryhandler.write("Valid datasets without nulls count (no csv),{}\n".format(valid_no_null_dataset_counter))
                 scriptperformancesummaryhandler.write("Problematic datasets count,{}\n".format(problem_dataset_counter))
                 scriptperformancesummaryhandler.write("Process time (minutes),{:6.2f}\n".format(calculate_time_taken(start_time=start_time)/60.0))
+                for statistic_name, statistic_value in (additional_statistics or {}).items():
+                    scriptperformancesummaryhandler.write("{},{}\n".format(statistic_name, statistic_value))
         except IOError as io_err:
             print(io_err)
             exit()
@@ -465,37 +2265,158 @@ def main():
     print(f"Testing variable = {TESTING}")
 
     if TESTING:
-        config_file = r"EssentialExtraFiles\Credentials_TESTING.cfg"  # TEST
+        config_file = os.path.join("EssentialExtraFiles", "Credentials_TESTING.cfg")  # TEST
 
     else:
-        config_file = r"EssentialExtraFiles\Credentials.cfg"  # PROD
+        config_file = os.path.join("EssentialExtraFiles", "Credentials.cfg")  # PROD
 
     config_parser = setup_config(cfg_file=config_file)
 
+    # A shard inspects its partition of the inventory and journals the results to its shard file, leaving the csv
+    #   outputs and upserts to the merge
+    if arguments.shard is not None and arguments.merge:
+        argument_parser.error("--shard and --merge are separate runs")
+    if arguments.shard is not None and not 1 <= arguments.shard <= NUMBER_OF_SHARDS:
+        argument_parser.error("--shard must be from 1 to NUMBER_OF_SHARDS, {}".format(NUMBER_OF_SHARDS))
+    is_merge_run = arguments.merge
+    is_shard_run = arguments.shard is not None
+    if is_shard_run:
+        print("Inspecting shard {} of {}. Outputs are written by the merge.".format(arguments.shard, NUMBER_OF_SHARDS))
+        TURN_ON_WRITE_OUTPUT_TO_CSV = False
+        TURN_ON_UPSERT_OUTPUT_TO_SOCRATA = False
+    if is_merge_run:
+        print("Merging the shard files of {} shards".format(NUMBER_OF_SHARDS))
+
+    # The portal can be overridden in the config file, for example to benchmark against the local stand-in server
+    opendata_maryland_gov_domain = config_parser["DEFAULT"].get("DOMAIN", opendata_maryland_gov_domain)
+    opendata_maryland_gov_url = r"{scheme}://{domain}".format(scheme=config_parser["DEFAULT"].get("URI_SCHEME", "https"),
+                                                              domain=opendata_maryland_gov_domain)
+    root_url_for_dataset_access = r"{root_url}/resource/".format(root_url=opendata_maryland_gov_url)
+
+    # Time spent on each dataset is tallied from every thread, for the dataset performance csv
+    performance_recorder = PerformanceRecorder()
+
+    # One pooled session for all reads. Each inspection worker has at most one request in flight at a time for each
+    #   field group of a sharded page or each page fetched concurrently.
+    read_session = PooledReadSession(app_token=config_parser["OVERVIEW"]["APP_TOKEN"],
+                                     pool_size=NUMBER_OF_INSPECTION_WORKERS * max(COLUMN_SHARD_WORKERS
+                                                                                  if TURN_ON_COLUMN_SHARDED_FETCHING
+                                                                                  else 1,
+                                                                                  PAGE_FETCH_WORKERS),
+                                     rate_limiter=AdaptiveRateLimiter(
+                                         requests_per_second=REQUESTS_PER_SECOND,
+                                         shared_state_path=(os.path.join(root_path_for_csv_output,
+                                                                         rate_limiter_state_file_name)
+                                                            if TURN_ON_SHARED_RATE_LIMIT else None)),
+                                     maximum_retries=MAXIMUM_RETRIES)
+
+    # Pages are decoded and counted in worker processes when CPU_WORKER_PROCESSES is above 0, otherwise in the threads
+    #   fetching them
+    cpu_process_pool = ProcessPoolExecutor(max_workers=CPU_WORKER_PROCESSES) if CPU_WORKER_PROCESSES > 0 else None
+
+    # Field names of datasets too wide for the X-SODA2-Fields header, requested once and kept between runs
+    column_metadata_cache = ColumnMetadataCache(
+        file_path=os.path.join(root_path_for_csv_output,
+                               build_shard_file_name(file_name=column_metadata_cache_file_name,
+                                                     shard_number=arguments.shard)),
+        time_to_live_seconds=COLUMN_METADATA_CACHE_HOURS * 3600.0,
+        request_function=request_for_dataset)
+
+    # Inspection times of earlier runs, for the dispatch order of the datasets and the time budget
+    dataset_scheduler = DatasetScheduler(
+        file_path=os.path.join(root_path_for_csv_output,
+                               build_shard_file_name(file_name=dataset_schedule_history_file_name,
+                                                     shard_number=arguments.shard)),
+        worker_count=NUMBER_OF_INSPECTION_WORKERS,
+        record_count_function=request_record_count if TURN_ON_PREFLIGHT_COST_ESTIMATE else None)
+
     if TURN_ON_WRITE_OUTPUT_TO_CSV:
         print("Writing to csv (TURN_ON_WRITE_OUTPUT_TO_CSV = True)")
     if TURN_ON_UPSERT_OUTPUT_TO_SOCRATA:
         print("Upserting to Socrata (TURN_ON_UPSERT_OUTPUT_TO_SOCRATA = True)")
 
+    # A journal entry is appended for every completed dataset. A rerun on the same date with --resume resumes from
+    #   the journal, so today's csv files are appended to rather than started over; any other run starts them over.
+    #   A shard's journal is its shard file. The journal starts with the start time of the run, so process time
+    #   covers the whole run however many times it was resumed.
+    inspection_journal_base_file_name = "{}_{}.jsonl".format(build_today_date_string(), inspection_journal_file_name)
+    inspection_journal_file_path = os.path.join(root_path_for_csv_output,
+                                                build_shard_file_name(file_name=inspection_journal_base_file_name,
+                                                                      shard_number=arguments.shard))
+    if TURN_ON_RESUME_FROM_JOURNAL or arguments.resume:
+        journaled_inspection_results = load_inspection_journal(file_path=inspection_journal_file_path)
+    else:
+        journaled_inspection_results = {}
+    is_resumed_run = len(journaled_inspection_results) > 0
+    if is_resumed_run:
+        print("Resuming from journal. Datasets completed earlier today = {}".format(len(journaled_inspection_results)))
+        run_start_time = load_run_start_time(file_path=inspection_journal_file_path) or process_start_time
+    else:
+        run_start_time = process_start_time
+        open(inspection_journal_file_path, 'w').close()
+        append_to_inspection_journal(file_path=inspection_journal_file_path,
+                                     journal_entry={"run_started_at": run_start_time})
+
+    # The merge takes up the results of every shard that are not in its own journal yet, as datasets completed
+    #   earlier on the run date whose outputs are still to be written. Every shard must have finished for the run
+    #   date, otherwise the merge stops before writing anything.
+    shard_statistics_list = []
+    if is_merge_run:
+        unfinished_shard_file_paths = []
+        for shard_number in range(1, NUMBER_OF_SHARDS + 1):
+            shard_file_path = os.path.join(root_path_for_csv_output,
+                                           build_shard_file_name(file_name=inspection_journal_base_file_name,
+                                                                 shard_number=shard_number))
+            shard_statistics = {}
+            if os.path.exists(shard_file_path):
+                shard_statistics = load_shard_statistics(file_path=shard_file_path)
+            if len(shard_statistics) == 0:
+                unfinished_shard_file_paths.append(shard_file_path)
+                continue
+            shard_statistics_list.append((shard_number, shard_statistics))
+            for dataset_api_id, journal_entry in load_inspection_journal(file_path=shard_file_path).items():
+                if dataset_api_id not in journaled_inspection_results:
+                    journal_entry.update({"is_merged": True, "is_outputs_written": False})
+                    journaled_inspection_results[dataset_api_id] = journal_entry
+        if len(unfinished_shard_file_paths) > 0:
+            exit("Merge stopped. Shard files missing or unfinished for run date {}, see --run-date:\n{}".format(
+                build_today_date_string(), "\n".join(unfinished_shard_file_paths)))
+
     # Initiate csv report files
     problem_datasets_csv_filename = build_csv_file_name_with_date(today_date_string=build_today_date_string(),
                                                                   filename=problem_datasets_file_name)
-    write_problematic_datasets_to_csv(root_file_destination_location=root_path_for_csv_output,
-                                      filename=problem_datasets_csv_filename)
+    if not is_resumed_run and not is_shard_run:
+        write_problematic_datasets_to_csv(root_file_destination_location=root_path_for_csv_output,
+                                          filename=problem_datasets_csv_filename)
+
+    # A crash between writing the rows of a dataset and journaling it leaves rows that a resumed run must not write
+    #   again, so a resumed run skips the rows already in today's csv files
+    written_problem_dataset_names = set()
+    written_row_ids = set()
+    if is_resumed_run and not is_shard_run:
+        written_problem_dataset_names = load_csv_column_values(
+            file_path=os.path.join(root_path_for_csv_output, problem_datasets_csv_filename),
+            column_name="DATASET NAME")
 
     if TURN_ON_WRITE_OUTPUT_TO_CSV:
 
         # Optional output to CSV's, per original functionality. Initiate files here.
         field_level_csv_filename = build_csv_file_name_with_date(today_date_string=build_today_date_string(),
                                                                  filename=field_level_stats_file_name)
-        write_dataset_results_to_csv(root_file_destination_location=root_path_for_csv_output,
-                                     filename=field_level_csv_filename,
-                                     header_list=field_level_stats_socrata_headers)
         overview_csv_filename = build_csv_file_name_with_date(today_date_string=build_today_date_string(),
                                                               filename=overview_level_stats_file_name)
-        write_overview_stats_to_csv(root_file_destination_location=root_path_for_csv_output,
-                                    filename=overview_csv_filename,
-                                    header_list=overview_level_stats_socrata_headers)
+        if not is_resumed_run:
+            write_dataset_results_to_csv(root_file_destination_location=root_path_for_csv_output,
+                                         filename=field_level_csv_filename,
+                                         header_list=field_level_stats_socrata_headers)
+            write_overview_stats_to_csv(root_file_destination_location=root_path_for_csv_output,
+                                        filename=overview_csv_filename,
+                                        header_list=overview_level_stats_socrata_headers)
+        elif not is_shard_run:
+            for csv_filename in (field_level_csv_filename, overview_csv_filename):
+                written_row_ids.update(load_csv_column_values(
+                    file_path=os.path.join(root_path_for_csv_output, csv_filename),
+                    column_name="ROW ID"))
 
     # TODO: Change to use of data.json instead of freshness report output
     # freshness_report_json_objects = generate_freshness_report_json_objects(dataset_url=f"{opendata_maryland_gov_url}/{data_json_url_name}")
@@ -534,240 +2455,349 @@ def main():
                                                           dataset_key="OVERVIEW")
     socrata_overview_level_dataset_app_id = config_parser["OVERVIEW"]["APP_ID"]
 
+    upsert_batcher_field_level = UpsertBatcher(client=socrata_client_field_level,
+                                               dataset_identifier=socrata_field_level_dataset_app_id,
+                                               chunk_size=UPSERT_CHUNK_SIZE,
+                                               flush_callback=journal_upsert_confirmation)
+    upsert_batcher_overview_level = UpsertBatcher(client=socrata_client_overview_level,
+                                                  dataset_identifier=socrata_overview_level_dataset_app_id,
+                                                  chunk_size=UPSERT_CHUNK_SIZE,
+                                                  flush_callback=journal_upsert_confirmation)
+
+    # Results of the previous run are reused for datasets that have not changed since. Workers only read the
+    #   previous state; the state for this run is updated in the main thread.
+    inspection_state_file_path = os.path.join(root_path_for_csv_output,
+                                              build_shard_file_name(file_name=inspection_state_file_name,
+                                                                    shard_number=arguments.shard))
+    previous_inspection_state = load_inspection_state(file_path=inspection_state_file_path)
+    current_inspection_state = dict(previous_inspection_state)
+    if TURN_ON_INCREMENTAL_INSPECTION:
+        inspect_dataset_function = inspect_dataset_if_changed
+    else:
+        inspect_dataset_function = inspect_dataset
+
     # Variables for next lower scope (alphabetic)
     dataset_counter = 0
+    merged_dataset_counter = 0
+    missing_from_shards_dataset_counter = 0
     problem_dataset_counter = 0
+    resumed_dataset_counter = 0
+    unchanged_dataset_counter = 0
     valid_no_null_dataset_counter = 0
     valid_nulls_dataset_counter = 0
 
-    # Need to inventory field names of every dataset and tally null/empty values
-    for dataset_name, dataset_api_id in dict_of_socrata_dataset_IDs.items():
-        dataset_name_with_spaces_but_no_illegal = handle_illegal_characters_in_string(string_with_illegals=dataset_name,
-                                                                                      spaces_allowed=True)
-        url_socrata_data_page = build_dataset_url(url_root=root_url_for_dataset_access,
-                                                  api_id=dataset_api_id)
-
-        #______________________________________________________________________________________________________________
-        # FOR TESTING - avoid huge datasets on test runs
-        huge_datasets_api_s = (real_property_hidden_names_api_id,)
-        if TESTING and dataset_api_id in huge_datasets_api_s:
-            print("Dataset Skipped Intentionally (TESTING): {}".format(dataset_name_with_spaces_but_no_illegal))
-            continue
-        #______________________________________________________________________________________________________________
-
-        dataset_counter += 1
-        print("{}: {} ............. {}".format(dataset_counter, dataset_name_with_spaces_but_no_illegal.upper(),
-                                               dataset_api_id))
-
-        # Variables for next lower scope (alphabetic)
-        dataset_fields_string = None
-        field_headers = None
-        is_problematic = False
-        is_special_too_many_headers_dataset = False
-        json_file_contents = None
-        more_records_exist_than_response_limit_allows = True
-        null_count_for_each_field_dict = {}
-        number_of_columns_in_dataset = None
-        problem_message = None
-        problem_resource = None
-        socrata_record_offset_value = 0
-        socrata_response_info_key_list = None
-        socrata_url_response = None
-        total_record_count = 0
-
-        # Some datasets will have more records than are returned in a single response; varies with the limit_max value
-        while more_records_exist_than_response_limit_allows:
-
-            # Maryland Statewide Vehicle Crashes are excel files, not Socrata records,
-            #   but they will return empty json objects endlessly
-            if dataset_name.startswith(md_statewide_vehicle_crash_startswith):
-                problem_message = """Intentionally skipped. Dataset was an excel file as of 20180409. Call to Socrata endlessly returns empty json objects."""
-                is_problematic = True
-                break
-            cycle_record_count = 0
-            url = build_dataset_url(url_root=root_url_for_dataset_access,
-                                    api_id=dataset_api_id,
-                                    limit_amount=limit_max_and_offset,
-                                    offset=socrata_record_offset_value,
-                                    total_count=total_record_count)
-            print(url)
-
-            try:
-                socrata_url_response = requests.get(url)
-            except Exception as e:
-                problem_resource = url
-                is_problematic = True
-                if hasattr(e, "reason"):
-                    problem_message = "Failed to reach a server. Reason: {}".format(e.reason)
-                    break
-                elif hasattr(e, "code"):
-                    problem_message = "The server couldn't fulfill the request. Error Code: {}".format(e.code)
-                    break
-
-            # For datasets with a lot of fields it looks like Socrata doesn't return the
-            #   field headers in the response.info() so the X-SODA2-Fields key DNE.
-            # Only need to get the list of socrata response keys the first time through
-            if socrata_response_info_key_list is None:
-                socrata_response_info_key_list = []
-                for key in socrata_url_response.headers.keys():
-                    socrata_response_info_key_list.append(key.lower())
-            else:
-                pass
-
-            # Only need to get the field headers the first time through
-            if dataset_fields_string is None and "x-soda2-fields" in socrata_response_info_key_list:
-                dataset_fields_string = socrata_url_response.headers["X-SODA2-Fields"]
-            elif dataset_fields_string is None and "x-soda2-fields" not in socrata_response_info_key_list:
-                is_special_too_many_headers_dataset = True
-            else:
-                pass
-
-            # If Socrata didn't send the headers see if the dataset is one of the two known to be too big
-            if field_headers is None and is_special_too_many_headers_dataset and dataset_api_id == real_property_hidden_names_api_id:
-                json_file_contents = read_json_file(file_path=real_property_hidden_names_json_file)
-            elif field_headers is None and is_special_too_many_headers_dataset and dataset_api_id == correctional_enterprises_employees_api_id:
-                json_file_contents = read_json_file(file_path=correctional_enterprises_employees_json_file)
-            elif field_headers is None and is_special_too_many_headers_dataset:
-                # In case a new previously unknown dataset comes along with too many fields for transfer
-                problem_message = "Too many fields. Socrata suppressed X-SODA2-FIELDS value in response."
-                problem_resource = url
-                is_problematic = True
-                break
-            elif field_headers is None:
-                field_headers = re.findall("[a-zA-Z0-9_]+", dataset_fields_string)
-            else:
-                pass
-
-            # If special, first time through load the field names from their pre-made json files.
-            if json_file_contents is not None:
-                json_loaded = load_json(json_file_contents=json_file_contents)
-                field_names_dictionary = grab_field_names_for_mega_columned_datasets(socrata_json_object=json_loaded)
-                field_headers = field_names_dictionary["visible"]
-            else:
-                pass
-
-            # Need a dictionary of headers to store null count, but only on first time through.
-            if len(null_count_for_each_field_dict) == 0:
-                for header in field_headers:
-                    null_count_for_each_field_dict[header] = 0
-
-            if number_of_columns_in_dataset is None:
-                number_of_columns_in_dataset = len(field_headers)
-
-            response_list_of_dicts = socrata_url_response.json()
-
-            # Some datasets are html or other type but socrata returns an empty object rather than a json object with
-            #   reason or code. These datasets are then not recognized as problematic and throw off the tracking counts.
-            if len(response_list_of_dicts) == 0:
-                problem_message = "Response object was empty"
-                problem_resource = url
-                is_problematic = True
-                break
-
-            for record in response_list_of_dicts:
-                inspect_record_for_null_values(field_null_count_dict=null_count_for_each_field_dict,
-                                               record_dictionary=record)
-
-            record_count_increase = len(response_list_of_dicts)
-            cycle_record_count += record_count_increase
-            total_record_count += record_count_increase
-
-            # Any cycle_record_count that equals the max limit indicates another request is needed
-            if cycle_record_count == limit_max_and_offset:
-
-                # Give Socrata servers small interval before requesting more
-                time.sleep(0.2)
-                socrata_record_offset_value = cycle_record_count + socrata_record_offset_value
-            else:
-                more_records_exist_than_response_limit_allows = False
-
-        # Calculate statistics for outputs
-        total_number_of_null_values = calculate_total_number_of_null_values_per_dataset(
-            null_counts_list=list(null_count_for_each_field_dict.values()))
-        total_number_of_values_in_dataset = calculate_total_number_of_values_in_dataset(
-            total_records_processed=total_record_count,
-            number_of_fields_in_dataset=number_of_columns_in_dataset)
-        percent_of_dataset_are_null_values = calculate_percent_null(null_count_total=total_number_of_null_values,
-                                                                    total_data_values=total_number_of_values_in_dataset)
-
-        if is_problematic:
-            problem_dataset_counter += 1
-            write_problematic_datasets_to_csv(root_file_destination_location=root_path_for_csv_output,
-                                              filename=problem_datasets_csv_filename,
-                                              dataset_name=dataset_name_with_spaces_but_no_illegal,
-                                              message=problem_message,
-                                              resource=problem_resource
-                                              )
-        else:
-            if total_number_of_null_values > 0:
-                valid_nulls_dataset_counter += 1
-            else:
-                valid_no_null_dataset_counter += 1
-
-            # Field Level
-            field_records_list_list = []
-            for field_name_key, null_count_value in null_count_for_each_field_dict.items():
-                unique_field_id = generate_id_from_args(dataset_api_id, field_name_key)
-                unique_row_id_field_level = generate_id_from_args(unique_field_id, build_today_date_string())
-                percent_nulls_in_field = calculate_percent_null(null_count_total=null_count_value,
-                                                                total_data_values=total_record_count)
-                field_level_record_list = [dataset_name_with_spaces_but_no_illegal, field_name_key, null_count_value,
-                                           total_record_count, percent_nulls_in_field, url_socrata_data_page, dataset_api_id,
-                                           unique_field_id, build_today_date_string(), unique_row_id_field_level]
-                field_records_list_list.append(field_level_record_list)
-                zipper_field_level = make_zipper(dataset_headers_list=field_level_stats_socrata_headers,
-                                                 record_list=field_level_record_list)
-                if TURN_ON_UPSERT_OUTPUT_TO_SOCRATA:
-                    upsert_to_socrata(client=socrata_client_field_level,
-                                      dataset_identifier=socrata_field_level_dataset_app_id, zipper=zipper_field_level)
-
-            # Overview Level
-            unique_row_id_overview_level = generate_id_from_args(dataset_api_id, build_today_date_string())
-            overview_level_record_list = [dataset_name_with_spaces_but_no_illegal, url_socrata_data_page,
-                                    number_of_columns_in_dataset, total_record_count, total_number_of_values_in_dataset,
-                                    total_number_of_null_values, percent_of_dataset_are_null_values, dataset_api_id,
-                                    dict_of_socrata_dataset_providers[dataset_name_with_spaces_but_no_illegal],
-                                    build_today_date_string(), unique_row_id_overview_level
-                                    ]
-            zipper_overview_level = make_zipper(dataset_headers_list=overview_level_stats_socrata_headers,
-                                                record_list=overview_level_record_list)
-            if TURN_ON_UPSERT_OUTPUT_TO_SOCRATA:
-                upsert_to_socrata(client=socrata_client_overview_level,
-                                  dataset_identifier=socrata_overview_level_dataset_app_id, zipper=zipper_overview_level)
-                print("\tUPSERTED: {}".format(dataset_name))
-
-            if TURN_ON_WRITE_OUTPUT_TO_CSV:
-                # Optional output to CSV's, per original functionality. Write output here.
-                # Append dataset results to the field level stats file
-
-                write_dataset_results_to_csv(root_file_destination_location=root_path_for_csv_output,
-                                             filename=field_level_csv_filename,
-                                             header_list=None,
-                                             records_list_list=field_records_list_list)
-
-                # Append the overview stats for each dataset to the overview stats csv
-                write_overview_stats_to_csv(root_file_destination_location=root_path_for_csv_output,
-                                            filename=overview_csv_filename,
-                                            header_list=None,
-                                            record_list=overview_level_record_list)
-                print("\tWRITTEN TO CSV: {}".format(dataset_name))
+    # Need to inventory field names of every dataset and tally null/empty values.
+    #   Inspection is handed to a pool of worker threads. Counters and outputs are only touched here, in the main
+    #   thread, as each dataset's results come back so the totals match a serial run.
+    try:
+        with ThreadPoolExecutor(max_workers=NUMBER_OF_INSPECTION_WORKERS) as executor:
+            dataset_names_to_inspect = {}
+            inspection_futures = []
+            resumed_inspection_results = []
+            for dataset_name, dataset_api_id in dict_of_socrata_dataset_IDs.items():
+                dataset_name_with_spaces_but_no_illegal = handle_illegal_characters_in_string(string_with_illegals=dataset_name,
+                                                                                              spaces_allowed=True)
+
+                #__________________________________________________________________________________________________________
+                # FOR TESTING - avoid huge datasets on test runs
+                huge_datasets_api_s = (real_property_hidden_names_api_id,)
+                if TESTING and dataset_api_id in huge_datasets_api_s:
+                    print("Dataset Skipped Intentionally (TESTING): {}".format(dataset_name_with_spaces_but_no_illegal))
+                    continue
+                #__________________________________________________________________________________________________________
+
+                # A shard only inspects its own partition of the inventory
+                if is_shard_run and not is_dataset_in_shard(dataset_api_id=dataset_api_id,
+                                                            shard_number=arguments.shard):
+                    continue
+
+                if dataset_api_id in journaled_inspection_results:
+                    dataset_counter += 1
+                    print("{}: {} ............. {}".format(dataset_counter,
+                                                           dataset_name_with_spaces_but_no_illegal.upper(),
+                                                           dataset_api_id))
+                    if journaled_inspection_results[dataset_api_id].get("is_merged", False):
+                        print("\tInspected by a shard, merging: {}".format(dataset_api_id))
+                    else:
+                        print("\tCompleted earlier today, resuming from journal: {}".format(dataset_api_id))
+                    resumed_inspection_results.append(journaled_inspection_results[dataset_api_id])
+                    continue
+
+                # The merge only writes out what the shards inspected
+                if is_merge_run:
+                    print("Not in any shard file, left uninspected: {} ({})".format(
+                        dataset_name_with_spaces_but_no_illegal, dataset_api_id))
+                    missing_from_shards_dataset_counter += 1
+                    continue
+                dataset_names_to_inspect[dataset_api_id] = dataset_name
+
+            # Datasets are dispatched longest first, and those that would not finish within the budget are left
+            #   for the next run. A single worker finishes at the same time whatever the order, so a serial run
+            #   keeps the inventory order and only counts records for a budget.
+            scheduled_dataset_api_ids = dataset_scheduler.build_schedule(
+                dataset_api_ids=list(dataset_names_to_inspect.keys()),
+                is_largest_first=TURN_ON_LARGEST_FIRST_SCHEDULING and NUMBER_OF_INSPECTION_WORKERS > 1,
+                budget_seconds=None if INSPECTION_BUDGET_MINUTES is None else INSPECTION_BUDGET_MINUTES * 60.0)
+            for dataset_api_id in dataset_scheduler.deferred_dataset_api_ids:
+                print("Deferred to the next run by the time budget: {} ({})".format(
+                    dataset_names_to_inspect[dataset_api_id], dataset_api_id))
+            dataset_scheduler.start()
+            for dataset_api_id in scheduled_dataset_api_ids:
+                dataset_name = dataset_names_to_inspect[dataset_api_id]
+                dataset_counter += 1
+                print("{}: {} ............. {}".format(dataset_counter,
+                                                       handle_illegal_characters_in_string(
+                                                           string_with_illegals=dataset_name,
+                                                           spaces_allowed=True).upper(),
+                                                       dataset_api_id))
+                inspection_futures.append(executor.submit(inspect_dataset_and_measure,
+                                                          dataset_name=dataset_name,
+                                                          dataset_api_id=dataset_api_id))
+
+            # Datasets completed earlier today go through the same accounting as those inspected now. Their csv
+            #   output is not written again and their records are only upserted again if never confirmed.
+            completed_inspection_results = itertools.chain(
+                resumed_inspection_results,
+                (inspection_future.result() for inspection_future in as_completed(inspection_futures)))
+            for inspection_results in completed_inspection_results:
+                is_merged = inspection_results.get("is_merged", False)
+                is_resumed = inspection_results.get("is_resumed", False)
+                is_outputs_written = is_resumed and inspection_results.get("is_outputs_written", False)
+                upserted_to = inspection_results.get("upserted_to", [])
+                dataset_name = inspection_results["dataset_name"]
+                dataset_api_id = inspection_results["dataset_api_id"]
+
+                # Timings taken by a shard go into the dataset performance csv of the merge
+                if is_merged:
+                    merged_dataset_counter += 1
+                    performance_recorder.restore_measurements(
+                        dataset_api_id=dataset_api_id,
+                        measurements=inspection_results.get("performance_measurements"))
+                elif is_resumed:
+                    resumed_dataset_counter += 1
+                is_estimate = inspection_results.get("is_estimate", False)
+                number_of_columns_in_dataset = inspection_results["number_of_columns_in_dataset"]
+                total_record_count = inspection_results["total_record_count"]
+
+                # Timings of datasets inspected now drive the dispatch order of later runs
+                if not is_resumed:
+                    actual_finish_seconds, predicted_finish_seconds = dataset_scheduler.get_finish_seconds(
+                        dataset_api_id=dataset_api_id)
+                    print("\tFinished {:.1f} seconds into the inspection, predicted {:.1f}: {}".format(
+                        actual_finish_seconds, predicted_finish_seconds, dataset_api_id))
+                if not is_resumed and not inspection_results.get("is_unchanged", False):
+                    dataset_scheduler.record_inspection(
+                        dataset_api_id=dataset_api_id,
+                        inspection_seconds=performance_recorder.get_seconds(dataset_api_id=dataset_api_id,
+                                                                            measurement_name="Inspection"),
+                        value_count=None if number_of_columns_in_dataset is None
+                        else total_record_count * number_of_columns_in_dataset,
+                        record_count=total_record_count,
+                        is_full_scan=not is_estimate and not inspection_results["is_problematic"])
+                dataset_name_with_spaces_but_no_illegal = handle_illegal_characters_in_string(string_with_illegals=dataset_name,
+                                                                                              spaces_allowed=True)
+                null_count_for_each_field_dict = inspection_results["null_count_for_each_field_dict"]
+                url_socrata_data_page = build_dataset_url(url_root=root_url_for_dataset_access,
+                                                          api_id=dataset_api_id)
+
+                # Calculate statistics for outputs
+                total_number_of_null_values = calculate_total_number_of_null_values_per_dataset(
+                    null_counts_list=list(null_count_for_each_field_dict.values()))
+                total_number_of_values_in_dataset = calculate_total_number_of_values_in_dataset(
+                    total_records_processed=total_record_count,
+                    number_of_fields_in_dataset=number_of_columns_in_dataset)
+                percent_of_dataset_are_null_values = calculate_percent_null(null_count_total=total_number_of_null_values,
+                                                                            total_data_values=total_number_of_values_in_dataset)
+
+                # Exact counts have no uncertainty, so both bounds are the percent null itself
+                percent_null_bounds = inspection_results.get("percent_null_bounds")
+                if percent_null_bounds is None:
+                    percent_null_bounds = [percent_of_dataset_are_null_values, percent_of_dataset_are_null_values]
+                percent_null_bounds_for_each_field_dict = inspection_results.get(
+                    "percent_null_bounds_for_each_field_dict") or {}
+
+                csv_write_start_time = time.perf_counter()
+                if inspection_results["is_problematic"]:
+                    problem_dataset_counter += 1
+                    if (not is_outputs_written
+                            and dataset_name_with_spaces_but_no_illegal not in written_problem_dataset_names):
+                        write_problematic_datasets_to_csv(root_file_destination_location=root_path_for_csv_output,
+                                                          filename=problem_datasets_csv_filename,
+                                                          dataset_name=dataset_name_with_spaces_but_no_illegal,
+                                                          message=inspection_results["problem_message"],
+                                                          resource=inspection_results["problem_resource"]
+                                                          )
+                        performance_recorder.add(dataset_api_id=dataset_api_id,
+                                                 measurement_name="CSV write",
+                                                 seconds=time.perf_counter() - csv_write_start_time)
+                else:
+                    if total_number_of_null_values > 0:
+                        valid_nulls_dataset_counter += 1
+                    else:
+                        valid_no_null_dataset_counter += 1
+
+                    # Remember the results for the next run, and count datasets whose previous results were reused
+                    if inspection_results.get("is_unchanged", False):
+                        unchanged_dataset_counter += 1
+                    if inspection_results.get("last_modified") is not None:
+                        current_inspection_state[dataset_api_id] = {
+                            "last_modified": inspection_results["last_modified"],
+                            "inspection_results": {"is_estimate": is_estimate,
+                                                   "null_count_for_each_field_dict": null_count_for_each_field_dict,
+                                                   "number_of_columns_in_dataset": number_of_columns_in_dataset,
+                                                   "percent_null_bounds": inspection_results.get("percent_null_bounds"),
+                                                   "percent_null_bounds_for_each_field_dict":
+                                                       percent_null_bounds_for_each_field_dict or None,
+                                                   "total_record_count": total_record_count}}
+
+                    # Field Level
+                    field_records_list_list = []
+                    for field_name_key, null_count_value in null_count_for_each_field_dict.items():
+                        unique_field_id = generate_id_from_args(dataset_api_id, field_name_key)
+                        unique_row_id_field_level = generate_id_from_args(unique_field_id, build_today_date_string())
+                        percent_nulls_in_field = calculate_percent_null(null_count_total=null_count_value,
+                                                                        total_data_values=total_record_count)
+                        percent_lower_in_field, percent_upper_in_field = percent_null_bounds_for_each_field_dict.get(
+                            field_name_key, [percent_nulls_in_field, percent_nulls_in_field])
+                        field_level_record_list = [dataset_name_with_spaces_but_no_illegal, field_name_key, null_count_value,
+                                                   total_record_count, percent_nulls_in_field, url_socrata_data_page,
+                                                   dataset_api_id, unique_field_id, build_today_date_string(),
+                                                   unique_row_id_field_level]
+                        if TURN_ON_SAMPLING:
+                            field_level_record_list += [is_estimate, percent_lower_in_field, percent_upper_in_field]
+                        if unique_row_id_field_level not in written_row_ids:
+                            field_records_list_list.append(field_level_record_list)
+                        zipper_field_level = make_zipper(dataset_headers_list=field_level_stats_socrata_headers,
+                                                         record_list=field_level_record_list)
+                        if TURN_ON_UPSERT_OUTPUT_TO_SOCRATA and socrata_field_level_dataset_app_id not in upserted_to:
+                            upsert_batcher_field_level.add(zipper=zipper_field_level)
+
+                    # Overview Level
+                    unique_row_id_overview_level = generate_id_from_args(dataset_api_id, build_today_date_string())
+                    overview_level_record_list = [dataset_name_with_spaces_but_no_illegal, url_socrata_data_page,
+                                                  number_of_columns_in_dataset, total_record_count,
+                                                  total_number_of_values_in_dataset, total_number_of_null_values,
+                                                  percent_of_dataset_are_null_values, dataset_api_id,
+                                                  dict_of_socrata_dataset_providers[dataset_name_with_spaces_but_no_illegal],
+                                                  build_today_date_string(), unique_row_id_overview_level
+                                                  ]
+                    if TURN_ON_SAMPLING:
+                        overview_level_record_list += [is_estimate, percent_null_bounds[0], percent_null_bounds[1]]
+                    zipper_overview_level = make_zipper(dataset_headers_list=overview_level_stats_socrata_headers,
+                                                        record_list=overview_level_record_list)
+                    if TURN_ON_UPSERT_OUTPUT_TO_SOCRATA and socrata_overview_level_dataset_app_id not in upserted_to:
+                        upsert_batcher_overview_level.add(zipper=zipper_overview_level)
+                        print("\tQUEUED FOR UPSERT: {}".format(dataset_name))
+
+                    if TURN_ON_WRITE_OUTPUT_TO_CSV and not is_outputs_written:
+                        # Optional output to CSV's, per original functionality. Write output here.
+                        # Append dataset results to the field level stats file
+                        csv_write_start_time = time.perf_counter()
+                        write_dataset_results_to_csv(root_file_destination_location=root_path_for_csv_output,
+                                                     filename=field_level_csv_filename,
+                                                     header_list=None,
+                                                     records_list_list=field_records_list_list)
+
+                        # Append the overview stats for each dataset to the overview stats csv
+                        if unique_row_id_overview_level not in written_row_ids:
+                            write_overview_stats_to_csv(root_file_destination_location=root_path_for_csv_output,
+                                                        filename=overview_csv_filename,
+                                                        header_list=None,
+                                                        record_list=overview_level_record_list)
+                        performance_recorder.add(dataset_api_id=dataset_api_id,
+                                                 measurement_name="CSV write",
+                                                 seconds=time.perf_counter() - csv_write_start_time)
+                        print("\tWRITTEN TO CSV: {}".format(dataset_name))
+
+                # Journal the completed dataset so a rerun today can pick up from here. A shard journals to its shard
+                #   file, with its timings and with the outputs left for the merge.
+                if not is_resumed or is_merged:
+                    journal_entry = dict(inspection_results)
+                    journal_entry.pop("is_merged", None)
+                    journal_entry.pop("upserted_to", None)
+                    journal_entry.update({"is_resumed": True, "is_outputs_written": not is_shard_run})
+                    if is_shard_run:
+                        journal_entry["performance_measurements"] = performance_recorder.get_measurements(
+                            dataset_api_id=dataset_api_id)
+                    append_to_inspection_journal(file_path=inspection_journal_file_path, journal_entry=journal_entry)
+    finally:
+
+        # Send whatever is still queued at the end of the run, or when the run is interrupted by an error
+        if TURN_ON_UPSERT_OUTPUT_TO_SOCRATA:
+            upsert_batcher_field_level.flush()
+            upsert_batcher_overview_level.flush()
+        if TURN_ON_INCREMENTAL_INSPECTION and not is_merge_run:
+            save_inspection_state(file_path=inspection_state_file_path, inspection_state=current_inspection_state)
+        column_metadata_cache.save()
+        dataset_scheduler.save()
+        if cpu_process_pool is not None:
+            cpu_process_pool.shutdown()
 
     socrata_client_overview_level.close()
     socrata_client_field_level.close()
+    additional_statistics = {"Datasets resumed from journal": resumed_dataset_counter,
+                             "Unchanged datasets reused from previous run": unchanged_dataset_counter}
+    if is_resumed_run:
+        additional_statistics["Process time of the resumed run (minutes)"] = round(
+            calculate_time_taken(process_start_time) / 60.0, 2)
+    if is_merge_run:
+        additional_statistics.update({"Datasets merged from shard files": merged_dataset_counter,
+                                      "Datasets missing from shard files": missing_from_shards_dataset_counter})
+        for shard_number, shard_statistics in shard_statistics_list:
+            for statistic_name, statistic_value in shard_statistics.items():
+                additional_statistics["Shard {} of {}, {}".format(shard_number, NUMBER_OF_SHARDS,
+                                                                  statistic_name)] = statistic_value
+    additional_statistics.update(dataset_scheduler.statistics())
+    additional_statistics.update(column_metadata_cache.statistics())
+    additional_statistics.update(read_session.statistics())
+    read_session.close()
+
+    # Slowest datasets first, so the datasets responsible for a long run are at the top of the csv
+    dataset_names_for_each_api_id = {}
+    for dataset_name, dataset_api_id in dict_of_socrata_dataset_IDs.items():
+        dataset_names_for_each_api_id[dataset_api_id] = handle_illegal_characters_in_string(
+            string_with_illegals=dataset_name,
+            spaces_allowed=True)
+    additional_statistics.update(performance_recorder.statistics(dataset_names=dataset_names_for_each_api_id,
+                                                                 slowest_count=slowest_datasets_reported))
+    for statistic_name, statistic_value in additional_statistics.items():
+        print("{} = {}".format(statistic_name, statistic_value))
+
+    # A shard ends its shard file with its own counts for the performance summary of the merge
+    if is_shard_run:
+        shard_statistics = {"Datasets processed": dataset_counter,
+                            "Problematic datasets": problem_dataset_counter,
+                            "Process time (minutes)": round(calculate_time_taken(run_start_time) / 60.0, 2)}
+        shard_statistics.update({statistic_name: additional_statistics[statistic_name]
+                                 for statistic_name in shard_statistic_names
+                                 if statistic_name in additional_statistics})
+        append_to_inspection_journal(file_path=inspection_journal_file_path,
+                                     journal_entry={"shard_statistics": shard_statistics})
+        print("Process time (minutes) = {:4.2f}\n".format(calculate_time_taken(run_start_time)/60.0))
+        return
+
+    dataset_performance_filename = build_csv_file_name_with_date(today_date_string=build_today_date_string(),
+                                                                 filename=dataset_performance_file_name)
+    write_dataset_performance_to_csv(
+        root_file_destination_location=root_path_for_csv_output,
+        filename=dataset_performance_filename,
+        header_list=dataset_performance_headers,
+        records_list_list=performance_recorder.build_report_records(dataset_names=dataset_names_for_each_api_id))
 
     performance_summary_filename = build_csv_file_name_with_date(today_date_string=build_today_date_string(),
                                                                  filename=performance_summary_file_name)
     write_script_performance_summary(root_file_destination_location=root_path_for_csv_output,
                                      filename=performance_summary_filename,
-                                     start_time=process_start_time,
+                                     start_time=run_start_time,
                                      number_of_datasets_in_data_freshness_report=number_of_datasets_in_data_freshness_report,
                                      dataset_counter=dataset_counter,
                                      valid_nulls_dataset_counter=valid_nulls_dataset_counter,
                                      valid_no_null_dataset_counter=valid_no_null_dataset_counter,
-                                     problem_dataset_counter=problem_dataset_counter
+                                     problem_dataset_counter=problem_dataset_counter,
+                                     additional_statistics=additional_statistics
                                      )
 
-    print("Process time (minutes) = {:4.2f}\n".format(calculate_time_taken(process_start_time)/60.0))
+    print("Process time (minutes) = {:4.2f}\n".format(calculate_time_taken(run_start_time)/60.0))
     return
 
 
@@ -0,0 +1,297 @@
+"""
+End to end throughput benchmark of the Open Data Inspector scripts against the local Socrata stand-in server.
+
+Copies OpenDataInspector.py and OpenDataInspector_Cleanup.py into a temporary project folder along with a credentials
+ config pointing at the stand-in server, starts OpenDataInspector_FakeSocrataServer.py with the requested dataset
+ shape, and runs the inspection and then the cleanup as separate processes. OPTION flags of the copied scripts can be
+ changed with --option NAME=VALUE, for example --option NUMBER_OF_INSPECTION_WORKERS=8, so that runs with and without a
+ change can be compared on the same synthetic data.
+For each script run the elapsed time, datasets per second, records per second, HTTP requests issued, records served,
+ bytes sent, and peak memory are reported. Peak memory is not available on Windows.
+Author: agent
+Date: 20261017
+Revisions: 20261017, agent, --shards N runs the inspection as N shard processes at once, then the merge, each
+    reported as its own row. Peak memory of the shards is that of the largest shard.
+    20261017, agent, OpenDataInspector_Common.py, shared by both scripts, is copied along with them.
+    20261017, agent, The shards and the merge are given the same --run-date.
+    20261017, agent, The config files are written into their EssentialExtraFiles folders, created as needed, rather
+    than to file names holding a backslash, which only worked outside Windows.
+"""
+
+
+def main():
+
+    # IMPORTS
+    from datetime import date
+    import argparse
+    import csv
+    import json
+    import os
+    import re
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import time
+    import urllib.request
+
+    # VARIABLES (alphabetic)
+    argument_parser = argparse.ArgumentParser(description="Benchmark the Open Data Inspector scripts end to end")
+    argument_parser.add_argument("--port", type=int, default=8765)
+    argument_parser.add_argument("--datasets", type=int, default=10)
+    argument_parser.add_argument("--rows", type=int, default=20000)
+    argument_parser.add_argument("--row-distribution", choices=("uniform", "linear"), default="uniform")
+    argument_parser.add_argument("--columns", type=int, default=10)
+    argument_parser.add_argument("--null-density", type=float, default=0.1)
+    argument_parser.add_argument("--value-length", type=int, default=12)
+    argument_parser.add_argument("--wide-datasets", type=int, default=0)
+    argument_parser.add_argument("--wide-columns", type=int, default=400)
+    argument_parser.add_argument("--aged-rows", type=int, default=0,
+                                 help="Aged records seeded in the overview and field level datasets for the cleanup")
+    argument_parser.add_argument("--throttle-every", type=int, default=0)
+    argument_parser.add_argument("--seconds-per-megabyte", type=float, default=0.0,
+                                 help="Server side delay per megabyte of response, standing in for Socrata's work")
+    argument_parser.add_argument("--option", action="append", default=[], metavar="NAME=VALUE",
+                                 help="Change an OPTION flag in the copied scripts. Repeatable.")
+    argument_parser.add_argument("--shards", type=int, default=1,
+                                 help="Run the inspection as this many concurrent shard processes and then merge")
+    argument_parser.add_argument("--skip-inspection", action="store_true")
+    argument_parser.add_argument("--skip-cleanup", action="store_true")
+    argument_parser.add_argument("--report-csv", default=None, help="Append the results to this csv file")
+    argument_parser.add_argument("--keep", action="store_true", help="Keep the temporary project folder")
+    arguments = argument_parser.parse_args()
+
+    _root_url_for_project = os.path.dirname(os.path.abspath(__file__))
+    cleanup_script_name = "OpenDataInspector_Cleanup.py"
+    common_module_name = "OpenDataInspector_Common.py"
+    config_file_paths = [r"EssentialExtraFiles\Credentials_TESTING.cfg",
+                         r"EssentialExtraFiles\Credentials.cfg",
+                         r"EssentialExtraFilesForOpenDataInspectorSuccess\Credentials_TESTING.cfg",
+                         r"EssentialExtraFilesForOpenDataInspectorSuccess\Credentials.cfg"]
+    fake_server_script_name = "OpenDataInspector_FakeSocrataServer.py"
+    field_level_api_id = "fld0-0001"
+    inspector_script_name = "OpenDataInspector.py"
+    overview_level_api_id = "ovr0-0001"
+    report_headers = ["SCRIPT", "OPTIONS", "EXIT CODE", "ELAPSED SECONDS", "DATASETS", "DATASETS PER SECOND",
+                      "RECORDS", "RECORDS PER SECOND", "HTTP REQUESTS", "RECORDS SERVED", "BYTES SENT",
+                      "PEAK MEMORY MB"]
+    server_url = "http://127.0.0.1:{}".format(arguments.port)
+
+    # FUNCTIONS (alphabetic)
+    def apply_options(script_path: str, options: list) -> list:
+        """
+        Rewrite the values of OPTION flags in a copied script.
+
+        :param script_path: Path to the copied script
+        :param options: list of NAME=VALUE strings
+        :return: list of the option names found in the script
+        """
+        with open(script_path, "r") as handler:
+            script_text = handler.read()
+        options_applied = []
+        for option in options:
+            option_name, option_value = option.split("=", 1)
+            script_text, substitution_count = re.subn(
+                r"^(\s*{name} = ).*?(\s+# OPTION.*)$".format(name=re.escape(option_name.strip())),
+                lambda match: match.group(1) + option_value.strip() + match.group(2),
+                script_text,
+                flags=re.MULTILINE)
+            if substitution_count > 0:
+                options_applied.append(option_name.strip())
+        with open(script_path, "w") as handler:
+            handler.write(script_text)
+        return options_applied
+
+    def build_project_folder(project_folder: str) -> None:
+        """
+        Copy the scripts into the project folder and write the files they expect to find there.
+
+        :param project_folder: Path to the temporary project folder
+        :return: None
+        """
+        for script_name in (inspector_script_name, cleanup_script_name):
+            shutil.copy(os.path.join(_root_url_for_project, script_name), project_folder)
+            options = list(arguments.option)
+            if arguments.shards > 1:
+                options.append("NUMBER_OF_SHARDS={}".format(arguments.shards))
+            options_applied = apply_options(script_path=os.path.join(project_folder, script_name),
+                                            options=options)
+            print("{}: options changed {}".format(script_name, options_applied or "none"))
+        shutil.copy(os.path.join(_root_url_for_project, common_module_name), project_folder)
+        config_text = "\n".join(["[DEFAULT]",
+                                 "USERNAME = benchmark",
+                                 "PASSWORD = benchmark",
+                                 "DOMAIN = 127.0.0.1:{}".format(arguments.port),
+                                 "URI_SCHEME = http",
+                                 "[FIELD]",
+                                 "APP_TOKEN = benchmark",
+                                 "APP_ID = {}".format(field_level_api_id),
+                                 "[OVERVIEW]",
+                                 "APP_TOKEN = benchmark",
+                                 "APP_ID = {}".format(overview_level_api_id),
+                                 ""])
+        for config_file_path in config_file_paths:
+            project_config_file_path = os.path.join(project_folder, *config_file_path.split("\\"))
+            os.makedirs(os.path.dirname(project_config_file_path), exist_ok=True)
+            with open(project_config_file_path, "w") as handler:
+                handler.write(config_text)
+        os.makedirs(os.path.join(project_folder, "OUTPUT_CSVs"), exist_ok=True)
+        return
+
+    def request_server_statistics() -> dict:
+        """
+        Request the request and record tallies of the stand-in server.
+
+        :return: dictionary of tallies
+        """
+        with urllib.request.urlopen("{}/__stats".format(server_url), timeout=5) as response:
+            return json.loads(response.read())
+
+    def run_script(project_folder: str, script_name: str, log_file_path: str,
+                   script_arguments_list: list = None) -> tuple:
+        """
+        Run a script as one or more separate processes at once and measure the elapsed time until the last exits, and
+            the peak memory of the largest.
+
+        :param project_folder: Path to the temporary project folder, used as the working directory
+        :param script_name: Name of the script
+        :param log_file_path: Path to the file that receives the output of the script. Processes after the first
+            write to the same path with their number added.
+        :param script_arguments_list: list of lists of command line arguments, one process for each. None runs one
+            process without arguments.
+        :return: tuple of the worst exit code, elapsed seconds, and peak memory in megabytes or None
+        """
+        log_handlers = []
+        processes = []
+        start_time = time.perf_counter()
+        for process_number, script_arguments in enumerate(script_arguments_list or [[]]):
+            log_handlers.append(open(log_file_path if process_number == 0
+                                     else "{}.{}".format(log_file_path, process_number + 1), "w"))
+            processes.append(subprocess.Popen([sys.executable, script_name] + script_arguments, cwd=project_folder,
+                                              stdout=log_handlers[-1], stderr=subprocess.STDOUT))
+        exit_codes = []
+        peak_memory_megabytes = None
+        for process in processes:
+            if hasattr(os, "wait4"):
+                _, exit_status, resource_usage = os.wait4(process.pid, 0)
+                exit_codes.append(os.waitstatus_to_exitcode(exit_status))
+                peak_memory_megabytes = max(peak_memory_megabytes or 0.0, resource_usage.ru_maxrss
+                                            / (1024 * 1024 if sys.platform == "darwin" else 1024))
+            else:
+                exit_codes.append(process.wait())
+        elapsed_seconds = time.perf_counter() - start_time
+        for log_handler in log_handlers:
+            log_handler.close()
+        exit_code = max(exit_codes, key=abs)
+        return exit_code, elapsed_seconds, peak_memory_megabytes
+
+    def start_fake_server() -> subprocess.Popen:
+        """
+        Start the stand-in server and wait until it answers.
+
+        :return: the server process
+        """
+        server_command = [sys.executable, os.path.join(_root_url_for_project, fake_server_script_name),
+                          "--port", str(arguments.port),
+                          "--datasets", str(arguments.datasets),
+                          "--rows", str(arguments.rows),
+                          "--row-distribution", arguments.row_distribution,
+                          "--columns", str(arguments.columns),
+                          "--null-density", str(arguments.null_density),
+                          "--value-length", str(arguments.value_length),
+                          "--wide-datasets", str(arguments.wide_datasets),
+                          "--wide-columns", str(arguments.wide_columns),
+                          "--aged-datasets", "{},{}".format(overview_level_api_id, field_level_api_id),
+                          "--aged-rows", str(arguments.aged_rows),
+                          "--throttle-every", str(arguments.throttle_every),
+                          "--seconds-per-megabyte", str(arguments.seconds_per_megabyte)]
+        server_process = subprocess.Popen(server_command, stdout=subprocess.DEVNULL)
+        for _ in range(200):
+            try:
+                request_server_statistics()
+                return server_process
+            except OSError:
+                if server_process.poll() is not None:
+                    raise RuntimeError("Stand-in server exited with code {}".format(server_process.returncode))
+                time.sleep(0.1)
+        server_process.terminate()
+        raise RuntimeError("Stand-in server did not answer on {}".format(server_url))
+
+    # FUNCTIONALITY
+    project_folder = tempfile.mkdtemp(prefix="open_data_inspector_benchmark_")
+    build_project_folder(project_folder=project_folder)
+    server_process = start_fake_server()
+    report_rows = []
+    try:
+        # Each run is a name for the report, a script, and the command line arguments of each of its processes
+        runs_to_make = []
+        if not arguments.skip_inspection and arguments.shards > 1:
+            run_date_arguments = ["--run-date", date.today().isoformat()]
+            runs_to_make.append(("{} --shard x {}".format(inspector_script_name, arguments.shards),
+                                 inspector_script_name,
+                                 [["--shard", str(shard_number)] + run_date_arguments
+                                  for shard_number in range(1, arguments.shards + 1)]))
+            runs_to_make.append(("{} --merge".format(inspector_script_name), inspector_script_name,
+                                 [["--merge"] + run_date_arguments]))
+        elif not arguments.skip_inspection:
+            runs_to_make.append((inspector_script_name, inspector_script_name, None))
+        if not arguments.skip_cleanup:
+            runs_to_make.append((cleanup_script_name, cleanup_script_name, None))
+        for run_name, script_name, script_arguments_list in runs_to_make:
+            statistics_before = request_server_statistics()
+            exit_code, elapsed_seconds, peak_memory_megabytes = run_script(
+                project_folder=project_folder,
+                script_name=script_name,
+                log_file_path=os.path.join(project_folder, "{}.log".format(run_name.replace(" ", "_"))),
+                script_arguments_list=script_arguments_list)
+            statistics_after = request_server_statistics()
+
+            if script_name == inspector_script_name:
+                dataset_count = statistics_after["synthetic_datasets"]
+                record_count = statistics_after["synthetic_rows_total"]
+            else:
+                dataset_count = 2
+                record_count = statistics_after["rows_deleted"] - statistics_before["rows_deleted"]
+            report_rows.append({
+                "SCRIPT": run_name,
+                "OPTIONS": " ".join(arguments.option),
+                "EXIT CODE": exit_code,
+                "ELAPSED SECONDS": round(elapsed_seconds, 3),
+                "DATASETS": dataset_count,
+                "DATASETS PER SECOND": round(dataset_count / elapsed_seconds, 3),
+                "RECORDS": record_count,
+                "RECORDS PER SECOND": round(record_count / elapsed_seconds, 1),
+                "HTTP REQUESTS": (statistics_after["get_requests"] + statistics_after["post_requests"]
+                                  - statistics_before["get_requests"] - statistics_before["post_requests"] - 1),
+                "RECORDS SERVED": statistics_after["rows_served"] - statistics_before["rows_served"],
+                "BYTES SENT": statistics_after["bytes_sent"] - statistics_before["bytes_sent"],
+                "PEAK MEMORY MB": "n/a" if peak_memory_megabytes is None else round(peak_memory_megabytes, 1)})
+    finally:
+        server_process.terminate()
+        server_process.wait()
+
+    for report_row in report_rows:
+        print("\n{}".format(report_row["SCRIPT"]))
+        for header in report_headers[1:]:
+            print("\t{}: {}".format(header, report_row[header]))
+        if report_row["EXIT CODE"] != 0:
+            print("\tSee {}".format(os.path.join(project_folder,
+                                                 "{}.log".format(report_row["SCRIPT"].replace(" ", "_")))))
+
+    if arguments.report_csv is not None:
+        is_new_report = not os.path.exists(arguments.report_csv)
+        with open(arguments.report_csv, "a", newline="") as handler:
+            csv_writer = csv.DictWriter(handler, fieldnames=report_headers)
+            if is_new_report:
+                csv_writer.writeheader()
+            csv_writer.writerows(report_rows)
+
+    if arguments.keep or any(report_row["EXIT CODE"] != 0 for report_row in report_rows):
+        print("\nProject folder kept at {}".format(project_folder))
+    else:
+        shutil.rmtree(project_folder, ignore_errors=True)
+    return
+
+
+if __name__ == "__main__":
+    main()
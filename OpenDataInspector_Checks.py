@@ -0,0 +1,475 @@
+"""
+Checks of the Open Data Inspector against known answers, using the stand-in Socrata server where records are needed.
+
+Each check asserts what a part of the inspector must do, where the benchmarks only time it. StreamingRecordReader
+ must decode the same records as json.loads, with the body split across chunk boundaries inside strings, escapes,
+ and multibyte characters. Definitions nested in main() of OpenDataInspector.py are loaded from the script itself,
+ as the micro-benchmarks do, so the code checked is the code that runs. Run from any folder; a failed check is
+ reported and the script exits with status 1.
+Author: agent
+Date: 20261017
+Revisions: 20261017, agent, The inspection journal must read back the datasets appended to it, with the upserts
+    confirmed for each in any order, and ignore the run start time, shard statistics, and a line cut off by a crash.
+    20261017, agent, DatasetScheduler must dispatch the longest datasets first, estimate datasets without history
+    from their record counts, and defer the most recently inspected datasets that do not fit a budget.
+    20261017, agent, The confidence intervals of the sampling estimator must cover the true percent null of a dataset
+    of known nulls in at least 90% of repeated samples, and the first page must be drawn as often as the others of its
+    stratum.
+    20261017, agent, An inspection run as 2 shards and a merge must write the same field level and overview results
+    as an unsharded run.
+"""
+
+
+def main():
+
+    # IMPORTS
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import date
+    from OpenDataInspector_Common import StreamingRecordReader, calculate_percentile
+    import argparse
+    import ast
+    import collections
+    import heapq
+    import itertools
+    import json
+    import math
+    import os
+    import random
+    import re
+    import requests
+    import shutil
+    import subprocess
+    import sys
+    import tempfile
+    import threading
+    import time
+
+    # VARIABLES (alphabetic)
+    argument_parser = argparse.ArgumentParser(description="Checks of the Open Data Inspector against known answers")
+    argument_parser.add_argument("--check", choices=("all", "dataset_scheduler", "inspection_journal",
+                                                     "sample_estimator", "sharded_run", "streaming_reader"),
+                                 default="all")
+    argument_parser.add_argument("--port", type=int, default=8790,
+                                 help="Port of the stand-in server. The sharded run check uses the next port.")
+    argument_parser.add_argument("--trials", type=int, default=300, help="Samples drawn by the estimator check")
+    argument_parser.add_argument("--seed", type=int, default=20261017, help="Seed of the random sample draws")
+    arguments = argument_parser.parse_args()
+
+    _root_url_for_project = os.path.dirname(os.path.abspath(__file__))
+    benchmark_script_path = os.path.join(_root_url_for_project, "OpenDataInspector_Benchmark.py")
+    estimator_page_size = 1000
+    fake_server_script_path = os.path.join(_root_url_for_project, "OpenDataInspector_FakeSocrataServer.py")
+    inspector_script_path = os.path.join(_root_url_for_project, "OpenDataInspector.py")
+    minimum_coverage = 0.9
+    server_column_count = 8
+    server_null_density = 0.3
+    server_row_count = 60000
+    server_url = "http://127.0.0.1:{}".format(arguments.port)
+    streaming_bodies = ['[]',
+                        ' [ ] ',
+                        '[\n]\n',
+                        '[{"a": "1"}]',
+                        '[\n  {"a": "1", ":id": "row-1"} ,\n {"a": "2", ":id": "row-2"}\n]\n',
+                        '[{"a": "x]y,z", "b": "}{", "c": "[,]"}, {"a": "\\"quoted\\" \\\\ and \\/"}]',
+                        '[{"name": "Zoë — 東京 \U0001F600", "escaped": "\\u00e9\\ud83d\\ude00"}]',
+                        '[{"nested": {"list": [1, 2.5, {"deep": "]"}], "none": null, "flag": true}}, {}]']
+
+    # CLASSES
+    class ChunkedResponse:
+        """
+        Stand in for a streamed requests.Response, handing out the body in chunks like iter_content() does.
+        """
+        def __init__(self, content: bytes):
+            self.content = content
+
+        def close(self) -> None:
+            return
+
+        def iter_content(self, chunk_size: int):
+            for index in range(0, len(self.content), chunk_size):
+                yield self.content[index:index + chunk_size]
+
+    # FUNCTIONS (alphabetic)
+    def check_dataset_scheduler() -> None:
+        """
+        Check that DatasetScheduler dispatches the longest datasets first, estimates datasets without history from
+            their record counts, and defers the most recently inspected datasets that do not fit a budget.
+
+        :return: None
+        """
+        history = {"aaaa": {"inspection_seconds": 10.0, "value_count": 1000, "record_count": 100,
+                            "last_inspected": "2026-10-01"},
+                   "bbbb": {"inspection_seconds": 30.0, "value_count": 3000, "record_count": 300,
+                            "last_inspected": "2026-10-05"},
+                   "cccc": {"inspection_seconds": 20.0, "value_count": 2000, "record_count": 200,
+                            "last_inspected": "2026-10-03"}}
+        record_counts = {"dddd": 250}
+        requested_record_counts = []
+
+        def count_records(dataset_api_id: str) -> int:
+            requested_record_counts.append(dataset_api_id)
+            return record_counts[dataset_api_id]
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            history_file_path = os.path.join(temporary_folder, "history.json")
+            with open(history_file_path, "w") as handler:
+                json.dump(history, handler)
+            dataset_scheduler_class = load_dataset_scheduler_class()
+
+            # Longest first. 60 seconds over 6000 values of 600 records is 10 fields per record and 0.01 seconds per
+            #   value, so 250 records are estimated at 25 seconds. A dataset that cannot be counted gets the median.
+            dataset_scheduler = dataset_scheduler_class(file_path=history_file_path, worker_count=2,
+                                                        record_count_function=count_records)
+            schedule = dataset_scheduler.build_schedule(dataset_api_ids=["aaaa", "bbbb", "cccc", "dddd", "eeee"],
+                                                        is_largest_first=True)
+            estimated_seconds = dataset_scheduler.estimated_seconds
+            assert math.isclose(estimated_seconds["dddd"], 25.0), estimated_seconds
+            assert estimated_seconds["eeee"] == calculate_percentile(values=[10.0, 30.0, 20.0, 25.0], percentile=50)
+            assert schedule[0] == "bbbb" and schedule[-1] == "aaaa", schedule
+            assert [estimated_seconds[api_id] for api_id in schedule] == sorted(estimated_seconds.values(),
+                                                                                reverse=True), schedule
+            assert sorted(requested_record_counts) == ["dddd", "eeee"], requested_record_counts
+            assert max(dataset_scheduler.predicted_finish_seconds.values()) == 55.0, \
+                dataset_scheduler.predicted_finish_seconds
+
+            # Inventory order without a budget counts nothing
+            del requested_record_counts[:]
+            dataset_scheduler = dataset_scheduler_class(file_path=history_file_path, worker_count=1,
+                                                        record_count_function=count_records)
+            schedule = dataset_scheduler.build_schedule(dataset_api_ids=["aaaa", "bbbb", "cccc"],
+                                                        is_largest_first=False)
+            assert schedule == ["aaaa", "bbbb", "cccc"] and requested_record_counts == [], schedule
+
+            # With a budget the least recently inspected are scheduled first, until the next would finish late
+            dataset_scheduler = dataset_scheduler_class(file_path=history_file_path, worker_count=1)
+            schedule = dataset_scheduler.build_schedule(dataset_api_ids=["aaaa", "bbbb", "cccc"],
+                                                        is_largest_first=True, budget_seconds=35.0)
+            assert schedule == ["cccc", "aaaa"], schedule
+            assert dataset_scheduler.deferred_dataset_api_ids == ["bbbb"], dataset_scheduler.deferred_dataset_api_ids
+
+            # The least recently inspected dataset is never deferred, even when it alone is over the budget
+            dataset_scheduler = dataset_scheduler_class(file_path=history_file_path, worker_count=1)
+            schedule = dataset_scheduler.build_schedule(dataset_api_ids=["aaaa", "bbbb", "cccc"],
+                                                        is_largest_first=True, budget_seconds=5.0)
+            assert schedule == ["aaaa"], schedule
+            assert dataset_scheduler.deferred_dataset_api_ids == ["cccc", "bbbb"], \
+                dataset_scheduler.deferred_dataset_api_ids
+
+            # Inspections recorded today are saved and read back by the next run
+            dataset_scheduler.record_inspection(dataset_api_id="dddd", inspection_seconds=12.5, value_count=2500,
+                                                record_count=250)
+            dataset_scheduler.save()
+            reloaded_history = dataset_scheduler_class(file_path=history_file_path, worker_count=1).history
+            assert reloaded_history["dddd"]["inspection_seconds"] == 12.5, reloaded_history["dddd"]
+            assert reloaded_history["dddd"]["last_full_scan"] == date.today().isoformat(), reloaded_history["dddd"]
+            assert reloaded_history["aaaa"] == history["aaaa"], reloaded_history["aaaa"]
+        return
+
+    def check_inspection_journal() -> None:
+        """
+        Check that the inspection journal reads back the datasets appended to it with the upserts confirmed for each,
+            whatever the order, and ignores the run start time, shard statistics, and a line cut off by a crash.
+
+        :return: None
+        """
+        append_to_inspection_journal = load_script_definition(definition_name="append_to_inspection_journal")
+        load_inspection_journal = load_script_definition(definition_name="load_inspection_journal")
+        load_run_start_time = load_script_definition(definition_name="load_run_start_time")
+        load_shard_statistics = load_script_definition(definition_name="load_shard_statistics")
+        first_entry = {"dataset_name": "Dataset A", "dataset_api_id": "aaaa-aaaa", "is_estimate": False,
+                       "is_problematic": False, "null_count_for_each_field_dict": {"field_a": 3, "field_b": 0},
+                       "number_of_columns_in_dataset": 2, "total_record_count": 10, "is_resumed": True,
+                       "is_outputs_written": False, "performance_measurements": {"HTTP": [0.5, 2, 1024]}}
+        second_entry = {"dataset_name": "Dataset B", "dataset_api_id": "bbbb-bbbb", "is_problematic": True,
+                        "null_count_for_each_field_dict": {}, "problem_message": "Response object was empty",
+                        "problem_resource": "http://127.0.0.1/resource/bbbb-bbbb.json", "is_resumed": True,
+                        "is_outputs_written": True}
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            journal_file_path = os.path.join(temporary_folder, "journal.jsonl")
+            assert load_inspection_journal(file_path=journal_file_path) == {}
+            append_to_inspection_journal(file_path=journal_file_path, journal_entry={"run_started_at": 1234.5})
+            append_to_inspection_journal(file_path=journal_file_path,
+                                         journal_entry={"dataset_api_id": "aaaa-aaaa", "upserted_to": "field-level"})
+            append_to_inspection_journal(file_path=journal_file_path, journal_entry=first_entry)
+            append_to_inspection_journal(file_path=journal_file_path, journal_entry=second_entry)
+            append_to_inspection_journal(file_path=journal_file_path,
+                                         journal_entry={"dataset_api_id": "aaaa-aaaa", "upserted_to": "overview"})
+            append_to_inspection_journal(file_path=journal_file_path,
+                                         journal_entry={"shard_statistics": {"Datasets processed": 2}})
+            with open(journal_file_path, "a") as handler:
+                handler.write('{"dataset_name": "Dataset C", "dataset_api_id": "cccc-cccc", "null_cou')
+
+            journaled_inspection_results = load_inspection_journal(file_path=journal_file_path)
+            assert sorted(journaled_inspection_results) == ["aaaa-aaaa", "bbbb-bbbb"], journaled_inspection_results
+            assert journaled_inspection_results["aaaa-aaaa"] == dict(first_entry,
+                                                                     upserted_to=["field-level", "overview"])
+            assert journaled_inspection_results["bbbb-bbbb"] == dict(second_entry, upserted_to=[])
+            assert load_run_start_time(file_path=journal_file_path) == 1234.5
+            assert load_shard_statistics(file_path=journal_file_path) == {"Datasets processed": 2}
+
+            # A shard that has not finished has no statistics, which stops the merge
+            unfinished_file_path = os.path.join(temporary_folder, "unfinished.jsonl")
+            append_to_inspection_journal(file_path=unfinished_file_path, journal_entry=first_entry)
+            assert load_shard_statistics(file_path=unfinished_file_path) == {}
+        return
+
+    def check_sample_estimator() -> None:
+        """
+        Check that the confidence intervals of the sampling estimator cover the true percent null of a dataset of
+            known nulls in at least minimum_coverage of repeated samples of SAMPLED_PAGES pages, and that the first
+            stratum is drawn at random like the others rather than always from the first page.
+
+        :return: None
+        """
+        choose_sampled_page_offsets = load_script_definition(
+            definition_name="choose_sampled_page_offsets",
+            namespace={"limit_max_and_offset": estimator_page_size, "math": math, "random": random})
+        count_null_values_in_page = load_script_definition(
+            definition_name="count_null_values_in_page",
+            namespace={"collections": collections, "itertools": itertools})
+        sampled_page_count = load_script_definition(definition_name="SAMPLED_PAGES")
+        estimate_null_counts_from_sample = load_script_definition(
+            definition_name="estimate_null_counts_from_sample",
+            namespace={"confidence_interval_z_score": load_script_definition(
+                definition_name="confidence_interval_z_score"), "math": math})
+
+        # The counts of every page of the dataset, and the true counts of the whole dataset
+        page_counts_list = []
+        field_names = None
+        for offset in range(0, server_row_count, estimator_page_size):
+            response = requests.get("{}/resource/fake-0000.json".format(server_url),
+                                    params={"$select": ":id,*", "$order": ":id", "$limit": estimator_page_size,
+                                            "$offset": offset})
+            response.raise_for_status()
+            if field_names is None:
+                field_names = [field_name for field_name in json.loads(response.headers["X-SODA2-Fields"])
+                               if not field_name.startswith(":")]
+            missing_field_counts = dict.fromkeys(field_names, 0)
+            count_null_values_in_page(field_null_count_dict=missing_field_counts, records=response.json())
+            page_counts_list.append({"missing_field_counts": missing_field_counts,
+                                     "record_count": estimator_page_size})
+        true_null_counts = {field_name: sum(page_counts["missing_field_counts"][field_name]
+                                            for page_counts in page_counts_list)
+                            for field_name in field_names}
+        true_percent_null = 100.0 * sum(true_null_counts.values()) / (server_row_count * len(field_names))
+        assert len(field_names) == server_column_count, field_names
+
+        random.seed(arguments.seed)
+        covered_dataset_count = 0
+        covered_field_count = 0
+        first_page_sampled_count = 0
+        page_count = len(page_counts_list)
+        for _ in range(arguments.trials):
+            sampled_offsets = choose_sampled_page_offsets(record_count=server_row_count,
+                                                          sampled_page_count=sampled_page_count)
+            assert len(sampled_offsets) == sampled_page_count, sampled_offsets
+            first_page_sampled_count += sampled_offsets[0] == 0
+            sample_estimates = estimate_null_counts_from_sample(
+                page_counts_list=[page_counts_list[offset // estimator_page_size] for offset in sampled_offsets],
+                field_names=field_names,
+                record_count=server_row_count,
+                page_count=page_count)
+            lower_percent, upper_percent = sample_estimates["percent_null_bounds"]
+            covered_dataset_count += lower_percent <= round(true_percent_null, 2) <= upper_percent
+            for field_name in field_names:
+                lower_percent, upper_percent = sample_estimates["percent_null_bounds_for_each_field_dict"][field_name]
+                true_field_percent_null = round(100.0 * true_null_counts[field_name] / server_row_count, 2)
+                covered_field_count += lower_percent <= true_field_percent_null <= upper_percent
+
+        dataset_coverage = covered_dataset_count / arguments.trials
+        field_coverage = covered_field_count / (arguments.trials * len(field_names))
+        print("\tTrue percent null {:.2f}. Interval coverage: dataset {:.3f}, fields {:.3f}".format(
+            true_percent_null, dataset_coverage, field_coverage))
+        assert dataset_coverage >= minimum_coverage, dataset_coverage
+        assert field_coverage >= minimum_coverage, field_coverage
+
+        # Each page of the first stratum is as likely to be drawn, the first page included
+        first_page_share = first_page_sampled_count / arguments.trials
+        expected_share = sampled_page_count / page_count
+        assert abs(first_page_share - expected_share) < 0.1, first_page_share
+        return
+
+    def check_sharded_run() -> None:
+        """
+        Check that an inspection run as 2 shards and a merge writes the same field level and overview results as an
+            unsharded run, using the end to end benchmark against its own stand-in server.
+
+        :return: None
+        """
+        project_folders = []
+        try:
+            for shard_arguments in ([], ["--shards", "2"]):
+                completed_process = subprocess.run(
+                    [sys.executable, benchmark_script_path, "--port", str(arguments.port + 1), "--datasets", "6",
+                     "--rows", "3000", "--row-distribution", "linear", "--skip-cleanup", "--keep"] + shard_arguments,
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+                kept_folder_match = re.search(r"Project folder kept at (\S+)", completed_process.stdout)
+                if kept_folder_match is not None:
+                    project_folders.append(kept_folder_match.group(1))
+                assert completed_process.returncode == 0, completed_process.stdout[-2000:]
+                assert completed_process.stdout.count("EXIT CODE: 0") == (1 if not shard_arguments else 2), \
+                    completed_process.stdout[-2000:]
+            for file_name_suffix in ("_FIELD_LEVEL_STATS.csv", "_OVERVIEW_STATS.csv"):
+                output_lines_list = []
+                for project_folder in project_folders:
+                    output_folder = os.path.join(project_folder, "OUTPUT_CSVs")
+                    output_file_names = [file_name for file_name in os.listdir(output_folder)
+                                         if file_name.endswith(file_name_suffix)]
+                    assert len(output_file_names) == 1, output_file_names
+                    with open(os.path.join(output_folder, output_file_names[0]), "r") as handler:
+                        output_lines_list.append(sorted(handler.read().splitlines()))
+                assert len(output_lines_list[0]) > 1, output_lines_list[0]
+                assert output_lines_list[0] == output_lines_list[1], "Sharded {} differs".format(file_name_suffix)
+        finally:
+            for project_folder in project_folders:
+                shutil.rmtree(project_folder, ignore_errors=True)
+        return
+
+    def check_streaming_reader() -> None:
+        """
+        Check that StreamingRecordReader decodes the same records as json.loads whatever the chunk boundaries, inside
+            strings, escapes, and multibyte characters included, and for empty arrays. A page of the stand-in server
+            is also streamed in small chunks. A body cut off before the end of the array must raise ValueError.
+
+        :return: None
+        """
+        for body in streaming_bodies:
+            expected_records = json.loads(body)
+            for chunk_size in range(1, 8):
+                record_reader = StreamingRecordReader(response=ChunkedResponse(content=body.encode("utf-8")),
+                                                      chunk_size=chunk_size)
+                records = list(record_reader)
+                assert records == expected_records, (body, chunk_size, records)
+                assert record_reader.record_count == len(expected_records), (body, chunk_size)
+
+                # The reader stops at the closing bracket, so whitespace after it may be left unread
+                assert (len(body.rstrip().encode("utf-8")) <= record_reader.byte_count
+                        <= len(body.encode("utf-8"))), (body, chunk_size, record_reader.byte_count)
+                assert record_reader.last_row_id == (expected_records[-1].get(":id") if expected_records else None)
+
+        for truncated_body in ('[{"a": "1"},', '[{"a": "1"}, {"b": "x]', '[', ''):
+            for chunk_size in (1, 3, 65536):
+                try:
+                    list(StreamingRecordReader(response=ChunkedResponse(content=truncated_body.encode("utf-8")),
+                                               chunk_size=chunk_size))
+                except ValueError:
+                    continue
+                raise AssertionError("No ValueError for a truncated body: {!r}".format(truncated_body))
+
+        page_url = "{}/resource/fake-0000.json".format(server_url)
+        page_parameters = {"$select": ":id,*", "$order": ":id", "$limit": 300}
+        expected_records = requests.get(page_url, params=page_parameters).json()
+        for chunk_size in (1, 7, 4096):
+            record_reader = StreamingRecordReader(response=requests.get(page_url, params=page_parameters,
+                                                                        stream=True),
+                                                  chunk_size=chunk_size)
+            assert list(record_reader) == expected_records, chunk_size
+            assert record_reader.last_row_id == expected_records[-1][":id"], chunk_size
+        return
+
+    def load_dataset_scheduler_class():
+        """
+        Load DatasetScheduler with the variables and functions of the inspector it depends on.
+
+        :return: the DatasetScheduler class
+        """
+        namespace = {"ThreadPoolExecutor": ThreadPoolExecutor,
+                     "calculate_percentile": calculate_percentile,
+                     "date": date,
+                     "heapq": heapq,
+                     "json": json,
+                     "os": os,
+                     "run_date": date.today(),
+                     "threading": threading,
+                     "time": time}
+        for definition_name in ("build_today_date_string", "default_fields_per_record", "default_seconds_per_value",
+                                "load_json", "read_json_file"):
+            namespace[definition_name] = load_script_definition(definition_name=definition_name, namespace=namespace)
+        return load_script_definition(definition_name="DatasetScheduler", namespace=namespace)
+
+    def load_script_definition(definition_name: str, namespace: dict = None):
+        """
+        Load a function, class, or variable nested in main() of the inspector so that it can be used on its own.
+
+        :param definition_name: Name of the function, class, or variable
+        :param namespace: Optional dictionary of further names the definition depends on
+        :return: the function, class, or variable value
+        """
+        with open(inspector_script_path, "r") as handler:
+            script_tree = ast.parse(handler.read(), filename=inspector_script_path)
+        for node in ast.walk(script_tree):
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+                is_definition = node.name == definition_name
+            elif isinstance(node, ast.Assign):
+                is_definition = any(isinstance(target, ast.Name) and target.id == definition_name
+                                    for target in node.targets)
+            else:
+                is_definition = False
+            if is_definition:
+                definition_namespace = {"json": json, "os": os}
+                definition_namespace.update(namespace or {})
+                exec(compile(ast.Module(body=[node], type_ignores=[]), inspector_script_path, "exec"),
+                     definition_namespace)
+                return definition_namespace[definition_name]
+        raise LookupError("Definition not found in {}: {}".format(inspector_script_path, definition_name))
+
+    def start_fake_server() -> subprocess.Popen:
+        """
+        Start the stand-in server with one synthetic dataset of known nulls and wait until it answers.
+
+        :return: the server process
+        """
+        server_process = subprocess.Popen([sys.executable, fake_server_script_path,
+                                           "--port", str(arguments.port),
+                                           "--datasets", "1",
+                                           "--rows", str(server_row_count),
+                                           "--columns", str(server_column_count),
+                                           "--null-density", str(server_null_density)],
+                                          stdout=subprocess.DEVNULL)
+        for _ in range(200):
+            try:
+                requests.get("{}/__stats".format(server_url), timeout=5).raise_for_status()
+                return server_process
+            except requests.exceptions.ConnectionError:
+                if server_process.poll() is not None:
+                    raise RuntimeError("Stand-in server exited with code {}".format(server_process.returncode))
+                time.sleep(0.1)
+        server_process.terminate()
+        raise RuntimeError("Stand-in server did not answer on {}".format(server_url))
+
+    # FUNCTIONALITY
+    checks_to_run = [(check_name, check_function)
+                     for check_name, check_function in (("streaming_reader", check_streaming_reader),
+                                                        ("inspection_journal", check_inspection_journal),
+                                                        ("dataset_scheduler", check_dataset_scheduler),
+                                                        ("sample_estimator", check_sample_estimator),
+                                                        ("sharded_run", check_sharded_run))
+                     if arguments.check in ("all", check_name)]
+    server_process = None
+    if any(check_name in ("sample_estimator", "streaming_reader") for check_name, _ in checks_to_run):
+        server_process = start_fake_server()
+    failed_check_names = []
+    try:
+        for check_name, check_function in checks_to_run:
+            check_start_time = time.perf_counter()
+            try:
+                check_function()
+            except AssertionError as assertion_error:
+                print("FAILED {}: {!r}".format(check_name, assertion_error)[:2000])
+                failed_check_names.append(check_name)
+                continue
+            print("PASSED {} ({:.1f} seconds)".format(check_name, time.perf_counter() - check_start_time))
+    finally:
+        if server_process is not None:
+            server_process.terminate()
+            server_process.wait()
+    if len(failed_check_names) > 0:
+        print("{} of {} checks failed: {}".format(len(failed_check_names), len(checks_to_run),
+                                                  ", ".join(failed_check_names)))
+        sys.exit(1)
+    print("All {} checks passed".format(len(checks_to_run)))
+    return
+
+
+if __name__ == "__main__":
+    main()
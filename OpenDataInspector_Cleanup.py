@@ -5,10 +5,25 @@ This script gets the ODI and GODI datasets on Socrata, examines the date value i
 records that meet the date logic check, and then deletes those records. It is intended to flush old records from the
 datasets. It could easily be adapted to any dataset by changing the 4 by 4 code and providing and application id
 for editing the datasets.
+20261017, agent, With TURN_ON_SERVER_SIDE_DATE_FILTER the date check is done by Socrata with $where and only the
+    row_id of each outdated record is transferred. TURN_ON_CLIENT_SIDE_VERIFICATION also checks the date of every
+    record here, as before, and only deletes when both agree.
+20261017, agent, Deletes are upserted DELETE_CHUNK_SIZE row ids at a time by NUMBER_OF_DELETE_WORKERS threads, with
+    retries and progress. Field level deletes now go through the field level client rather than the overview client.
+20261017, agent, The baseline date is a moving window of RETENTION_MONTHS. With TURN_ON_RETENTION_INDEX a local index
+    of the date of each row_id is kept per dataset and only rows updated since the last run are requested. Outdated
+    records are selected from the index.
+20261017, agent, Dates in the Socrata floating timestamp form are compared as strings with the baseline date, and
+    only other values are parsed with dateutil. This is much faster when every record's date is checked.
+20261017, agent, Reads go through AdaptiveRateLimiter, PooledReadSession, and StreamingRecordReader imported from
+    OpenDataInspector_Common.py, shared with OpenDataInspector.py, rather than copies of them kept here.
+20261017, agent, With TURN_ON_SHARED_RATE_LIMIT the rate limiter keeps its schedule in OUTPUT_CSVs, shared with the
+    inspector, so both running at once keep to one REQUESTS_PER_SECOND between them.
+20261017, agent, TURN_ON_RETENTION_INDEX is off by default. The index is used instead of the server side date filter
+    and its first run reads every row, so by default only the row ids to delete are transferred.
 
 """
 # TODO: Documentation
-# TODO: Switch baseline date to be a moving window of time. So, datetime.now - 12 months for example
 # TODO: Deploy as a visual cron task
 
 # TODO: Needs to be adjusted to run on GODI datasets too. Currently only hits ODI datasets
@@ -16,48 +31,78 @@ for editing the datasets.
 def main():
 
     # IMPORTS
+    from concurrent.futures import ThreadPoolExecutor, as_completed
     from datetime import datetime
+    from dateutil.relativedelta import relativedelta
+    from OpenDataInspector_Common import AdaptiveRateLimiter, PooledReadSession, StreamingRecordReader
+    from OpenDataInspector_Common import parse_retry_after
     from sodapy import Socrata
     import configparser
     import dateutil.parser as parser
+    import json
     import os
+    import random
+    import re
+    import requests
+    import requests.adapters
     import time
 
     # VARIABLES
     TESTING = True                              # OPTION
+    TURN_ON_KEYSET_PAGINATION = True            # OPTION. Page by $where :id > last :id instead of $offset
+    REQUESTS_PER_SECOND = 5.0                   # OPTION. Most reads per second
+    MAXIMUM_RETRIES = 5                         # OPTION. Retries of a throttled read before giving up
+    TURN_ON_SERVER_SIDE_DATE_FILTER = True      # OPTION. Socrata selects the outdated row ids with $where date < ...
+                                                #   Not used when TURN_ON_RETENTION_INDEX is on.
+    TURN_ON_CLIENT_SIDE_VERIFICATION = False    # OPTION. Audit. Also check every record's date here before deleting.
+    DELETE_CHUNK_SIZE = 5000                    # OPTION. Row ids deleted by each upsert
+    NUMBER_OF_DELETE_WORKERS = 2                # OPTION. Delete chunks submitted concurrently. 1 is a serial run.
+    MAXIMUM_DELETE_RETRIES = 3                  # OPTION. Retries of a failed delete chunk before giving up on it
+    RETENTION_MONTHS = 12                       # OPTION. Records dated more than this many months ago are deleted
+    TURN_ON_RETENTION_INDEX = False             # OPTION. Keep a local row_id/date index. Only newer rows are read.
+                                                #   Used instead of the server side filter. First run reads all rows.
+    TURN_ON_SHARED_RATE_LIMIT = True            # OPTION. One REQUESTS_PER_SECOND shared with the inspector
 
     _root_url_for_project = os.path.dirname(__file__)
-    baseline_date = datetime(2018, 8, 3)  # FIXME
+    baseline_date = (datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+                     - relativedelta(months=RETENTION_MONTHS))
+    baseline_date_string = "{:%Y-%m-%dT%H:%M:%S.000}".format(baseline_date)
     config_file = None  # See variable assignment below. Depends on TESTING variable.
-    field_outdated_row_ids_list = []
+    delete_retry_backoff_seconds = 1.0
+    differences_printed = 10
     limit_max_and_offset = 10000
     opendata_maryland_gov_domain = "opendata.maryland.gov"
     opendata_maryland_gov_url = r"https://{domain}".format(domain=opendata_maryland_gov_domain)
-    overview_outdated_row_ids_list = []
+    rate_limiter_state_file_name = "__rate_limiter_state.json"
+    retention_index_file_name = "__retention_index_{api_id}.json"
+    root_path_for_retention_index = os.path.join(_root_url_for_project, "OUTPUT_CSVs")
     root_url_for_dataset_access = r"{root}/resource/".format(root=opendata_maryland_gov_url)
+    socrata_floating_timestamp_pattern = re.compile(r"\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d{3}")
 
     # ASSERTS
-    # CLASSES
+    assert os.path.exists(root_path_for_retention_index)
 
     # FUNCTIONS
-    def build_dataset_url(url_root: str, api_id: str, limit_amount: int = 0, offset: int = 0, total_count: int = None) -> str:
+    def build_date_where_clause(before_date: datetime) -> str:
         """
-        Build the url used for each request for data from socrata
+        Build the SoQL $where clause that requests the records dated before a date
 
-        :param url_root: Root socrata url common to all datasets
-        :param api_id: ID specific to dataset of interest
-        :param limit_amount: Upper limit on number of records to be returned in response to request
-        :param offset: If more than one request, offset the range of records requested by this amount
-        :param total_count: Current total number of records evaluated during processing of each individual dataset
-        :return: String url
-        """
-        # if the record count exceeds the initial limit then the url must include offset parameter
-        if total_count is None and limit_amount == 0 and offset == 0:
-            return "{}{}".format(url_root, api_id)
-        elif total_count >= limit_max_and_offset:
-            return "{}{}.json?$limit={}&$offset={}".format(url_root, api_id, limit_amount, offset)
+        :param before_date: Records with a date before this are requested
+        :return: String where clause
+        """
+        return "date < '{:%Y-%m-%dT%H:%M:%S.000}'".format(before_date)
+
+    def build_keyset_where_clause(last_row_id: str = None) -> str:
+        """
+        Build the SoQL $where clause that requests the records after the last :id seen
+
+        :param last_row_id: The :id of the last record of the previous request. None for the first request.
+        :return: String where clause, or None for the first request
+        """
+        if last_row_id is None:
+            return None
         else:
-            return "{}{}.json?$limit={}".format(url_root, api_id, limit_amount)
+            return ":id > '{}'".format(last_row_id)
 
     def create_socrata_client(cfg_parser: configparser.ConfigParser, maryland_domain: str, dataset_key: str) -> Socrata:
         """
@@ -75,7 +120,299 @@ def main():
         app_token = cfg_parser[dataset_key]["APP_TOKEN"]
         username = cfg_parser["DEFAULT"]["USERNAME"]
         password = cfg_parser["DEFAULT"]["PASSWORD"]
-        return Socrata(domain=maryland_domain, app_token=app_token, username=username, password=password)
+
+        # sodapy assumes https. A plain http portal, like the local stand-in server, needs an http adapter.
+        session_adapter = None
+        if cfg_parser["DEFAULT"].get("URI_SCHEME", "https") == "http":
+            session_adapter = {"prefix": "http://", "adapter": requests.adapters.HTTPAdapter()}
+        return Socrata(domain=maryland_domain, app_token=app_token, username=username, password=password,
+                       session_adapter=session_adapter)
+
+    def delete_chunk(client: Socrata, dataset_identifier: str, row_ids: list) -> dict:
+        """
+        Delete records by row id in one upsert, retrying a failed upsert after a backoff
+
+        Deleting a record that is already gone does nothing, so a chunk that partly succeeded can be sent again.
+
+        :param client: Socrata connection client with edit rights to the dataset
+        :param dataset_identifier: Unique Socrata dataset identifier
+        :param row_ids: list of row ids of the records to delete
+        :return: the upsert response dictionary
+        """
+        payload = [{"row_id": row_id, ":deleted": True} for row_id in row_ids]
+        for attempt in range(MAXIMUM_DELETE_RETRIES + 1):
+            try:
+                delete_response = client.upsert(dataset_identifier=dataset_identifier,
+                                                payload=payload,
+                                                content_type='json')
+                error_count = delete_response.get("Errors", 0) if isinstance(delete_response, dict) else 0
+                if error_count:
+                    raise ValueError("Socrata reported {} errors deleting chunk of {} records".format(error_count,
+                                                                                                    len(row_ids)))
+                return delete_response
+            except Exception as e:
+                if attempt == MAXIMUM_DELETE_RETRIES:
+                    raise
+                retry_after_seconds = None
+                if getattr(e, "response", None) is not None:
+                    retry_after_seconds = parse_retry_after(header_value=e.response.headers.get("Retry-After"))
+                if retry_after_seconds is None:
+                    backoff_ceiling = delete_retry_backoff_seconds * (2 ** attempt)
+                    retry_after_seconds = random.uniform(backoff_ceiling / 2.0, backoff_ceiling)
+                print("\tRetrying delete chunk in {:.1f} seconds: {}. {}".format(retry_after_seconds,
+                                                                                 dataset_identifier, e))
+                time.sleep(retry_after_seconds)
+
+    def delete_records_in_chunks(client: Socrata, dataset_identifier: str, row_ids: list,
+                                 chunk_deleted_callback=None) -> dict:
+        """
+        Delete records of a Socrata dataset by row id, DELETE_CHUNK_SIZE records per upsert
+
+        Chunks are submitted by NUMBER_OF_DELETE_WORKERS threads and progress is printed as each completes. A chunk
+            that still fails after its retries is reported and its records stay in the dataset, to be selected again
+            by the next run.
+
+        :param client: Socrata connection client with edit rights to the dataset
+        :param dataset_identifier: Unique Socrata dataset identifier
+        :param row_ids: list of row ids of the records to delete
+        :param chunk_deleted_callback: Optional function called with the dataset identifier and the row ids of every
+            chunk deleted successfully
+        :return: dictionary of statistic names and values, in reporting order
+        """
+        chunks = [row_ids[index: index + DELETE_CHUNK_SIZE] for index in range(0, len(row_ids), DELETE_CHUNK_SIZE)]
+        completed_chunk_count = 0
+        failed_chunk_count = 0
+        records_deleted = 0
+        delete_start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=NUMBER_OF_DELETE_WORKERS) as executor:
+            chunk_futures = {executor.submit(delete_chunk, client=client, dataset_identifier=dataset_identifier,
+                                             row_ids=chunk): chunk
+                             for chunk in chunks}
+            for chunk_future in as_completed(chunk_futures):
+                completed_chunk_count += 1
+                try:
+                    records_deleted += int(chunk_future.result().get("Rows Deleted", 0))
+                except Exception as e:
+                    failed_chunk_count += 1
+                    print("\tDelete chunk failed after {} retries: {}. {}".format(MAXIMUM_DELETE_RETRIES,
+                                                                                 dataset_identifier, e))
+                else:
+                    if chunk_deleted_callback is not None:
+                        chunk_deleted_callback(dataset_identifier=dataset_identifier,
+                                               row_ids=chunk_futures[chunk_future])
+                print("\tDelete chunks completed {} of {} for {}. Records deleted = {}, {:.1f} per second".format(
+                    completed_chunk_count, len(chunks), dataset_identifier, records_deleted,
+                    records_deleted / max(time.perf_counter() - delete_start_time, 1e-9)))
+        delete_seconds = time.perf_counter() - delete_start_time
+        return {"{} records deleted".format(dataset_identifier): records_deleted,
+                "{} delete chunks failed".format(dataset_identifier): failed_chunk_count,
+                "{} delete time (seconds)".format(dataset_identifier): round(delete_seconds, 2),
+                "{} records deleted per second".format(dataset_identifier): round(
+                    records_deleted / max(delete_seconds, 1e-9), 1)}
+
+    def find_outdated_row_ids(row_dates) -> list:
+        """
+        Select the row ids dated before the baseline date
+
+        Socrata returns floating timestamps in a single ISO 8601 form, 2018-08-03T00:00:00.000, so those dates are
+            compared as strings with the baseline date string, which orders them the same as comparing the dates.
+            Only dates in any other form are parsed with dateutil. Records without a date are never outdated.
+
+        :param row_dates: iterable of (row_id, date) pairs
+        :return: list of row ids of outdated records
+        """
+        is_socrata_floating_timestamp = socrata_floating_timestamp_pattern.fullmatch
+        outdated_row_ids = []
+        for row_id, row_date in row_dates:
+            if row_date is None:
+                continue
+            if isinstance(row_date, str) and is_socrata_floating_timestamp(row_date):
+                if row_date < baseline_date_string:
+                    outdated_row_ids.append(row_id)
+            elif parser.parse(str(row_date)) < baseline_date:
+                outdated_row_ids.append(row_id)
+        return outdated_row_ids
+
+    def forget_deleted_rows(dataset_identifier: str, row_ids: list) -> None:
+        """
+        Remove deleted rows from the retention index of their dataset, so they are not selected for deletion again
+
+        :param dataset_identifier: Unique Socrata dataset identifier the rows were deleted from
+        :param row_ids: row ids of the deleted rows
+        :return: None
+        """
+        row_dates = retention_indexes[dataset_identifier]["row_dates"]
+        for row_id in row_ids:
+            row_dates.pop(row_id, None)
+        return
+
+    def generate_records(api_id: str, select_string: str = "*", where_clause: str = None):
+        """
+        Yield the records of a dataset, requesting a page at a time
+
+        :param api_id: ID specific to dataset of interest
+        :param select_string: SoQL $select of the fields wanted. :id is added for keyset pagination.
+        :param where_clause: Optional SoQL $where clause the records must meet
+        :return: generator of record dictionaries
+        """
+        last_row_id = None
+        record_offset_value = 0
+        while True:
+            record_reader = request_records(session=read_session,
+                                            api_id=api_id,
+                                            limit_amount=limit_max_and_offset,
+                                            offset=record_offset_value,
+                                            last_row_id=last_row_id,
+                                            select_string=select_string,
+                                            where_clause=where_clause)
+            print(record_reader.response.url)
+            yield from record_reader
+            read_session.record_streamed_bytes(response=record_reader.response,
+                                               bytes_decoded=record_reader.byte_count)
+
+            # Any page that equals the max limit indicates another request is needed. Pacing of the requests is left
+            #   to the rate limiter of the read session.
+            if record_reader.record_count != limit_max_and_offset:
+                return
+            last_row_id = record_reader.last_row_id
+            record_offset_value += limit_max_and_offset
+
+    def inventory_outdated_row_ids(api_id: str, is_filtered_by_server: bool) -> list:
+        """
+        Inventory the row ids of the records of a dataset dated before the baseline date
+
+        Filtered by the server, Socrata is asked for only the row_id of the records dated before the baseline date, so
+            the transfer grows with the number of records to delete rather than with the size of the dataset.
+            Otherwise every record is requested and its date is checked here.
+
+        :param api_id: ID specific to dataset of interest
+        :param is_filtered_by_server: True to have Socrata check the dates, False to check the date of every record
+        :return: list of row ids of outdated records
+        """
+        if is_filtered_by_server:
+            return [obj.get("row_id", None)
+                    for obj in generate_records(api_id=api_id,
+                                                select_string="row_id",
+                                                where_clause=build_date_where_clause(before_date=baseline_date))]
+        return find_outdated_row_ids(row_dates=((obj.get("row_id", None), obj.get("date", None))
+                                                for obj in generate_records(api_id=api_id)))
+
+    def inventory_outdated_row_ids_from_index(retention_index: dict) -> list:
+        """
+        Inventory the row ids of the records dated before the baseline date from the retention index of a dataset
+
+        :param retention_index: retention index of the dataset
+        :return: list of row ids of outdated records
+        """
+        return find_outdated_row_ids(row_dates=retention_index["row_dates"].items())
+
+    def is_verified_by_client(api_id: str, outdated_row_ids: list) -> bool:
+        """
+        Audit the row ids selected by the server side date filter, or the retention index, against a check of every
+            record's date here
+
+        :param api_id: ID specific to dataset of interest
+        :param outdated_row_ids: row ids of outdated records selected by the server side date filter or the index
+        :return: True if both select the same records
+        """
+        server_row_ids = set(outdated_row_ids)
+        client_row_ids = set(inventory_outdated_row_ids(api_id=api_id, is_filtered_by_server=False))
+        print("Verification of {}: selected = {}, client side check = {}".format(api_id,
+                                                                                          len(server_row_ids),
+                                                                                          len(client_row_ids)))
+        if server_row_ids == client_row_ids:
+            return True
+        print("\tOnly selected, not by the client: {}".format(sorted(server_row_ids - client_row_ids)[:differences_printed]))
+        print("\tOnly selected by the client:      {}".format(sorted(client_row_ids - server_row_ids)[:differences_printed]))
+        return False
+
+    def load_retention_index(file_path: str) -> dict:
+        """
+        Load the retention index of a dataset saved by the previous run
+
+        :param file_path: Path to the retention index .json file
+        :return: dictionary of the high water mark and the date of each row id. Empty if there is no file.
+        """
+        if not os.path.exists(file_path):
+            return {"high_water_mark": None, "row_dates": {}}
+        with open(file_path, 'r') as file_handler:
+            return json.load(file_handler)
+
+    def request_records(session, api_id: str, limit_amount: int, offset: int = 0, last_row_id: str = None,
+                        select_string: str = "*", where_clause: str = None) -> StreamingRecordReader:
+        """
+        Request a page of records from a socrata dataset. The records are decoded as they are read from the response,
+            so the page is never held in memory all at once.
+
+        :param session: PooledReadSession used for all reads
+        :param api_id: ID specific to dataset of interest
+        :param limit_amount: Upper limit on number of records to be returned in response to request
+        :param offset: Offset of the range of records requested. Only used when keyset pagination is off.
+        :param last_row_id: The :id of the last record of the previous request. Only used with keyset pagination.
+        :param select_string: SoQL $select of the fields wanted. :id is added for keyset pagination.
+        :param where_clause: Optional SoQL $where clause the records must meet
+        :return: StreamingRecordReader of the page, to be iterated once
+        """
+        where_clauses = [] if where_clause is None else [where_clause]
+        if TURN_ON_KEYSET_PAGINATION:
+            params = {"$select": ":id,{}".format(select_string), "$order": ":id", "$limit": limit_amount}
+            if last_row_id is not None:
+                where_clauses.append(build_keyset_where_clause(last_row_id=last_row_id))
+        else:
+            params = {"$limit": limit_amount, "$offset": offset}
+            if select_string != "*":
+                params["$select"] = select_string
+            if where_clause is not None:
+                params["$order"] = ":id"
+        if len(where_clauses) > 0:
+            params["$where"] = " AND ".join(where_clauses)
+        response = session.get("{}{}.json".format(root_url_for_dataset_access, api_id), params=params, stream=True)
+        response.raise_for_status()
+        return StreamingRecordReader(response=response)
+
+    def save_retention_index(file_path: str, retention_index: dict) -> None:
+        """
+        Save the retention index of a dataset for the next run. Written to a temporary file first so a failed write
+            cannot leave a partial index file behind.
+
+        :param file_path: Path to the retention index .json file
+        :param retention_index: dictionary of the high water mark and the date of each row id
+        :return: None
+        """
+        temporary_file_path = "{}.tmp".format(file_path)
+        try:
+            with open(temporary_file_path, 'w') as file_handler:
+                json.dump(retention_index, file_handler)
+            os.replace(temporary_file_path, file_path)
+        except IOError as io_err:
+            print(io_err)
+        return
+
+    def select_outdated_row_ids(api_id: str) -> list:
+        """
+        Select the row ids of the outdated records of a dataset from its retention index, when there is one, or from
+            Socrata, and audit them when TURN_ON_CLIENT_SIDE_VERIFICATION is on
+
+        The retention index takes the place of the server side date filter. It reads every row on its first run and
+            rows updated since on later runs, where the filter only ever transfers the row ids to delete.
+
+        :param api_id: ID specific to dataset of interest
+        :return: list of row ids of outdated records. Empty if the audit found a difference.
+        """
+        if api_id in retention_indexes:
+            rows_read = update_retention_index(api_id=api_id, retention_index=retention_indexes[api_id])
+            print("Rows read into the retention index of {} = {}".format(api_id, rows_read))
+            outdated_row_ids = inventory_outdated_row_ids_from_index(retention_index=retention_indexes[api_id])
+            is_selected_by_client = False
+        else:
+            outdated_row_ids = inventory_outdated_row_ids(api_id=api_id,
+                                                          is_filtered_by_server=TURN_ON_SERVER_SIDE_DATE_FILTER)
+            is_selected_by_client = not TURN_ON_SERVER_SIDE_DATE_FILTER
+        if (TURN_ON_CLIENT_SIDE_VERIFICATION and not is_selected_by_client
+                and not is_verified_by_client(api_id=api_id, outdated_row_ids=outdated_row_ids)):
+            print("Verification failed. Records of {} not deleted.".format(api_id))
+            return []
+        return outdated_row_ids
 
     def setup_config(cfg_file: str) -> configparser.ConfigParser:
         """
@@ -87,17 +424,50 @@ def main():
         cfg_parser.read(filenames=cfg_file)
         return cfg_parser
 
+    def update_retention_index(api_id: str, retention_index: dict) -> int:
+        """
+        Add the date of every row created or updated since the high water mark to the retention index of a dataset
+
+        The high water mark is the latest :updated_at seen. Rows updated at that very instant are requested again in
+            case more were written after the previous run read them, which is harmless as the index is keyed by
+            row_id. Without a high water mark every row is requested.
+
+        :param api_id: ID specific to dataset of interest
+        :param retention_index: retention index of the dataset, updated in place
+        :return: Number of rows requested
+        """
+        high_water_mark = retention_index["high_water_mark"]
+        where_clause = None if high_water_mark is None else ":updated_at >= '{}'".format(high_water_mark)
+        row_count = 0
+        for obj in generate_records(api_id=api_id, select_string=":updated_at,row_id,date", where_clause=where_clause):
+            row_count += 1
+            row_id = obj.get("row_id", None)
+            if row_id is not None:
+                retention_index["row_dates"][row_id] = obj.get("date", None)
+            updated_at = obj.get(":updated_at", None)
+            if updated_at is not None and (retention_index["high_water_mark"] is None
+                                           or updated_at > retention_index["high_water_mark"]):
+                retention_index["high_water_mark"] = updated_at
+        return row_count
+
     # FUNCTIONALITY
     print(f"Testing variable = {TESTING}")
 
     if TESTING:
-        config_file = r"EssentialExtraFilesForOpenDataInspectorSuccess\Credentials_TESTING.cfg"  # TEST
+        config_file = os.path.join("EssentialExtraFilesForOpenDataInspectorSuccess",
+                                   "Credentials_TESTING.cfg")  # TEST
 
     else:
-        config_file = r"EssentialExtraFilesForOpenDataInspectorSuccess\Credentials.cfg"  # PROD
+        config_file = os.path.join("EssentialExtraFilesForOpenDataInspectorSuccess", "Credentials.cfg")  # PROD
 
     config_parser = setup_config(cfg_file=config_file)
 
+    # The portal can be overridden in the config file, for example to benchmark against the local stand-in server
+    opendata_maryland_gov_domain = config_parser["DEFAULT"].get("DOMAIN", opendata_maryland_gov_domain)
+    opendata_maryland_gov_url = r"{scheme}://{domain}".format(scheme=config_parser["DEFAULT"].get("URI_SCHEME", "https"),
+                                                              domain=opendata_maryland_gov_domain)
+    root_url_for_dataset_access = r"{root_url}/resource/".format(root_url=opendata_maryland_gov_url)
+
     # Socrata related variables, derived
     socrata_client_field_level = create_socrata_client(cfg_parser=config_parser,
                                                        maryland_domain=opendata_maryland_gov_domain,
@@ -109,114 +479,68 @@ def main():
                                                           dataset_key="OVERVIEW")
     socrata_overview_level_dataset_app_id = config_parser["OVERVIEW"]["APP_ID"]
 
+    # One pooled session for all reads. The datasets can be private so reads are authenticated.
+    read_session = PooledReadSession(app_token=config_parser["OVERVIEW"]["APP_TOKEN"],
+                                     pool_size=1,
+                                     rate_limiter=AdaptiveRateLimiter(
+                                         requests_per_second=REQUESTS_PER_SECOND,
+                                         shared_state_path=(os.path.join(root_path_for_retention_index,
+                                                                         rate_limiter_state_file_name)
+                                                            if TURN_ON_SHARED_RATE_LIMIT else None)),
+                                     maximum_retries=MAXIMUM_RETRIES,
+                                     username=config_parser["DEFAULT"]["USERNAME"],
+                                     password=config_parser["DEFAULT"]["PASSWORD"])
+
+    # Delete tallies of both datasets, printed with the read statistics at the end
+    delete_statistics = {}
+
+    # The row_id/date index of each dataset, kept between runs so only rows updated since the last run are read
+    retention_indexes = {}
+    if TURN_ON_RETENTION_INDEX:
+        for dataset_app_id in (socrata_overview_level_dataset_app_id, socrata_field_level_dataset_app_id):
+            retention_indexes[dataset_app_id] = load_retention_index(
+                file_path=os.path.join(root_path_for_retention_index,
+                                       retention_index_file_name.format(api_id=dataset_app_id)))
+    print("Deleting records dated before {}".format(baseline_date_string))
+
     # __________________________________________________________________________
     # Overview level operations
     print("Entering Overview Dataset Operations")
-    more_overview_records_exist_than_response_limit_allows = True
-    overview_total_record_count = 0
-    overview_record_offset_value = 0
-
-    while more_overview_records_exist_than_response_limit_allows:
-        overview_cycle_record_count = 0
-
-        # Only useful for understanding what the client.get call is doing
-        print(build_dataset_url(url_root=root_url_for_dataset_access,
-                                api_id=socrata_overview_level_dataset_app_id,
-                                limit_amount=limit_max_and_offset,
-                                offset=overview_record_offset_value,
-                                total_count=overview_total_record_count))
-
-        # for the private test datasets I had to use the client to access the data. May just move to this style.
-        overview_response = socrata_client_overview_level.get(dataset_identifier=socrata_overview_level_dataset_app_id,
-                                                              content_type="json",
-                                                              limit=limit_max_and_offset,
-                                                              offset=overview_record_offset_value)
-
-        for obj in overview_response:
-            overview_date = obj.get("date", None)
-            overview_date_obj = parser.parse(overview_date)
-            overview_row_id = obj.get("row_id", None)
-            if overview_date_obj < baseline_date:
-                overview_outdated_row_ids_list.append({"row_id": overview_row_id, ":deleted": True})
-
-        # number_of_overview_records_returned = len(overview_json)
-        number_of_overview_records_returned = len(overview_response)
-        overview_cycle_record_count += number_of_overview_records_returned
-        overview_total_record_count += number_of_overview_records_returned
-
-        # Any cycle_record_count that equals the max limit indicates another request is needed
-        if overview_cycle_record_count == limit_max_and_offset:
-
-            # Give Socrata servers small interval before requesting more
-            time.sleep(0.2)
-            overview_record_offset_value = overview_cycle_record_count + overview_record_offset_value
-        else:
-            more_overview_records_exist_than_response_limit_allows = False
-
-    print(overview_outdated_row_ids_list)
+    overview_outdated_row_ids_list = select_outdated_row_ids(api_id=socrata_overview_level_dataset_app_id)
+    print("Outdated overview records = {}".format(len(overview_outdated_row_ids_list)))
 
-    delete_response_overview = socrata_client_overview_level.upsert(
-        dataset_identifier=socrata_overview_level_dataset_app_id,
-        payload=overview_outdated_row_ids_list,
-        content_type='json')
-
-    print(delete_response_overview)
+    delete_statistics.update(delete_records_in_chunks(client=socrata_client_overview_level,
+                                                      dataset_identifier=socrata_overview_level_dataset_app_id,
+                                                      row_ids=overview_outdated_row_ids_list,
+                                                      chunk_deleted_callback=forget_deleted_rows
+                                                      if TURN_ON_RETENTION_INDEX else None))
 
     socrata_client_overview_level.close()
 
     # __________________________________________________________________________
     # Field level operations
     print("Entering Field Dataset Operations")
-    more_field_records_exist_than_response_limit_allows = True
-    field_total_record_count = 0
-    field_record_offset_value = 0
-    while more_field_records_exist_than_response_limit_allows:
-        field_cycle_record_count = 0
-
-        # Only useful for understanding what the client.get call is doing
-        field_dataset_url = build_dataset_url(url_root=root_url_for_dataset_access,
-                                              api_id=socrata_field_level_dataset_app_id,
-                                              limit_amount=limit_max_and_offset,
-                                              offset=field_record_offset_value,
-                                              total_count=field_total_record_count)
-        print(field_dataset_url)
-
-        field_response = socrata_client_field_level.get(dataset_identifier=socrata_field_level_dataset_app_id,
-                                                        content_type="json",
-                                                        limit=limit_max_and_offset,
-                                                        offset=field_record_offset_value)
-
-        for obj in field_response:
-            field_date = str(obj.get("date", None))
-            field_date_obj = parser.parse(field_date)
-            field_row_id = obj.get("row_id", None)
-            if field_date_obj < baseline_date:
-                field_outdated_row_ids_list.append({"row_id": field_row_id, ":deleted": True})
-
-        # number_of_field_records_returned = len(field_json)
-        number_of_field_records_returned = len(field_response)
-        field_cycle_record_count += number_of_field_records_returned
-        field_total_record_count += number_of_field_records_returned
-
-        # Any cycle_record_count that equals the max limit indicates another request is needed
-        if field_cycle_record_count == limit_max_and_offset:
-
-            # Give Socrata servers small interval before requesting more
-            time.sleep(0.2)
-            field_record_offset_value = field_cycle_record_count + field_record_offset_value
-        else:
-            more_field_records_exist_than_response_limit_allows = False
+    field_outdated_row_ids_list = select_outdated_row_ids(api_id=socrata_field_level_dataset_app_id)
+    print("Outdated field records = {}".format(len(field_outdated_row_ids_list)))
 
-    print(field_outdated_row_ids_list)
+    delete_statistics.update(delete_records_in_chunks(client=socrata_client_field_level,
+                                                      dataset_identifier=socrata_field_level_dataset_app_id,
+                                                      row_ids=field_outdated_row_ids_list,
+                                                      chunk_deleted_callback=forget_deleted_rows
+                                                      if TURN_ON_RETENTION_INDEX else None))
 
-    delete_response_field = socrata_client_overview_level.upsert(
-        dataset_identifier=socrata_field_level_dataset_app_id,
-        payload=field_outdated_row_ids_list,
-        content_type='json')
+    socrata_client_field_level.close()
 
-    print(delete_response_field)
+    for dataset_app_id, retention_index in retention_indexes.items():
+        save_retention_index(file_path=os.path.join(root_path_for_retention_index,
+                                                    retention_index_file_name.format(api_id=dataset_app_id)),
+                             retention_index=retention_index)
+        delete_statistics["{} retention index rows".format(dataset_app_id)] = len(retention_index["row_dates"])
 
-    socrata_client_field_level.close()
+    delete_statistics.update(read_session.statistics())
+    for statistic_name, statistic_value in delete_statistics.items():
+        print("{} = {}".format(statistic_name, statistic_value))
+    read_session.close()
 
     return
 
@@ -0,0 +1,459 @@
+"""
+Reading from Socrata, shared by OpenDataInspector.py and OpenDataInspector_Cleanup.py.
+
+Both scripts read through a PooledReadSession paced by an AdaptiveRateLimiter, and stream pages of records through
+ StreamingRecordReader, so fixes to connection pooling, throttling, Retry-After handling, and streamed decoding apply
+ to both. Unlike the scripts, everything here is defined at module level so that the scripts can import it. The
+ module must sit in the same folder as the scripts.
+Author: agent
+Date: 20261017
+Revisions: 20261017, agent, AdaptiveRateLimiter can keep its schedule of requests in a shared state file, so that
+    processes reading at once, like the inspector, the cleanup, and shards, share one rate between them.
+"""
+
+# IMPORTS
+import codecs
+import email.utils
+import json
+import math
+import os
+import random
+import re
+import requests
+import requests.adapters
+import threading
+import time
+
+# VARIABLES (alphabetic)
+json_decoder = json.JSONDecoder()
+json_record_separator_pattern = re.compile(r"\s*,?\s*")
+
+
+# CLASSES
+class AdaptiveRateLimiter:
+    """
+    A token bucket shared by every thread that reads from Socrata, with backoff when Socrata pushes back.
+
+    Requests are paced at up to the configured requests per second. When a request is throttled every thread
+        pauses for the Retry-After interval, or an exponential backoff with jitter, and the rate is halved. Each
+        successful request raises the rate back toward the configured maximum, so the pace follows how busy the
+        portal is. Throttle events and the time threads spent waiting are tallied for the performance summary.
+    With a shared state file, every process using the same file draws on one schedule of requests. The file holds the
+        wall clock time of the next free request slot and of the end of any backoff. Each request takes the next free
+        slot, no sooner than the backoff, and moves it on by the interval of the current rate of its process.
+        Processes take turns on the file by creating a lock file, and a lock file older than stale_lock_seconds,
+        left by a process that died holding it, is broken.
+    """
+
+    stale_lock_seconds = 10.0
+
+    def __init__(self, requests_per_second: float, backoff_base_seconds: float = 1.0,
+                 backoff_max_seconds: float = 60.0, shared_state_path: str = None):
+        """
+        :param requests_per_second: Maximum, and starting, rate of requests across all threads
+        :param backoff_base_seconds: Backoff before the first retry of a throttled request. Doubles each retry.
+        :param backoff_max_seconds: Upper limit on the backoff between retries
+        :param shared_state_path: Path to the state file shared with other processes. None paces this process alone.
+        """
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.backoff_until = 0.0
+        self.current_rate = float(requests_per_second)
+        self.last_refill_time = time.monotonic()
+        self.lock = threading.Lock()
+        self.maximum_rate = float(requests_per_second)
+        self.minimum_rate = min(0.1, self.maximum_rate)
+        self.shared_state_path = shared_state_path
+        self.throttle_event_count = 0
+        self.time_spent_waiting = 0.0
+        self.tokens = 1.0
+
+    def acquire(self) -> None:
+        """
+        Block until a request is allowed by the rate and by any backoff in effect.
+
+        :return: None
+        """
+        if self.shared_state_path is not None:
+            self.acquire_shared_slot()
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(1.0, self.tokens + (now - self.last_refill_time) * self.current_rate)
+                self.last_refill_time = now
+                wait_seconds = max(self.backoff_until - now, 0.0)
+                if wait_seconds == 0.0 and self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                if wait_seconds == 0.0:
+                    wait_seconds = (1.0 - self.tokens) / self.current_rate
+                self.time_spent_waiting += wait_seconds
+            time.sleep(wait_seconds)
+
+    def acquire_shared_slot(self) -> None:
+        """
+        Take the next free request slot of the shared schedule and wait until it comes.
+
+        :return: None
+        """
+        with self.lock:
+            self.lock_shared_state()
+            try:
+                shared_state = self.read_shared_state()
+                now = time.time()
+                slot_time = max(now, shared_state["next_request_time"], shared_state["backoff_until"])
+                shared_state["next_request_time"] = slot_time + 1.0 / self.current_rate
+                self.write_shared_state(shared_state=shared_state)
+            finally:
+                self.unlock_shared_state()
+            wait_seconds = slot_time - now
+            self.time_spent_waiting += wait_seconds
+        if wait_seconds > 0.0:
+            time.sleep(wait_seconds)
+        return
+
+    def lock_shared_state(self) -> None:
+        """
+        Wait until this process holds the lock file of the shared state file.
+
+        :return: None
+        """
+        lock_file_path = "{}.lock".format(self.shared_state_path)
+        while True:
+            try:
+                os.close(os.open(lock_file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_file_path) > self.stale_lock_seconds:
+                        os.remove(lock_file_path)
+                except OSError:
+                    pass
+            time.sleep(0.005)
+
+    def read_shared_state(self) -> dict:
+        """
+        Read the shared schedule. A missing or unreadable file is an empty schedule.
+
+        :return: dictionary of the next free request slot and the end of any backoff, as wall clock times
+        """
+        shared_state = {"backoff_until": 0.0, "next_request_time": 0.0}
+        try:
+            with open(self.shared_state_path, "r") as file_handler:
+                shared_state.update(json.load(file_handler))
+        except (OSError, ValueError):
+            pass
+        return shared_state
+
+    def record_success(self) -> None:
+        """
+        Raise the rate a step back toward the maximum after a request that was not throttled.
+
+        :return: None
+        """
+        with self.lock:
+            self.current_rate = min(self.maximum_rate, self.current_rate + self.maximum_rate * 0.05)
+        return
+
+    def record_throttle(self, attempt: int, retry_after_seconds: float = None) -> float:
+        """
+        Pause all threads and halve the rate after a throttled request.
+
+        :param attempt: Zero based number of the retry about to be made for the request
+        :param retry_after_seconds: Seconds Socrata asked to wait in the Retry-After header, if sent
+        :return: Seconds all threads will be paused
+        """
+        if retry_after_seconds is None:
+            backoff_ceiling = min(self.backoff_max_seconds, self.backoff_base_seconds * (2 ** attempt))
+            backoff_seconds = random.uniform(backoff_ceiling / 2.0, backoff_ceiling)
+        else:
+            backoff_seconds = min(self.backoff_max_seconds, retry_after_seconds)
+        with self.lock:
+            self.throttle_event_count += 1
+            self.current_rate = max(self.minimum_rate, self.current_rate / 2.0)
+            self.backoff_until = max(self.backoff_until, time.monotonic() + backoff_seconds)
+            if self.shared_state_path is not None:
+                self.lock_shared_state()
+                try:
+                    shared_state = self.read_shared_state()
+                    shared_state["backoff_until"] = max(shared_state["backoff_until"], time.time() + backoff_seconds)
+                    self.write_shared_state(shared_state=shared_state)
+                finally:
+                    self.unlock_shared_state()
+        return backoff_seconds
+
+    def statistics(self) -> dict:
+        """
+        Summarize the throttling of the run.
+
+        :return: dictionary of statistic names and values, in reporting order
+        """
+        return {"Throttle events": self.throttle_event_count,
+                "Time waiting on rate limiter (seconds)": round(self.time_spent_waiting, 2),
+                "Final requests per second": round(self.current_rate, 2)}
+
+    def unlock_shared_state(self) -> None:
+        """
+        Give up the lock file of the shared state file.
+
+        :return: None
+        """
+        try:
+            os.remove("{}.lock".format(self.shared_state_path))
+        except OSError:
+            pass
+        return
+
+    def write_shared_state(self, shared_state: dict) -> None:
+        """
+        Write the shared schedule. Written to a temporary file first and swapped in, so a reader never sees part of it.
+
+        :param shared_state: dictionary of the next free request slot and the end of any backoff
+        :return: None
+        """
+        temporary_file_path = "{}.{}.tmp".format(self.shared_state_path, os.getpid())
+        with open(temporary_file_path, "w") as file_handler:
+            json.dump(shared_state, file_handler)
+        os.replace(temporary_file_path, self.shared_state_path)
+        return
+
+
+class PooledReadSession:
+    """
+    A single requests session, with a connection pool sized to the run's concurrency, used for every read.
+
+    Connections are kept alive between requests rather than paying a new TCP and TLS handshake for every page.
+        The app token is sent with reads and compressed responses are requested. Requests made, connections
+        opened, and bytes received are tallied so connection reuse and the savings on the wire can be reported.
+    """
+
+    def __init__(self, app_token: str, pool_size: int, rate_limiter: AdaptiveRateLimiter, maximum_retries: int,
+                 username: str = None, password: str = None):
+        """
+        :param app_token: Socrata application token sent with every read
+        :param pool_size: Maximum number of connections kept alive per host. Match to the number of concurrent
+            requests the run makes.
+        :param rate_limiter: Rate limiter shared by every thread making requests
+        :param maximum_retries: Number of times a throttled request is retried before its response is returned
+        :param username: Socrata username, only needed for reading private datasets
+        :param password: Socrata password, only needed for reading private datasets
+        """
+        self.adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.session.headers.update({"Accept-Encoding": "gzip, deflate", "X-App-Token": app_token})
+        if username and password:
+            self.session.auth = (username, password)
+        self.bytes_decoded = 0
+        self.bytes_on_the_wire = 0
+        self.maximum_retries = maximum_retries
+        self.rate_limiter = rate_limiter
+        self.request_count = 0
+        self.request_latencies = []
+        self.retry_count = 0
+        self.statistics_lock = threading.Lock()
+
+    def close(self) -> None:
+        """
+        Close the session and its pooled connections.
+
+        :return: None
+        """
+        self.session.close()
+        return
+
+    def count_connections_opened(self) -> int:
+        """
+        Count the connections opened by the pool over the life of the session.
+
+        :return: Integer number of connections opened
+        """
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[pool_key].num_connections for pool_key in pools.keys())
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """
+        Make a GET request on a pooled connection, paced by the rate limiter, and tally it.
+
+        Throttled requests (HTTP 429, or 502, 503, 504 while Socrata is overloaded) are retried after backing off,
+            up to maximum_retries times. The last response is returned either way. Bytes of a response requested
+            with stream=True are tallied by record_streamed_bytes() once it has been read.
+
+        :param url: url to which the request is made
+        :param kwargs: keyword arguments passed on to requests
+        :return: requests response
+        """
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            request_start_time = time.perf_counter()
+            response = self.session.get(url, **kwargs)
+            with self.statistics_lock:
+                self.request_count += 1
+                self.request_latencies.append(time.perf_counter() - request_start_time)
+                if not kwargs.get("stream", False):
+                    self.bytes_decoded += len(response.content)
+                    self.bytes_on_the_wire += response.raw.tell()
+            if response.status_code not in (429, 502, 503, 504) or attempt >= self.maximum_retries:
+                self.rate_limiter.record_success()
+                return response
+            backoff_seconds = self.rate_limiter.record_throttle(
+                attempt=attempt,
+                retry_after_seconds=parse_retry_after(header_value=response.headers.get("Retry-After")))
+            print("\tThrottled (HTTP {}). Retrying in {:.1f} seconds: {}".format(response.status_code,
+                                                                                backoff_seconds, url))
+            response.close()
+            with self.statistics_lock:
+                self.retry_count += 1
+            attempt += 1
+
+    def record_streamed_bytes(self, response: requests.Response, bytes_decoded: int) -> None:
+        """
+        Tally the bytes of a response that was requested with stream=True, once its body has been read.
+
+        :param response: requests response, with its body read
+        :param bytes_decoded: Number of bytes read from the body after decompression
+        :return: None
+        """
+        with self.statistics_lock:
+            self.bytes_decoded += bytes_decoded
+            self.bytes_on_the_wire += response.raw.tell()
+        return
+
+    def statistics(self) -> dict:
+        """
+        Summarize the requests made by the session.
+
+        :return: dictionary of statistic names and values, in reporting order
+        """
+        connections_opened = self.count_connections_opened()
+        session_statistics = {"HTTP read requests": self.request_count,
+                              "HTTP retries after throttling": self.retry_count,
+                              "HTTP connections opened": connections_opened,
+                              "HTTP connections reused": max(self.request_count - connections_opened, 0),
+                              "HTTP bytes on the wire": self.bytes_on_the_wire,
+                              "HTTP bytes after decompression": self.bytes_decoded}
+        for percentile in (50, 90, 99):
+            session_statistics["HTTP request latency p{} (seconds)".format(percentile)] = round(
+                calculate_percentile(values=self.request_latencies, percentile=percentile), 3)
+        session_statistics["HTTP request latency max (seconds)"] = round(max(self.request_latencies,
+                                                                             default=0.0), 3)
+        session_statistics.update(self.rate_limiter.statistics())
+        return session_statistics
+
+
+class StreamingRecordReader:
+    """
+    Decode the records of a Socrata response one at a time as the body arrives rather than buffering the page.
+
+    The response must be requested with stream=True. The body is read in chunks and each record is decoded as soon
+        as all of it has arrived, so memory is bounded by a single record and the chunk being read no matter how
+        many records are in the page. The number of records, the :id of the last record, and the bytes read are
+        kept for paging and reporting. The reader can be iterated once.
+    """
+
+    def __init__(self, response: requests.Response, chunk_size: int = 65536):
+        """
+        :param response: requests response, requested with stream=True
+        :param chunk_size: Number of bytes read from the response at a time
+        """
+        self.byte_count = 0
+        self.chunk_size = chunk_size
+        self.last_row_id = None
+        self.record_count = 0
+        self.response = response
+
+    def __iter__(self):
+        """
+        Yield the record dictionaries of the response, in order.
+
+        :return: generator of record dictionaries
+        """
+        body_chunks = self.response.iter_content(chunk_size=self.chunk_size)
+        text_decoder = codecs.getincrementaldecoder("utf-8")()
+        buffer = ""
+        buffer_position = 0
+        is_array_opened = False
+        is_body_finished = False
+        minimum_buffer_length = 0
+        try:
+            while True:
+                buffer_position = json_record_separator_pattern.match(buffer, buffer_position).end()
+
+                # Read more of the body when the buffer is used up or holds only part of a record. After a
+                #   partial record the buffer is at least doubled before decoding is tried again.
+                if ((buffer_position >= len(buffer) or len(buffer) < minimum_buffer_length)
+                        and not is_body_finished):
+                    body_chunk = next(body_chunks, None)
+                    if body_chunk is None:
+                        is_body_finished = True
+                        buffer = buffer[buffer_position:] + text_decoder.decode(b"", final=True)
+                    else:
+                        self.byte_count += len(body_chunk)
+                        buffer = buffer[buffer_position:] + text_decoder.decode(body_chunk)
+                    buffer_position = 0
+                    continue
+                if buffer_position >= len(buffer):
+                    raise ValueError("Response ended before the end of the json array of records")
+
+                if not is_array_opened:
+                    if buffer[buffer_position] != "[":
+                        raise ValueError("Response is not a json array of records")
+                    is_array_opened = True
+                    buffer_position += 1
+                    continue
+                if buffer[buffer_position] == "]":
+                    return
+                try:
+                    record, buffer_position = json_decoder.raw_decode(buffer, buffer_position)
+                except ValueError:
+                    if is_body_finished:
+                        raise
+                    buffer = buffer[buffer_position:]
+                    buffer_position = 0
+                    minimum_buffer_length = 2 * len(buffer)
+                    continue
+                minimum_buffer_length = 0
+                self.record_count += 1
+                self.last_row_id = record.get(":id")
+                yield record
+        finally:
+            self.response.close()
+
+
+# FUNCTIONS (alphabetic)
+def calculate_percentile(values: list, percentile: float) -> float:
+    """
+    Calculate a percentile of a list of values using the nearest rank method
+
+    :param values: List of numeric values
+    :param percentile: Percentile to calculate, from 0 to 100
+    :return: The value at the percentile, or 0.0 if there are no values
+    """
+    if len(values) == 0:
+        return 0.0
+    sorted_values = sorted(values)
+    rank = max(int(math.ceil(percentile / 100.0 * len(sorted_values))), 1)
+    return sorted_values[rank - 1]
+
+
+def parse_retry_after(header_value: str) -> float:
+    """
+    Parse the value of a Retry-After header, which is either a number of seconds or an HTTP date
+
+    :param header_value: Value of the Retry-After header, or None if not sent
+    :return: Seconds to wait, or None if the header was not sent or could not be parsed
+    """
+    if header_value is None:
+        return None
+    try:
+        return max(float(header_value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_after_datetime = email.utils.parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_after_datetime.timestamp() - time.time(), 0.0)
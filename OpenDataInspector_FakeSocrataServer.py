@@ -0,0 +1,456 @@
+"""
+Local stand-in for the Socrata SODA API of opendata.maryland.gov, for benchmarking the Open Data Inspector scripts.
+
+Serves synthetic datasets of configurable row counts, column counts, null density, and value length. As Socrata does,
+ records leave out null values and the X-SODA2-Fields header is left off for datasets with too many columns.
+Serves a data freshness report listing the synthetic datasets, and views metadata for every dataset.
+Accepts upserts and deletes to any other dataset id, such as the overview and field level datasets, which can be
+ seeded with aged records for the cleanup script to delete.
+Supports the subset of SoQL the scripts use: $select of fields, :id, * and count() aggregates, $where comparisons joined
+ by AND, $order, $limit, and $offset. Responses are gzip compressed when requested. Every Nth read can be throttled
+ with HTTP 429 to exercise backoff.
+Request and row tallies are served as json at /__stats.
+Author: agent
+Date: 20261017
+Revisions: 20261017, agent, Synthetic records are generated only for the fields a request selects or filters on, so
+    the work of a request grows with the fields it selects as it does on Socrata. Optional --seconds-per-megabyte
+    delays each response in proportion to its size, standing in for the time Socrata takes to build large responses.
+    20261017, agent, Stored records carry the :updated_at system field, set whenever a record is created or updated.
+    20261017, agent, Synthetic records honour $order=:id DESC, as used to request the last :id of a dataset.
+"""
+
+
+def main():
+
+    # IMPORTS
+    from datetime import datetime, timedelta
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    import argparse
+    import gzip
+    import itertools
+    import json
+    import random
+    import re
+    import threading
+    import time
+    import urllib.parse
+
+    # VARIABLES (alphabetic)
+    argument_parser = argparse.ArgumentParser(description="Local stand-in for the Socrata SODA API")
+    argument_parser.add_argument("--host", default="127.0.0.1")
+    argument_parser.add_argument("--port", type=int, default=8765)
+    argument_parser.add_argument("--datasets", type=int, default=10, help="Number of synthetic datasets")
+    argument_parser.add_argument("--rows", type=int, default=20000, help="Records in each synthetic dataset")
+    argument_parser.add_argument("--row-distribution", choices=("uniform", "linear"), default="uniform",
+                                 help="linear spreads record counts from rows/datasets up to rows")
+    argument_parser.add_argument("--columns", type=int, default=10, help="Columns in each synthetic dataset")
+    argument_parser.add_argument("--null-density", type=float, default=0.1, help="Chance that a value is null")
+    argument_parser.add_argument("--value-length", type=int, default=12, help="Characters in each value")
+    argument_parser.add_argument("--wide-datasets", type=int, default=0,
+                                 help="Additional synthetic datasets with wide-columns columns")
+    argument_parser.add_argument("--wide-columns", type=int, default=400)
+    argument_parser.add_argument("--fields-header-limit", type=int, default=300,
+                                 help="X-SODA2-Fields is left off for datasets with more columns than this")
+    argument_parser.add_argument("--aged-datasets", default="",
+                                 help="Comma separated dataset ids to seed with aged overview style records")
+    argument_parser.add_argument("--aged-rows", type=int, default=0, help="Aged records seeded in each aged dataset")
+    argument_parser.add_argument("--throttle-every", type=int, default=0, help="Answer every Nth read with HTTP 429")
+    argument_parser.add_argument("--seconds-per-megabyte", type=float, default=0.0,
+                                 help="Delay each response by this many seconds per megabyte of uncompressed body")
+    arguments = argument_parser.parse_args()
+
+    data_freshness_report_api_id = "t8k3-edvn"
+    null_value_bits_threshold = int(arguments.null_density * 2 ** 64)
+    rows_updated_at_epoch = int(datetime(2026, 1, 1).timestamp())
+    statistics = {"get_requests": 0, "post_requests": 0, "throttled_requests": 0, "rows_served": 0, "bytes_sent": 0,
+                  "rows_upserted": 0, "rows_deleted": 0, "synthetic_datasets": 0, "synthetic_rows_total": 0}
+    statistics_lock = threading.Lock()
+    stored_datasets = {}
+    stored_datasets_lock = threading.Lock()
+    stored_row_counter = itertools.count()
+    synthetic_datasets = {}
+
+    # CLASSES
+    class SocrataStandInRequestHandler(BaseHTTPRequestHandler):
+        """
+        Answer SODA API reads, upserts, and deletes from the synthetic and stored datasets.
+        """
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args) -> None:
+            return
+
+        def do_GET(self) -> None:
+            with statistics_lock:
+                statistics["get_requests"] += 1
+                request_number = statistics["get_requests"]
+            url_parts = urllib.parse.urlsplit(self.path)
+            query_parameters = dict(urllib.parse.parse_qsl(url_parts.query))
+
+            if url_parts.path == "/__stats":
+                with statistics_lock:
+                    statistics_snapshot = dict(statistics)
+                self.send_json(status_code=200, json_object=statistics_snapshot)
+                return
+            if arguments.throttle_every and request_number % arguments.throttle_every == 0:
+                with statistics_lock:
+                    statistics["throttled_requests"] += 1
+                self.send_json(status_code=429, json_object={"error": True, "message": "Too many requests"},
+                               extra_headers={"Retry-After": "1"})
+                return
+
+            views_match = re.match(r"^/api/views/([a-z0-9]{4}-[a-z0-9]{4})\.json$", url_parts.path)
+            resource_match = re.match(r"^/resource/([a-z0-9]{4}-[a-z0-9]{4})(\.json)?$", url_parts.path)
+            if views_match is not None and views_match.group(1) in synthetic_datasets:
+                self.send_json(status_code=200, json_object=build_view_metadata(views_match.group(1)))
+            elif resource_match is not None and resource_match.group(1) == data_freshness_report_api_id:
+                self.send_records(records=build_freshness_report_records(),
+                                  field_names=["dataset_name", "link", "data_provided_by"])
+            elif resource_match is not None and (resource_match.group(1) in synthetic_datasets
+                                                 or resource_match.group(1) in stored_datasets):
+                try:
+                    records, field_names = query_dataset(dataset_api_id=resource_match.group(1),
+                                                         query_parameters=query_parameters)
+                except ValueError as value_error:
+                    self.send_json(status_code=400, json_object={"error": True, "message": str(value_error)})
+                    return
+                self.send_records(records=records, field_names=field_names)
+            else:
+                self.send_json(status_code=404, json_object={"error": True, "message": "Not found"})
+            return
+
+        def do_POST(self) -> None:
+            with statistics_lock:
+                statistics["post_requests"] += 1
+            resource_match = re.match(r"^/resource/([a-z0-9]{4}-[a-z0-9]{4})(\.json)?$",
+                                      urllib.parse.urlsplit(self.path).path)
+            request_body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if resource_match is None or resource_match.group(1) in synthetic_datasets:
+                self.send_json(status_code=404, json_object={"error": True, "message": "Not found"})
+                return
+            payload = json.loads(request_body)
+            if isinstance(payload, dict):
+                payload = [payload]
+            self.send_json(status_code=200, json_object=upsert_records(dataset_api_id=resource_match.group(1),
+                                                                       payload=payload))
+            return
+
+        def send_json(self, status_code: int, json_object, extra_headers: dict = None) -> None:
+            response_body = json.dumps(json_object).encode("utf-8")
+
+            # Sleeping rather than computing leaves the other request threads free to run, as Socrata's would be
+            if arguments.seconds_per_megabyte > 0.0:
+                time.sleep(arguments.seconds_per_megabyte * len(response_body) / (1024 * 1024))
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json;charset=utf-8")
+            if len(response_body) > 1024 and "gzip" in self.headers.get("Accept-Encoding", ""):
+                response_body = gzip.compress(response_body, compresslevel=1)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(response_body)))
+            for header_name, header_value in (extra_headers or {}).items():
+                self.send_header(header_name, header_value)
+            self.end_headers()
+            self.wfile.write(response_body)
+            with statistics_lock:
+                statistics["bytes_sent"] += len(response_body)
+            return
+
+        def send_records(self, records: list, field_names: list) -> None:
+            extra_headers = {}
+            if len(field_names) <= arguments.fields_header_limit:
+                extra_headers["X-SODA2-Fields"] = json.dumps(field_names)
+            with statistics_lock:
+                statistics["rows_served"] += len(records)
+            self.send_json(status_code=200, json_object=records, extra_headers=extra_headers)
+            return
+
+    # FUNCTIONS (alphabetic)
+    def build_freshness_report_records() -> list:
+        """
+        Build the data freshness report records, one per synthetic dataset.
+
+        :return: list of record dictionaries
+        """
+        return [{"dataset_name": dataset["name"],
+                 "link": {"url": "http://{}:{}/d/{}".format(arguments.host, arguments.port, dataset_api_id)},
+                 "data_provided_by": dataset["provider"]}
+                for dataset_api_id, dataset in synthetic_datasets.items()]
+
+    def build_view_metadata(dataset_api_id: str) -> dict:
+        """
+        Build the views metadata of a synthetic dataset.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :return: dictionary in the shape of the /api/views/ response
+        """
+        dataset = synthetic_datasets[dataset_api_id]
+        return {"id": dataset_api_id,
+                "name": dataset["name"],
+                "rowsUpdatedAt": rows_updated_at_epoch,
+                "viewLastModified": rows_updated_at_epoch,
+                "columns": [{"fieldName": field_name, "name": field_name, "dataTypeName": "text"}
+                            for field_name in dataset["field_names"]]}
+
+    def compare_values(record_value: str, operator: str, literal: str) -> bool:
+        """
+        Compare a record value to a SoQL literal. A null value never matches, as in SoQL.
+
+        :param record_value: Value of the field in the record, or None if null
+        :param operator: SoQL comparison operator
+        :param literal: Literal the value is compared to
+        :return: True if the comparison holds
+        """
+        if record_value is None:
+            return False
+        record_value = str(record_value)
+        return {"<": record_value < literal, "<=": record_value <= literal, ">": record_value > literal,
+                ">=": record_value >= literal, "=": record_value == literal, "!=": record_value != literal}[operator]
+
+    def create_synthetic_dataset(dataset_api_id: str, name: str, row_count: int, column_count: int) -> None:
+        """
+        Register a synthetic dataset.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param name: Name of the dataset in the freshness report
+        :param row_count: Number of records
+        :param column_count: Number of columns
+        :return: None
+        """
+        synthetic_datasets[dataset_api_id] = {"name": name,
+                                              "provider": "Synthetic Data Provider",
+                                              "row_count": row_count,
+                                              "field_names": ["column_{:03d}".format(index)
+                                                              for index in range(column_count)]}
+        synthetic_datasets[dataset_api_id]["field_seeds"] = {
+            field_name: random.Random("{}:{}".format(dataset_api_id, field_name)).getrandbits(64)
+            for field_name in synthetic_datasets[dataset_api_id]["field_names"]}
+        statistics["synthetic_datasets"] += 1
+        statistics["synthetic_rows_total"] += row_count
+        return
+
+    def generate_synthetic_record(dataset_api_id: str, row_index: int, field_names: list = None) -> dict:
+        """
+        Generate a record of a synthetic dataset. The same index always produces the same record.
+
+        Each value is derived from the row and its field alone, so a record can be generated with only some of its
+            fields and they hold the same values as in the whole record.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param row_index: Zero based position of the record
+        :param field_names: Fields to generate. None generates every field of the dataset.
+        :return: record dictionary, with the :id system field and without null values
+        """
+        dataset = synthetic_datasets[dataset_api_id]
+        row_seed = mix_bits(value=row_index)
+        record = {":id": "row-{:010d}".format(row_index)}
+        for field_name in dataset["field_names"] if field_names is None else field_names:
+            value_bits = mix_bits(value=row_seed ^ dataset["field_seeds"][field_name])
+            if value_bits >= null_value_bits_threshold:
+                record[field_name] = "v{}".format(value_bits).ljust(arguments.value_length, "x")
+        return record
+
+    def mix_bits(value: int) -> int:
+        """
+        Scramble the bits of a 64 bit integer, as in the splitmix64 generator. Cheaper than seeding a random.Random.
+
+        :param value: Integer to scramble
+        :return: Scrambled 64 bit integer
+        """
+        value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        return value ^ (value >> 31)
+
+    def parse_select(select_string: str) -> list:
+        """
+        Parse a SoQL $select into a list of (function, field, alias) tuples. function is None for plain fields.
+
+        :param select_string: Value of the $select parameter
+        :return: list of tuples
+        """
+        select_items = []
+        for select_part in [part.strip() for part in select_string.split(",") if part.strip()]:
+            count_match = re.match(r"^count\(\s*`?(\*|:?[a-z0-9_]+)`?\s*\)(?:\s+as\s+([a-z0-9_]+))?$", select_part,
+                                   flags=re.IGNORECASE)
+            if count_match is not None:
+                alias = count_match.group(2) or "count_{}".format(count_match.group(1).strip("*:") or "star")
+                select_items.append(("count", count_match.group(1), alias))
+            elif re.match(r"^(\*|:\*|:?@?[a-z0-9_]+)$", select_part, flags=re.IGNORECASE):
+                select_items.append((None, select_part, select_part))
+            else:
+                raise ValueError("Unsupported $select: {}".format(select_part))
+        return select_items
+
+    def parse_where(where_string: str) -> list:
+        """
+        Parse a SoQL $where of comparisons joined by AND into a list of (field, operator, literal) tuples.
+
+        :param where_string: Value of the $where parameter
+        :return: list of tuples
+        """
+        conditions = []
+        for condition_string in re.split(r"\s+and\s+", where_string.strip(), flags=re.IGNORECASE):
+            condition_match = re.match(r"^\(?\s*(:?[a-z0-9_]+)\s*(<=|>=|!=|<|>|=)\s*'([^']*)'\s*\)?$",
+                                       condition_string.strip(), flags=re.IGNORECASE)
+            if condition_match is None:
+                raise ValueError("Unsupported $where: {}".format(condition_string))
+            conditions.append(condition_match.groups())
+        return conditions
+
+    def query_dataset(dataset_api_id: str, query_parameters: dict) -> tuple:
+        """
+        Answer a SoQL query against a synthetic or stored dataset.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param query_parameters: dictionary of SoQL parameters from the request
+        :return: tuple of the list of result records and the list of field names of the result
+        """
+        select_items = parse_select(query_parameters.get("$select", "*"))
+        conditions = parse_where(query_parameters["$where"]) if "$where" in query_parameters else []
+        limit = int(query_parameters.get("$limit", 1000))
+        offset = int(query_parameters.get("$offset", 0))
+        order_field = query_parameters.get("$order", ":id").split()[0]
+        is_descending = query_parameters.get("$order", "").lower().endswith(" desc")
+
+        if dataset_api_id in synthetic_datasets:
+            dataset_field_names = synthetic_datasets[dataset_api_id]["field_names"]
+            row_count = synthetic_datasets[dataset_api_id]["row_count"]
+
+            # Only the fields selected or filtered on are generated, as a narrower $select costs Socrata less
+            if any(function is None and field_name == "*" for function, field_name, _ in select_items):
+                generated_field_names = None
+            else:
+                queried_field_names = set(field_name for _, field_name, _ in select_items)
+                queried_field_names.update(field_name for field_name, _, _ in conditions)
+                generated_field_names = [field_name for field_name in dataset_field_names
+                                         if field_name in queried_field_names]
+
+            # Synthetic records are generated in :id order, so a keyset condition on :id is a starting index
+            first_row_index = 0
+            for field_name, operator, literal in conditions:
+                if field_name == ":id" and operator in (">", ">=") and literal.startswith("row-"):
+                    first_row_index = max(first_row_index, int(literal[4:]) + (1 if operator == ">" else 0))
+            row_indexes = range(first_row_index, row_count)
+            if order_field == ":id" and is_descending:
+                row_indexes = reversed(row_indexes)
+            candidate_records = (generate_synthetic_record(dataset_api_id=dataset_api_id, row_index=row_index,
+                                                           field_names=generated_field_names)
+                                 for row_index in row_indexes)
+        else:
+            with stored_datasets_lock:
+                candidate_records = [dict(record) for record in stored_datasets[dataset_api_id].values()]
+            dataset_field_names = sorted(set(field_name for record in candidate_records for field_name in record
+                                             if not field_name.startswith(":")))
+            if order_field != ":id" or is_descending:
+                candidate_records.sort(key=lambda record: str(record.get(order_field, "")), reverse=is_descending)
+
+        matching_records = (record for record in candidate_records
+                            if all(compare_values(record_value=record.get(field_name), operator=operator,
+                                                  literal=literal)
+                                   for field_name, operator, literal in conditions))
+
+        if any(function == "count" for function, _, _ in select_items):
+            aggregate_record = {alias: 0 for function, _, alias in select_items if function == "count"}
+            for record in matching_records:
+                for function, field_name, alias in select_items:
+                    if function == "count" and (field_name == "*" or field_name in record):
+                        aggregate_record[alias] += 1
+            return [{alias: str(count) for alias, count in aggregate_record.items()}], list(aggregate_record.keys())
+
+        result_field_names = []
+        for function, field_name, alias in select_items:
+            if field_name == "*":
+                result_field_names.extend(dataset_field_names)
+            elif field_name == ":*":
+                result_field_names.append(":id")
+            else:
+                result_field_names.append(field_name)
+        result_records = []
+        for record in itertools.islice(matching_records, offset, offset + limit):
+            result_records.append({field_name: record[field_name] for field_name in result_field_names
+                                   if field_name in record})
+        return result_records, result_field_names
+
+    def seed_aged_records(dataset_api_id: str, row_count: int) -> None:
+        """
+        Seed a stored dataset with overview style records dated across 2017 through 2019.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param row_count: Number of records to seed
+        :return: None
+        """
+        first_date = datetime(2017, 1, 1)
+        for index in range(row_count):
+            record_date = first_date + timedelta(days=(index * 1095) // max(row_count, 1))
+            upsert_records(dataset_api_id=dataset_api_id,
+                           payload=[{"DATASET NAME": "Aged Dataset {}".format(index % 50),
+                                     "DATE": "{:%Y-%m-%dT%H:%M:%S.000}".format(record_date),
+                                     "ROW ID": "aged.{}.{}".format(dataset_api_id, index)}])
+        return
+
+    def upsert_records(dataset_api_id: str, payload: list) -> dict:
+        """
+        Upsert and delete records of a stored dataset, keyed by the row_id field.
+
+        Field names are converted to Socrata api field names, 'ROW ID' becomes 'row_id'. A record with ':deleted'
+            set to true deletes the record with its row_id.
+
+        :param dataset_api_id: Socrata api id of the dataset
+        :param payload: list of record dictionaries
+        :return: dictionary in the shape of the Socrata upsert response
+        """
+        rows_created, rows_updated, rows_deleted = 0, 0, 0
+        with stored_datasets_lock:
+            stored_records = stored_datasets.setdefault(dataset_api_id, {})
+            updated_at = "{:%Y-%m-%dT%H:%M:%S.%f}".format(datetime.utcnow())[:-3] + "Z"
+            for payload_record in payload:
+                record = {field_name.lower().replace(" ", "_"): value for field_name, value in payload_record.items()}
+                record[":updated_at"] = updated_at
+                row_id = str(record.get("row_id", len(stored_records)))
+                if record.get(":deleted", False):
+                    rows_deleted += 1 if stored_records.pop(row_id, None) is not None else 0
+                elif row_id in stored_records:
+                    stored_records[row_id].update(record)
+                    rows_updated += 1
+                else:
+                    record[":id"] = "row-{:010d}".format(next(stored_row_counter))
+                    stored_records[row_id] = record
+                    rows_created += 1
+        with statistics_lock:
+            statistics["rows_upserted"] += rows_created + rows_updated
+            statistics["rows_deleted"] += rows_deleted
+        return {"Rows Created": rows_created, "Rows Updated": rows_updated, "Rows Deleted": rows_deleted,
+                "Errors": 0}
+
+    # FUNCTIONALITY
+    for dataset_index in range(arguments.datasets):
+        if arguments.row_distribution == "linear":
+            dataset_row_count = max(1, (arguments.rows * (dataset_index + 1)) // arguments.datasets)
+        else:
+            dataset_row_count = arguments.rows
+        create_synthetic_dataset(dataset_api_id="fake-{:04d}".format(dataset_index),
+                                 name="Synthetic Dataset {:04d}".format(dataset_index),
+                                 row_count=dataset_row_count,
+                                 column_count=arguments.columns)
+    for dataset_index in range(arguments.wide_datasets):
+        create_synthetic_dataset(dataset_api_id="wide-{:04d}".format(dataset_index),
+                                 name="Synthetic Wide Dataset {:04d}".format(dataset_index),
+                                 row_count=arguments.rows,
+                                 column_count=arguments.wide_columns)
+    for aged_dataset_api_id in [api_id.strip() for api_id in arguments.aged_datasets.split(",") if api_id.strip()]:
+        seed_aged_records(dataset_api_id=aged_dataset_api_id, row_count=arguments.aged_rows)
+    statistics["rows_upserted"] = 0
+
+    server = ThreadingHTTPServer((arguments.host, arguments.port), SocrataStandInRequestHandler)
+    print("Serving {} synthetic datasets on http://{}:{}".format(len(synthetic_datasets), arguments.host,
+                                                                 arguments.port), flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""
+Micro-benchmarks of hot path functions of the Open Data Inspector, on synthetic pages of records.
+
+The functions measured are loaded from OpenDataInspector.py and OpenDataInspector_Cleanup.py themselves, where they
+ are nested in main(), so the code measured is the code that runs. Each benchmark first checks that the function
+ gives the same results as the implementation it replaced, then reports the best time per page of several repeats for
+ narrow, wide, and long text pages. The record decoding benchmark also reports the peak memory of decoding and
+ counting a page, streaming the page through StreamingRecordReader in chunks as the inspector does.
+Author: agent
+Date: 20261017
+Revisions: 20261017, agent, Added the date filtering benchmark of the cleanup, reporting records per second of
+    find_outdated_row_ids() against parsing every date with dateutil. Every benchmark now reports records per second.
+    20261017, agent, StreamingRecordReader is imported from OpenDataInspector_Common.py, where it now lives.
+"""
+
+
+def main():
+
+    # IMPORTS
+    import argparse
+    import ast
+    from datetime import datetime, timedelta
+    from OpenDataInspector_Common import StreamingRecordReader
+    import collections
+    import dateutil.parser
+    import itertools
+    import json
+    import os
+    import random
+    import re
+    import requests
+    import timeit
+    import tracemalloc
+
+    # VARIABLES (alphabetic)
+    argument_parser = argparse.ArgumentParser(description="Micro-benchmarks of Open Data Inspector hot paths")
+    argument_parser.add_argument("--benchmark", choices=("all", "date_filtering", "null_counting",
+                                                                    "record_decoding"), default="all")
+    argument_parser.add_argument("--rows", type=int, default=10000, help="Records in each synthetic page")
+    argument_parser.add_argument("--null-density", type=float, default=0.1, help="Chance that a value is null")
+    argument_parser.add_argument("--malformed-density", type=float, default=0.01,
+                                 help="Chance that a date is not in the Socrata floating timestamp form")
+    argument_parser.add_argument("--repeat", type=int, default=5, help="Timings taken, the best is reported")
+    arguments = argument_parser.parse_args()
+
+    _root_url_for_project = os.path.dirname(os.path.abspath(__file__))
+    baseline_date = datetime(2025, 10, 17)
+    cleanup_script_path = os.path.join(_root_url_for_project, "OpenDataInspector_Cleanup.py")
+    inspector_script_path = os.path.join(_root_url_for_project, "OpenDataInspector.py")
+    page_shapes = (("narrow", 10, 12), ("wide", 300, 12), ("long text", 20, 500))
+
+    # CLASSES
+    class ChunkedResponse:
+        """
+        Stand in for a streamed requests.Response, handing out the body in chunks like iter_content() does.
+        """
+        def __init__(self, content: bytes):
+            self.content = content
+
+        def close(self) -> None:
+            return
+
+        def iter_content(self, chunk_size: int):
+            for index in range(0, len(self.content), chunk_size):
+                yield self.content[index:index + chunk_size]
+
+    # FUNCTIONS (alphabetic)
+    def benchmark_date_filtering() -> None:
+        """
+        Compare find_outdated_row_ids() of the cleanup to parsing the date of every record with dateutil, as the
+            cleanup did before.
+
+        :return: None
+        """
+        find_outdated_row_ids = load_script_definition(
+            definition_name="find_outdated_row_ids",
+            script_path=cleanup_script_path,
+            namespace={"baseline_date": baseline_date,
+                       "baseline_date_string": "{:%Y-%m-%dT%H:%M:%S.000}".format(baseline_date),
+                       "parser": dateutil.parser,
+                       "socrata_floating_timestamp_pattern": load_script_definition(
+                           definition_name="socrata_floating_timestamp_pattern", script_path=cleanup_script_path)})
+        row_dates = build_synthetic_row_dates(row_count=arguments.rows)
+
+        def run_baseline():
+            return [row_id for row_id, row_date in row_dates
+                    if row_date is not None and dateutil.parser.parse(str(row_date)) < baseline_date]
+
+        def run_fast_path():
+            return find_outdated_row_ids(row_dates=row_dates)
+
+        if run_fast_path() != run_baseline():
+            raise AssertionError("Outdated row ids differ from the dateutil selection")
+        report_timings(benchmark_name="date filtering",
+                       shape_name="row_id and date",
+                       column_count=2,
+                       timings={"dateutil.parser.parse": time_best_of(function=run_baseline),
+                                "find_outdated_row_ids": time_best_of(function=run_fast_path)})
+        return
+
+    def benchmark_null_counting() -> None:
+        """
+        Compare count_null_values_in_page() to the record by record inspect_record_for_null_values() it replaced.
+
+        :return: None
+        """
+        count_null_values_in_page = load_script_definition(definition_name="count_null_values_in_page")
+        for shape_name, column_count, value_length in page_shapes:
+            field_names, records = build_synthetic_page(row_count=arguments.rows, column_count=column_count,
+                                                        value_length=value_length)
+
+            baseline_counts = dict.fromkeys(field_names, 0)
+            for record in records:
+                inspect_record_for_null_values(field_null_count_dict=baseline_counts, record_dictionary=record)
+            page_counts = dict.fromkeys(field_names, 0)
+            count_null_values_in_page(field_null_count_dict=page_counts, records=records)
+            if page_counts != baseline_counts:
+                raise AssertionError("Null counts differ from the record by record counts: {} page".format(shape_name))
+
+            def run_baseline():
+                null_counts = dict.fromkeys(field_names, 0)
+                for page_record in records:
+                    inspect_record_for_null_values(field_null_count_dict=null_counts, record_dictionary=page_record)
+
+            def run_page():
+                count_null_values_in_page(field_null_count_dict=dict.fromkeys(field_names, 0), records=records)
+
+            report_timings(benchmark_name="null counting",
+                           shape_name=shape_name,
+                           column_count=column_count,
+                           timings={"inspect_record_for_null_values": time_best_of(function=run_baseline),
+                                    "count_null_values_in_page": time_best_of(function=run_page)})
+        return
+
+    def benchmark_record_decoding() -> None:
+        """
+        Compare scan_record_keys(), reading the page in chunks through StreamingRecordReader, to decoding the whole
+            page with json then counting it with count_null_values_in_page().
+
+        :return: None
+        """
+        count_null_values_in_page = load_script_definition(definition_name="count_null_values_in_page")
+        scan_record_keys = load_script_definition(definition_name="scan_record_keys")
+        for shape_name, column_count, value_length in page_shapes:
+            field_names, records = build_synthetic_page(row_count=arguments.rows, column_count=column_count,
+                                                        value_length=value_length)
+            response_content = json.dumps(records).encode("utf-8")
+            del records
+
+            def run_json_page():
+                null_counts = dict.fromkeys(field_names, 0)
+                count_null_values_in_page(field_null_count_dict=null_counts,
+                                          records=json.loads(response_content.decode("utf-8")))
+                return null_counts
+
+            def run_scan():
+                null_counts = dict.fromkeys(field_names, 0)
+                page_counts = scan_record_keys(
+                    record_reader=StreamingRecordReader(response=ChunkedResponse(content=response_content)),
+                    field_names=field_names)
+                null_counts.update(page_counts["missing_field_counts"])
+                return null_counts
+
+            if run_scan() != run_json_page():
+                raise AssertionError("Null counts differ from the json decoded counts: {} page".format(shape_name))
+            report_timings(benchmark_name="record decoding",
+                           shape_name=shape_name,
+                           column_count=column_count,
+                           timings={"json + count_null_values_in_page": time_best_of(function=run_json_page),
+                                    "scan_record_keys": time_best_of(function=run_scan)},
+                           peak_memory={"json + count_null_values_in_page": measure_peak_memory(
+                                            function=run_json_page),
+                                        "scan_record_keys": measure_peak_memory(function=run_scan)})
+        return
+
+    def build_synthetic_row_dates(row_count: int) -> list:
+        """
+        Build (row_id, date) pairs dated across 2017 through 2026, the dates in the Socrata floating timestamp form
+            but for a share in other forms and a few missing.
+
+        :param row_count: Number of pairs
+        :return: list of (row_id, date) tuples
+        """
+        date_random = random.Random(row_count)
+        first_date = datetime(2017, 1, 1)
+        other_date_formats = ("{:%Y-%m-%d}", "{:%Y-%m-%dT%H:%M:%S}", "{:%m/%d/%Y}", "{:%Y-%m-%dT%H:%M:%S.%f}")
+        row_dates = []
+        for row_index in range(row_count):
+            row_date = first_date + timedelta(days=date_random.randrange(3650), seconds=date_random.randrange(86400))
+            if date_random.random() < arguments.null_density / 10:
+                row_date_string = None
+            elif date_random.random() < arguments.malformed_density:
+                row_date_string = date_random.choice(other_date_formats).format(row_date)
+            else:
+                row_date_string = "{:%Y-%m-%dT%H:%M:%S.000}".format(row_date)
+            row_dates.append(("row-{:010d}".format(row_index), row_date_string))
+        return row_dates
+
+    def build_synthetic_page(row_count: int, column_count: int, value_length: int) -> tuple:
+        """
+        Build a page of records shaped like a Socrata response, with null values left out of the records.
+
+        :param row_count: Number of records
+        :param column_count: Number of fields
+        :param value_length: Characters in each value
+        :return: tuple of the list of field names and the list of record dictionaries
+        """
+        page_random = random.Random(column_count)
+        field_names = ["column_{:03d}".format(index) for index in range(column_count)]
+        records = []
+        for row_index in range(row_count):
+            record = {":id": "row-{:010d}".format(row_index)}
+            for field_name in field_names:
+                if page_random.random() >= arguments.null_density:
+                    record[field_name] = "value {}".format(page_random.getrandbits(32)).ljust(value_length, "x")
+            records.append(record)
+        return field_names, records
+
+    def inspect_record_for_null_values(field_null_count_dict: dict, record_dictionary: dict) -> None:
+        """
+        Inspect the socrata record for the number of null values. The record by record implementation that
+            count_null_values_in_page() replaced, kept here as the baseline.
+
+        :param field_null_count_dict: dictionary that counts the nulls for each field in the dataset
+        :param record_dictionary: the data record to be evaluated
+        :return: nothing
+        """
+        record_dictionary_fields = record_dictionary.keys()
+        for field_name in field_null_count_dict.keys():
+            if field_name not in record_dictionary_fields:
+                field_null_count_dict[field_name] += 1
+        return
+
+    def load_script_definition(definition_name: str, script_path: str = None, namespace: dict = None):
+        """
+        Load a function, class, or variable nested in main() of a script so that it can be used on its own.
+
+        Only definitions that depend on nothing but collections, itertools, re, requests, and the namespace given can
+            be loaded.
+
+        :param definition_name: Name of the function, class, or variable
+        :param script_path: Path to the script. OpenDataInspector.py when not given.
+        :param namespace: Optional dictionary of further names the definition depends on
+        :return: the function, class, or variable value
+        """
+        script_path = script_path or inspector_script_path
+        with open(script_path, "r") as handler:
+            script_tree = ast.parse(handler.read(), filename=script_path)
+        for node in ast.walk(script_tree):
+            if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+                is_definition = node.name == definition_name
+            elif isinstance(node, ast.Assign):
+                is_definition = any(isinstance(target, ast.Name) and target.id == definition_name
+                                    for target in node.targets)
+            else:
+                is_definition = False
+            if is_definition:
+                definition_namespace = {"collections": collections,
+                                        "itertools": itertools,
+                                        "re": re,
+                                        "requests": requests}
+                definition_namespace.update(namespace or {})
+                exec(compile(ast.Module(body=[node], type_ignores=[]), script_path, "exec"), definition_namespace)
+                return definition_namespace[definition_name]
+        raise LookupError("Definition not found in {}: {}".format(script_path, definition_name))
+
+    def measure_peak_memory(function) -> float:
+        """
+        Measure the peak memory allocated while a function runs.
+
+        :param function: Function taking no arguments
+        :return: Peak memory in megabytes
+        """
+        tracemalloc.start()
+        try:
+            function()
+            return tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        finally:
+            tracemalloc.stop()
+
+    def report_timings(benchmark_name: str, shape_name: str, column_count: int, timings: dict,
+                       peak_memory: dict = None) -> None:
+        """
+        Print the time per page of each implementation and its speedup over the first, the baseline.
+
+        :param benchmark_name: Name of the benchmark
+        :param shape_name: Name of the page shape
+        :param column_count: Number of fields in the page
+        :param timings: dictionary of best seconds per page keyed by implementation name, baseline first
+        :param peak_memory: Optional dictionary of peak megabytes per page keyed by implementation name
+        :return: None
+        """
+        print("\n{}, {} page of {} records x {} fields".format(benchmark_name, shape_name, arguments.rows,
+                                                             column_count))
+        baseline_seconds = next(iter(timings.values()))
+        for implementation_name, seconds in timings.items():
+            report_line = "\t{:<40} {:10.4f} seconds per page  {:10.0f} records per second  {:6.1f}x".format(
+                implementation_name, seconds, arguments.rows / seconds, baseline_seconds / seconds)
+            if peak_memory is not None:
+                report_line += "  {:8.1f} MB peak".format(peak_memory[implementation_name])
+            print(report_line)
+        return
+
+    def time_best_of(function) -> float:
+        """
+        Time a function several times and keep the best, which is the least disturbed by other activity.
+
+        :param function: Function taking no arguments
+        :return: Best time in seconds
+        """
+        return min(timeit.repeat(function, number=1, repeat=arguments.repeat))
+
+    # FUNCTIONALITY
+    if arguments.benchmark in ("all", "date_filtering"):
+        benchmark_date_filtering()
+    if arguments.benchmark in ("all", "null_counting"):
+        benchmark_null_counting()
+    if arguments.benchmark in ("all", "record_decoding"):
+        benchmark_record_decoding()
+    return
+
+
+if __name__ == "__main__":
+    main()